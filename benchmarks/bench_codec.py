@@ -0,0 +1,57 @@
+"""Micro-benchmark for the pytuya JSON codec.
+
+Compares the previous decode path (bytes.decode() then json.loads) and
+json.dumps(...).encode() with the codec module on real DP status payloads.
+
+Usage: python benchmarks/bench_codec.py [loops]
+"""
+
+import json
+import sys
+
+from common import STATUS_PAYLOAD, measure
+from pytuya import codec
+
+PAYLOADS = {
+    "plug": STATUS_PAYLOAD,
+    "light": (
+        b'{"dps":{"20":true,"21":"colour","22":1000,"23":500,'
+        b'"24":"00f003e803e8","25":"000e0d0000000000000000c80000",'
+        b'"26":0,"34":false},"t":1700000000}'
+    ),
+    "gateway": (
+        b'{"protocol":4,"t":1700000000,"data":{"cid":"a4c138f9d2b51c3e",'
+        b'"dps":{"1":true,"2":false,"3":"cancel","4":0,"5":false,'
+        b'"101":"1","102":254,"103":"eyJ0eXBlIjoyfQ==","104":2400,'
+        b'"105":"auto","106":"idle","107":[1,2,3,4,5,6,7,8]}}}'
+    ),
+}
+
+
+def old_loads(data: bytes):
+    """Decode the way _decode_payload used to."""
+    return json.loads(data.decode())
+
+
+def old_dumps(obj) -> bytes:
+    """Encode the way _generate_payload used to."""
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def main(loops: int = 20000):
+    """Run the benchmark and print payloads/sec for every payload."""
+    print(f"codec backend: {codec.BACKEND}")
+    for name, payload in PAYLOADS.items():
+        obj = json.loads(payload)
+        for label, func, arg in (
+            ("loads old", old_loads, payload),
+            ("loads codec", codec.loads, payload),
+            ("dumps old", old_dumps, obj),
+            ("dumps codec", codec.dumps, obj),
+        ):
+            rate = measure(func, loops, arg)
+            print(f"{name:<8} {label:<12} {rate:>12,.0f} payloads/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
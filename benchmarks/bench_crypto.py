@@ -0,0 +1,47 @@
+"""Micro-benchmark for the per-session crypto context.
+
+Encodes CONTROL frames through TuyaProtocol and decodes STATUS frames through
+MessageDispatcher, once reusing the session context and once dropping it before
+every frame (the cost of building the ciphers and HMAC per message).
+
+Usage: python benchmarks/bench_crypto.py [frames]
+"""
+
+import sys
+
+from common import STATUS_PAYLOAD, device_frame, dispatcher, measure, protocol
+from pytuya.const import CMDType, MessagePayload
+
+
+def encode(proto, frames: int, per_frame: bool):
+    """Encode frames CONTROL messages."""
+    msg = MessagePayload(CMDType.CONTROL_NEW, STATUS_PAYLOAD)
+    for _ in range(frames):
+        if per_frame:
+            proto._crypto = None
+        proto._encode_message(msg)
+
+
+def decode(dispatch, data: list, per_frame: bool):
+    """Feed the frames to the dispatcher one by one."""
+    for frame in data:
+        if per_frame:
+            dispatch._crypto = None
+        dispatch.add_data(frame)
+
+
+def main(frames: int = 500):
+    """Run the benchmark and print frames/sec for every case."""
+    for version in (3.3, 3.4, 3.5):
+        proto = protocol(version)
+        dispatch = dispatcher(version)
+        data = [device_frame(version, seqno) for seqno in range(1, frames + 1)]
+        for mode, per_frame in (("per-frame", True), ("session", False)):
+            rate = measure(encode, 5, proto, frames, per_frame) * frames
+            print(f"v{version} encode {mode:<10} {rate:>12,.0f} frames/s")
+            rate = measure(decode, 5, dispatch, data, per_frame) * frames
+            print(f"v{version} decode {mode:<10} {rate:>12,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,159 @@
+"""Benchmark of TuyaDiscovery.datagram_received with 500 broadcasting devices.
+
+Every device repeats the same broadcast every few seconds, 4 of 5 as 3.3 devices
+(55AA, AES-ECB) and the rest as 3.5 devices (6699, AES-GCM). The first round
+measures new devices, the next ones the repeats, for the current discovery and
+for the previous implementation that decrypted and re-sorted every time.
+
+Usage: python benchmarks/bench_discovery.py [--devices N] [--rounds N]
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from socket import inet_aton
+
+from common import ROOT, device_frame
+from pytuya import codec, parser
+from pytuya.cipher import AESCipher
+from pytuya.const import CMDType
+
+# Import discovery.py without running the integration __init__, which needs
+# Home Assistant: discovery.py itself only needs pytuya.
+PACKAGE = os.path.join(ROOT, "custom_components", "localtuya")
+spec = importlib.util.spec_from_file_location(
+    "localtuya", os.path.join(PACKAGE, "__init__.py"), submodule_search_locations=[PACKAGE]
+)
+sys.modules["localtuya"] = importlib.util.module_from_spec(spec)
+discovery = importlib.import_module("localtuya.discovery")
+
+BROADCAST_INTERVAL = 5  # Seconds between two broadcasts of a device.
+
+
+def broadcasts(count: int) -> list[bytes]:
+    """Return one broadcast datagram per simulated device."""
+    datagrams = []
+    for i in range(count):
+        version = "3.5" if i % 5 == 4 else "3.3"
+        payload = json.dumps(
+            {
+                "ip": f"192.168.{1 + i // 250}.{2 + i % 250}",
+                "gwId": f"bf{i:018d}",
+                "active": 2,
+                "ability": 0,
+                "mode": 0,
+                "encrypt": True,
+                "productKey": "keyjup78v54myhan",
+                "version": version,
+            }
+        ).encode()
+        if version == "3.5":
+            frame = device_frame(3.5, 0, CMDType.UDP_NEW, payload, discovery.UDP_KEY)
+        else:
+            encrypted = AESCipher(discovery.UDP_KEY).encrypt(payload, False)
+            frame = device_frame(3.3, 0, CMDType.UDP_NEW, encrypted)
+        datagrams.append(frame)
+    return datagrams
+
+
+class PreviousDiscovery(discovery.TuyaDiscovery):
+    """Discovery the way it worked before the datagram cache."""
+
+    def __init__(self, callback=None):
+        """Keep devices in a plain dict."""
+        super().__init__(callback)
+        self.devices = {}
+
+    devices = None  # Plain attribute, shadows the ordered property.
+
+    def datagram_received(self, data, addr):
+        """Decrypt and decode every datagram."""
+        try:
+            try:
+                data = self.decrypt_udp(data)
+            except Exception:  # pylint: disable=broad-except
+                pass
+            self.device_found(codec.loads(data))
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    @staticmethod
+    def decrypt_udp(message):
+        """Decrypt with a new cipher or GCM context for every datagram."""
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        if message[:4] == discovery.PREFIX_55AA_BIN:
+            payload = message[20:-8]
+            cipher = Cipher(
+                algorithms.AES(discovery.UDP_KEY), modes.ECB(), default_backend()
+            )
+            decryptor = cipher.decryptor()
+            data = decryptor.update(payload) + decryptor.finalize()
+            return data[: -data[-1]]
+        unpacked = parser.unpack_message(
+            message, hmac_key=discovery.UDP_KEY, no_retcode=None
+        )
+        return unpacked.payload.rstrip(b"\x00")
+
+    def device_found(self, device):
+        """Re-sort every device when one is new."""
+        gwid, ip = device.get("gwId"), device.get("ip")
+        if gwid in self.devices and (self.devices[gwid].get("ip") != ip):
+            self.devices.pop(gwid)
+        if gwid not in self.devices:
+            self.devices[gwid] = device
+            self.devices = dict(
+                sorted(self.devices.items(), key=lambda i: inet_aton(i[1]["ip"]))
+            )
+        if self._callback:
+            self._callback(device)
+
+
+def run(factory, datagrams: list[bytes], rounds: int) -> tuple[float, float]:
+    """Return the CPU µs per datagram of the first round and of the repeats."""
+    handler = factory(lambda device: None)
+    addr = ("192.168.1.1", 6667)
+    results = []
+    for rounds_ in (1, rounds):
+        order = datagrams[:]
+        start = time.process_time()
+        for _ in range(rounds_):
+            random.shuffle(order)
+            for datagram in order:
+                handler.datagram_received(datagram, addr)
+        elapsed = time.process_time() - start
+        results.append(elapsed / (rounds_ * len(datagrams)) * 1e6)
+    assert len(handler.devices) == len(datagrams)
+    return results[0], results[1]
+
+
+def main():
+    """Parse the arguments, run both implementations and report."""
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("--devices", type=int, default=500)
+    args.add_argument("--rounds", type=int, default=50)
+    args = args.parse_args()
+
+    random.seed(0)
+    datagrams = broadcasts(args.devices)
+    rate = args.devices / BROADCAST_INTERVAL  # Datagrams per second to handle.
+    for name, factory in (
+        ("previous", PreviousDiscovery),
+        ("current", discovery.TuyaDiscovery),
+    ):
+        first, repeat = run(factory, datagrams, args.rounds)
+        print(
+            f"{name:<9} first {first:>8.1f} µs/datagram  repeat {repeat:>6.1f}"
+            f" µs/datagram  {repeat * rate / 1e4:>6.3f}% CPU"
+            f" at {args.devices} devices"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Fleet benchmark against the device simulator.
+
+Starts a fleet of virtual devices, connects to all of them at once (a
+reconnect storm, as after a Home Assistant restart or a Wi-Fi outage), then
+measures status and set_dp latency over every connection and finally drops
+and re-establishes all connections, also timing until the first status reply.
+
+Usage:
+    python benchmarks/bench_fleet.py [--devices 500] [--version 3.4]
+        [--latency 0.02] [--loss 0.0] [--output fleet.json]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import statistics
+import time
+
+from common import LISTENER
+import pytuya
+from simulator import Simulator
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Return p50/p95/max of samples in milliseconds."""
+    if len(samples) < 2:
+        samples = samples * 2 or [0.0, 0.0]
+    cuts = statistics.quantiles(samples, n=20)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(cuts[18] * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+async def timed(coro) -> tuple[float, object]:
+    """Return how long coro took and its result."""
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+async def connect_all(
+    devices, timeout: float, first_status=False
+) -> tuple[list, list[float], int]:
+    """Connect to every device at once, return protocols, latencies and failures.
+
+    With first_status the latency runs until the first status reply, the moment
+    a reconnected device is usable again.
+    """
+
+    async def connect(device):
+        proto = await pytuya.connect(
+            device.host,
+            device.id,
+            device.local_key.decode("latin1"),
+            device.version,
+            False,
+            LISTENER,
+            port=device.port,
+            timeout=timeout,
+        )
+        if first_status and not await proto.status():
+            await proto.close()
+            raise ConnectionError("No status")
+        return proto
+
+    results = await asyncio.gather(
+        *(timed(connect(device)) for device in devices), return_exceptions=True
+    )
+    protocols, latencies = [], []
+    for result in results:
+        if isinstance(result, BaseException):
+            continue
+        latencies.append(result[0])
+        protocols.append(result[1])
+    return protocols, latencies, len(devices) - len(protocols)
+
+
+async def request_all(protocols, request) -> tuple[list[float], int]:
+    """Run request on every protocol at once, return latencies and failures."""
+    results = await asyncio.gather(
+        *(timed(request(proto)) for proto in protocols), return_exceptions=True
+    )
+    latencies = [r[0] for r in results if not isinstance(r, BaseException)]
+    return latencies, len(protocols) - len(latencies)
+
+
+async def close_all(protocols):
+    """Close every connection."""
+    await asyncio.gather(*(proto.close() for proto in protocols))
+
+
+async def run(args) -> dict:
+    """Run every phase and return the results keyed by phase."""
+    simulator = Simulator(args.seed)
+    devices = await simulator.start_fleet(
+        args.devices, args.version, latency=args.latency, loss=args.loss
+    )
+    results = {}
+
+    async def storm(name, first_status=False):
+        start = time.perf_counter()
+        protocols, latencies, failed = await connect_all(
+            devices, args.timeout, first_status
+        )
+        results[name] = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "failed": failed,
+            **percentiles(latencies),
+        }
+        return protocols
+
+    try:
+        protocols = await storm("connect_storm")
+        for name, request in (
+            ("status", lambda proto: proto.status()),
+            ("set_dp", lambda proto: proto.set_dp(True, 1)),
+            ("heartbeat", lambda proto: proto.heartbeat()),
+        ):
+            latencies, failed = await request_all(protocols, request)
+            results[name] = {"failed": failed, **percentiles(latencies)}
+
+        await close_all(protocols)
+        protocols = await storm("reconnect_storm")
+        await close_all(protocols)
+        protocols = await storm("reconnect_to_status", first_status=True)
+        await close_all(protocols)
+    finally:
+        await simulator.close()
+    return results
+
+
+def raise_file_limit(devices: int):
+    """Allow two sockets per device plus some headroom."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 2 * devices + 256
+    if soft < wanted:
+        limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+def main():
+    """Parse the arguments, run the benchmark and report."""
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("--devices", type=int, default=500)
+    args.add_argument("--version", type=float, default=3.4)
+    args.add_argument("--latency", type=float, default=0.02)
+    args.add_argument("--loss", type=float, default=0.0)
+    args.add_argument("--timeout", type=float, default=10.0, help="connect timeout")
+    args.add_argument("--seed", type=int, default=0)
+    args.add_argument("--output", help="write the results to this JSON file")
+    args = args.parse_args()
+
+    raise_file_limit(args.devices)
+    results = asyncio.run(run(args))
+    for phase, result in results.items():
+        print(f"{phase:<16} " + "  ".join(f"{k} {v}" for k, v in result.items()))
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "options": vars(args),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
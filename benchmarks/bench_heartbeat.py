@@ -0,0 +1,33 @@
+"""Micro-benchmark for heartbeat encoding.
+
+Compares the cached heartbeat frame (seqno and checksum patched per beat) with
+encoding the heartbeat from scratch, and prints the protocol heartbeat stats.
+
+Usage: python benchmarks/bench_heartbeat.py [beats]
+"""
+
+import sys
+
+from common import measure, protocol
+from pytuya.const import CMDType
+
+
+def main(beats: int = 10000):
+    """Run the benchmark and print heartbeats/sec for every version."""
+    for version in (3.3, 3.4, 3.5):
+        proto = protocol(version)
+        payload = proto._generate_payload(CMDType.HEART_BEAT)
+        rate = measure(proto._encode_message, beats, payload, False)
+        print(f"v{version} uncached {rate:>12,.0f} beats/s")
+        rate = measure(proto._encode_message, beats, payload)
+        print(f"v{version} cached   {rate:>12,.0f} beats/s")
+        stats = proto.stats
+        print(
+            f"v{version} stats    {stats.heartbeats} beats, "
+            f"{stats.heartbeat_frames_built} built, "
+            f"{stats.heartbeat_encode_ns / stats.heartbeats:,.0f} ns/beat"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,42 @@
+"""Benchmark for pipelined requests against a loopback gateway.
+
+Sends concurrent DP_QUERY requests through TuyaProtocol.exchange to a gateway
+that answers after a fixed latency, for several in-flight window sizes.
+
+Usage: python benchmarks/bench_pipeline.py [requests] [latency]
+"""
+
+import asyncio
+import sys
+import time
+
+from common import DEVICE_ID, LISTENER, LOCAL_KEY, LoopbackGateway
+import pytuya
+from pytuya.const import CMDType
+
+
+async def run(window: int, requests: int, latency: float) -> float:
+    """Return the replies per second with the given in-flight window."""
+    proto = pytuya.TuyaProtocol(
+        DEVICE_ID, LOCAL_KEY.decode("latin1"), 3.3, False, LISTENER, window
+    )
+    LoopbackGateway(proto, latency)
+    start = time.perf_counter()
+    replies = await asyncio.gather(
+        *(proto.exchange(CMDType.DP_QUERY) for _ in range(requests))
+    )
+    elapsed = time.perf_counter() - start
+    assert all("dps" in reply for reply in replies)
+    return requests / elapsed
+
+
+def main(requests: int = 20, latency: float = 0.2):
+    """Run the benchmark and print replies/sec for every window."""
+    for window in (1, 4, 8):
+        rate = asyncio.run(run(window, requests, latency))
+        print(f"window {window:<2} {rate:>8,.1f} replies/s (latency {latency}s)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 20, float(args[1]) if len(args) > 1 else 0.2)
@@ -0,0 +1,191 @@
+"""Push-to-state latency of status pushes, against the device simulator.
+
+Every virtual device is a power-metering plug with one entity per DP of
+STATUS_PAYLOAD. All devices change DP 1 at once with set_dp, the simulator
+pushes the change back and the time until the entity of DP 1 writes its state
+is measured, from the push received by the listener and from the set_dp sent.
+
+Both status deliveries of TuyaDevice are modelled without Home Assistant: the
+previous one sent the whole status with dispatcher_send, which hops through
+call_soon_threadsafe, ran every entity handler in the executor as it was no
+callback, and scheduled the state write with another call_soon_threadsafe. The
+current one calls the handlers of the updated DPs directly, on the event loop.
+
+Usage:
+    python benchmarks/bench_push.py [--devices 100] [--rounds 20] [--version 3.4]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from common import STATUS_PAYLOAD
+from bench_fleet import percentiles, raise_file_limit
+import pytuya
+from simulator import Simulator
+
+DPS = list(json.loads(STATUS_PAYLOAD)["dps"])
+WATCHED_DP = "1"  # The DP changed by every round.
+
+
+class Entity:
+    """An entity reading one DP, as LocalTuyaEntity handles status updates."""
+
+    def __init__(self, device, dp: str):
+        """Initialize an entity without status."""
+        self.device, self.dp, self.status = device, dp, {}
+
+    def previous_update(self, status: dict):
+        """Merge a copy of the whole status, then schedule the state write."""
+        last_status = self.status.copy()
+        self.status = {**self.status, **status}
+        if status != last_status:
+            self.device.loop.call_soon_threadsafe(self.write)
+
+    def update(self, status: dict):
+        """Merge the updated DPs, then write the state if one changed."""
+        last_status = self.status
+        changed = any(
+            dp not in last_status or last_status[dp] != value
+            for dp, value in status.items()
+        )
+        last_status.update(status)
+        if changed:
+            self.write()
+
+    def write(self):
+        """Record the state write of the watched entity."""
+        if self.dp == WATCHED_DP:
+            self.device.written(self)
+
+
+class Device(pytuya.TuyaListener):
+    """A TuyaDevice reduced to the delivery of the status to its entities."""
+
+    sub_devices = {}
+
+    def __init__(self, direct: bool, written):
+        """Initialize a device with one entity per DP."""
+        self.loop = asyncio.get_running_loop()
+        self.direct, self.written = direct, written
+        self.status = {}
+        self.entities = [Entity(self, dp) for dp in DPS]
+        self.routes = {entity.dp: [entity.update] for entity in self.entities}
+        self.sent = self.received = 0.0
+
+    def status_updated(self, status, delta=None):
+        """Deliver the status the previous or the current way."""
+        self.received = time.perf_counter()
+        if not self.direct:
+            self.status.update(status)
+            self.loop.call_soon_threadsafe(self._previous_send, self.status)
+            return
+
+        last = self.status
+        if delta is None:
+            delta = pytuya.StatusDelta.compare(last, status)
+        last.update(delta.dps)
+        updates = {}
+        for dp in delta.dps:
+            for handler in self.routes.get(dp, ()):
+                updates.setdefault(handler, {})[dp] = last[dp]
+        for handler, dps in updates.items():
+            handler(dps)
+
+    def _previous_send(self, status):
+        for entity in self.entities:
+            self.loop.run_in_executor(None, entity.previous_update, status)
+
+    def disconnected(self, exc=""):
+        """Ignore disconnects."""
+
+    def subdevice_state_updated(self, state):
+        """Ignore sub-device states."""
+
+
+async def run(devices, direct: bool, rounds: int) -> dict:
+    """Return the latencies of one delivery over every device and round."""
+    delivery, end_to_end = [], []
+    pending: set[Device] = set()
+    done = asyncio.Event()
+
+    def written(entity: Entity):
+        now = time.perf_counter()
+        device = entity.device
+        if device in pending:
+            delivery.append(now - device.received)
+            end_to_end.append(now - device.sent)
+            pending.discard(device)
+            if not pending:
+                done.set()
+
+    listeners = [Device(direct, written) for _ in devices]
+    protocols = await asyncio.gather(
+        *(
+            pytuya.connect(
+                device.host,
+                device.id,
+                device.local_key.decode("latin1"),
+                device.version,
+                False,
+                listener,
+                port=device.port,
+            )
+            for device, listener in zip(devices, listeners)
+        )
+    )
+    for proto, listener in zip(protocols, listeners):
+        listener.status_updated(await proto.status())
+    await asyncio.sleep(0.1)  # Let the first delivery settle.
+
+    cpu = time.process_time()
+    for value in range(2, rounds + 2):  # Not 1, equal to the initial True.
+        pending.update(listeners)
+        done.clear()
+        for listener in listeners:
+            listener.sent = time.perf_counter()
+        await asyncio.gather(*(proto.set_dp(value, 1) for proto in protocols))
+        await asyncio.wait_for(done.wait(), 10)
+    cpu = time.process_time() - cpu
+
+    await asyncio.gather(*(proto.close() for proto in protocols))
+    return {
+        "delivery": percentiles(delivery),
+        "end_to_end": percentiles(end_to_end),
+        "cpu_us_per_push": round(cpu / (rounds * len(devices)) * 1e6, 1),
+    }
+
+
+async def main_async(args):
+    """Run both deliveries against the same fleet and report."""
+    simulator = Simulator(args.seed)
+    devices = await simulator.start_fleet(args.devices, args.version)
+    try:
+        for name, direct in (("previous", False), ("current", True)):
+            result = await run(devices, direct, args.rounds)
+            for phase in ("delivery", "end_to_end"):
+                print(
+                    f"{name:<9} {phase:<11} "
+                    + "  ".join(f"{k} {v}" for k, v in result[phase].items())
+                )
+            print(f"{name:<9} cpu_us_per_push {result['cpu_us_per_push']}")
+    finally:
+        await simulator.close()
+
+
+def main():
+    """Parse the arguments and run the benchmark."""
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("--devices", type=int, default=100)
+    args.add_argument("--rounds", type=int, default=20)
+    args.add_argument("--version", type=float, default=3.4)
+    args.add_argument("--seed", type=int, default=0)
+    args = args.parse_args()
+
+    raise_file_limit(args.devices)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
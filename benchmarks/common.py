@@ -0,0 +1,112 @@
+"""Shared helpers for the offline pytuya benchmarks.
+
+The benchmarks import pytuya straight from the integration folder, so they run
+without Home Assistant or any real device.
+"""
+
+import asyncio
+import os
+import struct
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "localtuya", "core"))
+
+import pytuya  # noqa: E402
+from pytuya import parser  # noqa: E402
+from pytuya.cipher import AESCipher  # noqa: E402
+from pytuya.const import Affix, CMDType, TuyaMessage  # noqa: E402
+
+LOCAL_KEY = b"wV[NcWGUSFF`dSgO"
+DEVICE_ID = "767823809c9c1f458745"
+
+# A realistic status push of a power-metering plug.
+STATUS_PAYLOAD = (
+    b'{"dps":{"1":true,"9":0,"17":12,"18":1270,"19":2954,"20":2301,'
+    b'"21":1,"22":624,"23":30235,"24":17543,"25":2940,"26":0}}'
+)
+
+
+def device_frame(version: float, seqno=1, cmd=CMDType.STATUS, payload=None, key=None):
+    """Return a frame as a device would send it for the given protocol version."""
+    key = key or LOCAL_KEY
+    payload = STATUS_PAYLOAD if payload is None else payload
+    retcode = struct.pack(">I", 0)
+    if version >= 3.5:
+        msg = TuyaMessage(seqno, cmd, 0, payload, 0, True, Affix.prefix_6699.value)
+        return parser.pack_message(msg, hmac_key=key)
+
+    msg = TuyaMessage(seqno, cmd, 0, retcode + payload, 0, True)
+    return parser.pack_message(msg, hmac_key=key if version >= 3.4 else None)
+
+
+def dispatcher(version: float, key=None):
+    """Return a MessageDispatcher that drops every message."""
+    return pytuya.MessageDispatcher(
+        DEVICE_ID, lambda *args, **kwargs: None, version, key or LOCAL_KEY
+    )
+
+
+class _Listener(pytuya.TuyaListener):
+    """Listener that ignores every callback."""
+
+    sub_devices = {}
+
+    def status_updated(self, status, delta=None):
+        """Ignore status updates."""
+
+    def disconnected(self, exc=""):
+        """Ignore disconnects."""
+
+    def subdevice_state_updated(self, state):
+        """Ignore sub-device states."""
+
+
+LISTENER = _Listener()
+
+
+def protocol(version: float, key=None):
+    """Return a TuyaProtocol that is not connected to any transport."""
+
+    async def create():
+        return pytuya.TuyaProtocol(
+            DEVICE_ID, (key or LOCAL_KEY).decode("latin1"), version, False, LISTENER
+        )
+
+    return asyncio.run(create())
+
+
+class LoopbackGateway:
+    """Transport that answers every 3.3 request like a gateway after latency."""
+
+    def __init__(self, protocol, latency: float):
+        """Attach to protocol as its transport."""
+        self.protocol = protocol
+        self.latency = latency
+        self.requests = 0
+        self._body = AESCipher(LOCAL_KEY).encrypt(STATUS_PAYLOAD, False)
+        self._loop = asyncio.get_running_loop()
+        protocol.connection_made(self)
+
+    def write(self, data):
+        """Schedule the reply of the request in data."""
+        header = parser.parse_header(data)
+        self.requests += 1
+        frame = device_frame(3.3, header.seqno, header.cmd, self._body)
+        self._loop.call_later(self.latency, self.protocol.data_received, frame)
+
+    def is_closing(self):
+        """Return False, the loopback is never closed."""
+        return False
+
+    def close(self):
+        """Nothing to close."""
+
+
+def measure(func, repeat: int, *args) -> float:
+    """Call func repeat times and return the calls per second."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return repeat / (time.perf_counter() - start)
@@ -0,0 +1,211 @@
+"""Offline pytuya benchmark suite.
+
+Measures the protocol hot paths for every protocol version without hardware:
+pack_message, unpack_message, MessageDispatcher.add_data, _encode_message,
+_decode_payload and, for 3.4/3.5, _negotiate_session_key against a fake device.
+Every case reports frames/sec and the peak bytes allocated by one call.
+
+Usage:
+    python benchmarks/run.py [--loops N] [--output result.json] [--compare old.json]
+
+Store the JSON of one commit and pass it to --compare on another one to see
+the relative change of every case.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from common import (
+    DEVICE_ID,
+    LISTENER,
+    LOCAL_KEY,
+    ROOT,
+    STATUS_PAYLOAD,
+    device_frame,
+    dispatcher,
+    protocol,
+)
+import pytuya
+from pytuya import parser
+from pytuya.cipher import CipherContext
+from pytuya.const import Affix, CMDType, MessagePayload, TuyaMessage
+from pytuya.pacer import WritePacer
+
+VERSIONS = (3.1, 3.2, 3.3, 3.4, 3.5)
+
+
+def device_payload(version: float, proto: pytuya.TuyaProtocol) -> bytes:
+    """Return a DP_QUERY reply payload as _decode_payload receives it."""
+    if version in (3.1, 3.5):
+        # 3.1 replies in clear text, 3.5 frames are already decrypted by GCM.
+        return STATUS_PAYLOAD
+    return proto.crypto.cipher.encrypt(STATUS_PAYLOAD, False)
+
+
+def frame_cases(version: float) -> dict:
+    """Return the synchronous cases of version as name -> callable."""
+    proto = protocol(version)
+    dispatch = dispatcher(version)
+    context = CipherContext(LOCAL_KEY) if version >= 3.4 else None
+    frame = device_frame(version)
+    prefix = Affix.prefix_6699.value if version >= 3.5 else Affix.prefix_55aa.value
+    msg = TuyaMessage(1, CMDType.STATUS, 0, STATUS_PAYLOAD, 0, True, prefix)
+    control = MessagePayload(CMDType.CONTROL, STATUS_PAYLOAD)
+    payload = device_payload(version, proto)
+
+    return {
+        "pack_message": lambda: parser.pack_message(msg, context=context),
+        "unpack_message": lambda: parser.unpack_message(frame, context=context),
+        "add_data": lambda: dispatch.add_data(frame),
+        "encode_message": lambda: proto._encode_message(control),
+        "decode_payload": lambda: proto._decode_payload(payload),
+    }
+
+
+class FakeDevice:
+    """Transport answering the session key negotiation like a 3.4/3.5 device."""
+
+    def __init__(self, proto: pytuya.TuyaProtocol):
+        """Attach to proto as its transport."""
+        self.proto = proto
+        self.remote_nonce = b"fedcba9876543210"
+        self.context = CipherContext(LOCAL_KEY)
+        proto.connection_made(self)
+
+    def write(self, data):
+        """Reply to SESS_KEY_NEG_START, ignore everything else."""
+        header = parser.parse_header(data)
+        if header.cmd != CMDType.SESS_KEY_NEG_START:
+            return
+        payload = self.remote_nonce + self.context.hmac(self.proto.local_nonce)
+        if self.proto.version == 3.4:
+            payload = self.context.cipher.encrypt(payload, False)
+        reply = device_frame(
+            self.proto.version, header.seqno, CMDType.SESS_KEY_NEG_RESP, payload
+        )
+        asyncio.get_running_loop().call_soon(self.proto.data_received, reply)
+
+    def is_closing(self):
+        """Return False, the fake device never disconnects."""
+        return False
+
+    def close(self):
+        """Nothing to close."""
+
+
+async def negotiate_case(version: float, loops: int) -> tuple[float, int]:
+    """Return frames/sec and peak bytes of _negotiate_session_key."""
+    proto = pytuya.TuyaProtocol(
+        DEVICE_ID, LOCAL_KEY.decode("latin1"), version, False, LISTENER
+    )
+    proto.pacer = WritePacer(version, burst=2 * loops + 2)  # Do not measure pacing.
+    FakeDevice(proto)
+    assert await proto._ensure_session_key()  # Started by connection_made.
+
+    async def negotiate():
+        proto.dispatcher.local_key = LOCAL_KEY
+        assert await proto._negotiate_session_key()
+
+    start = time.perf_counter()
+    for _ in range(loops):
+        await negotiate()
+    # Every negotiation exchanges three frames.
+    rate = 3 * loops / (time.perf_counter() - start)
+
+    tracemalloc.start()
+    await negotiate()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rate, peak
+
+
+def measure_case(func, loops: int) -> tuple[float, int]:
+    """Return calls/sec and the peak bytes allocated by one call of func."""
+    func()  # Warm up caches, as a running connection would.
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    rate = loops / (time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rate, peak
+
+
+def run(loops: int) -> dict:
+    """Run every case and return the results keyed by case name."""
+    results = {}
+    for version in VERSIONS:
+        for name, func in frame_cases(version).items():
+            rate, peak = measure_case(func, loops)
+            results[f"v{version}/{name}"] = {"frames_per_sec": rate, "peak_bytes": peak}
+        if version >= 3.4:
+            rate, peak = asyncio.run(negotiate_case(version, max(1, loops // 20)))
+            results[f"v{version}/negotiate_session_key"] = {
+                "frames_per_sec": rate,
+                "peak_bytes": peak,
+            }
+    return results
+
+
+def git_revision() -> str | None:
+    """Return the current commit of the repository, if any."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    """Print the results, with the change against baseline when given."""
+    for case, result in results.items():
+        line = (
+            f"{case:<28} {result['frames_per_sec']:>12,.0f} frames/s"
+            f" {result['peak_bytes']:>8,} B"
+        )
+        if baseline and (old := baseline.get(case)):
+            speed = result["frames_per_sec"] / old["frames_per_sec"] - 1
+            line += f"  {speed:>+7.1%} speed  {result['peak_bytes'] - old['peak_bytes']:>+7,} B"
+        print(line)
+
+
+def main():
+    """Parse the arguments, run the suite and report."""
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("--loops", type=int, default=2000)
+    args.add_argument("--output", help="write the results to this JSON file")
+    args.add_argument("--compare", help="JSON results of a previous run")
+    args = args.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "loops": args.loops,
+        "results": run(args.loops),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+
+    print_results(report["results"], baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Asyncio simulator of local Tuya devices and gateways.
+
+Every virtual device is a TCP server speaking the same wire protocol as
+core/pytuya: 55AA framing for 3.1-3.4 and 6699 for 3.5, the 3.4/3.5 session
+key negotiation, DP_QUERY, CONTROL, UPDATEDPS, HEART_BEAT and, for gateways,
+LAN_EXT_STREAM sub-device status. Replies can be delayed (latency) or dropped
+(loss), and devices can push status updates on their own.
+
+Devices either listen on ephemeral ports of 127.0.0.1, which is enough for
+pytuya.connect(port=...), or on port 6668 of their own loopback address
+(127.0.x.y, Linux only) so a TuyaDevice configured with that host connects
+to them unchanged.
+
+Usage:
+    python benchmarks/simulator.py --devices 100 --version 3.4 [--loopback]
+
+prints the device configurations as JSON and serves them until interrupted.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import struct
+import time
+from dataclasses import dataclass, field
+
+from common import LOCAL_KEY, STATUS_PAYLOAD
+from pytuya import parser
+from pytuya.cipher import AESCipher, CipherContext
+from pytuya.const import Affix, CMDType, TuyaMessage
+
+PORT = 6668
+HEADER_SIZE = {False: 16, True: 18}  # 55AA and 6699 header sizes.
+PROTOCOL_3x_HEADER = 12 * b"\x00"
+PROTOCOL_VERSION_BYTES_31 = b"3.1"
+
+
+@dataclass
+class VirtualDevice:
+    """Configuration and state of one simulated device."""
+
+    id: str
+    local_key: bytes = LOCAL_KEY
+    version: float = 3.3
+    dps: dict = field(default_factory=lambda: json.loads(STATUS_PAYLOAD)["dps"])
+    sub_devices: dict[str, dict] = field(default_factory=dict)  # cid -> dps
+    latency: float = 0.0  # Seconds before every reply.
+    loss: float = 0.0  # Probability to silently drop a request.
+    push_interval: float = 0.0  # Seconds between status pushes, 0 disables.
+    host: str = "127.0.0.1"
+    port: int = 0
+    requests: int = 0
+    connections: int = 0
+
+    @property
+    def version_header(self) -> bytes:
+        """Return the header some payloads are prefixed with."""
+        return str(self.version).encode() + PROTOCOL_3x_HEADER
+
+    def as_config(self) -> dict:
+        """Return what a client needs to connect to this device."""
+        return {
+            "id": self.id,
+            "local_key": self.local_key.decode("latin1"),
+            "version": self.version,
+            "host": self.host,
+            "port": self.port,
+            "sub_devices": list(self.sub_devices),
+        }
+
+
+class DeviceSession(asyncio.Protocol):
+    """One client connection to a virtual device."""
+
+    def __init__(self, device: VirtualDevice):
+        """Initialize the session with the device real key."""
+        self.device = device
+        self.context = CipherContext(device.local_key)
+        self.real_context = self.context
+        self.local_nonce = b""
+        self.remote_nonce = b"".join(
+            random.choice(string.ascii_letters).encode() for _ in range(16)
+        )
+        self.buffer = bytearray()
+        self.transport: asyncio.Transport | None = None
+        self._loop = asyncio.get_running_loop()
+        self._push: asyncio.TimerHandle | None = None
+
+    def connection_made(self, transport):
+        """Start pushing status updates if configured."""
+        self.transport = transport
+        self.device.connections += 1
+        if self.device.push_interval:
+            self._schedule_push()
+
+    def connection_lost(self, exc):
+        """Stop pushing status updates."""
+        self.transport = None
+        if self._push:
+            self._push.cancel()
+
+    def data_received(self, data):
+        """Handle every complete frame in data."""
+        self.buffer += data
+        while len(self.buffer) >= HEADER_SIZE[self.device.version >= 3.5]:
+            try:
+                header = parser.parse_header(self.buffer)
+            except parser.DecodeError:
+                self.buffer.clear()
+                return
+            if len(self.buffer) < header.total_length:
+                return
+            frame = bytes(self.buffer[: header.total_length])
+            del self.buffer[: header.total_length]
+            self.device.requests += 1
+            if random.random() < self.device.loss:
+                continue
+            context = self.context if self.device.version >= 3.4 else None
+            msg = parser.unpack_message(
+                frame, header=header, no_retcode=True, context=context
+            )
+            self.handle(msg)
+
+    def decrypt(self, payload: bytes) -> bytes:
+        """Return the clear payload of a client message."""
+        device = self.device
+        cipher = self.context.cipher
+        if device.version >= 3.5:
+            pass  # Already decrypted with the frame.
+        elif device.version >= 3.4:
+            payload = cipher.decrypt(payload, False, decode_text=False)
+        elif payload.startswith(PROTOCOL_VERSION_BYTES_31):
+            # 3.1 CONTROL: version, 16 bytes of MD5 then base64 of the payload.
+            payload = cipher.decrypt(payload[19:], decode_text=False)
+        elif device.version >= 3.2:
+            if payload.startswith(device.version_header[:3]):
+                payload = payload[len(device.version_header) :]
+            payload = cipher.decrypt(payload, False, decode_text=False)
+
+        if payload.startswith(device.version_header[:3]):
+            payload = payload[len(device.version_header) :]
+        return payload
+
+    def handle(self, msg: TuyaMessage):
+        """Reply to a client message."""
+        cmd = msg.cmd
+        if cmd == CMDType.SESS_KEY_NEG_START:
+            return self.negotiate_start(msg)
+        if cmd == CMDType.SESS_KEY_NEG_FINISH:
+            return self.negotiate_finish(msg)
+
+        try:
+            payload = self.decrypt(msg.payload)
+            request = json.loads(payload) if payload else {}
+        except ValueError:
+            # Wrong key, e.g. a lost SESS_KEY_NEG_FINISH: devices hang up.
+            self.transport.close()
+            return
+        data = request.get("data") if isinstance(request.get("data"), dict) else {}
+        cid = request.get("cid") or data.get("cid")
+        dps = self.device.sub_devices.get(cid) if cid else self.device.dps
+
+        if cmd == CMDType.HEART_BEAT:
+            self.reply(cmd, msg.seqno, b"")
+        elif cmd in (CMDType.DP_QUERY, CMDType.DP_QUERY_NEW):
+            if dps is None:
+                return self.reply(cmd, msg.seqno, b"")
+            self.reply(cmd, msg.seqno, self.status_payload(dps, cid))
+        elif cmd in (CMDType.CONTROL, CMDType.CONTROL_NEW):
+            changes = request.get("dps") or data.get("dps") or {}
+            self.reply(cmd, msg.seqno, b"")
+            if dps is not None:
+                dps.update(changes)
+                self.push(changes, cid)
+        elif cmd == CMDType.UPDATEDPS:
+            self.reply(cmd, msg.seqno, b"")
+            requested = [str(dp) for dp in request.get("dpId", [])]
+            self.push({dp: v for dp, v in self.device.dps.items() if dp in requested})
+        elif cmd == CMDType.LAN_EXT_STREAM:
+            state = {"online": list(self.device.sub_devices), "offline": []}
+            body = {"reqType": request.get("reqType"), "data": state}
+            self.reply(cmd, msg.seqno, json.dumps(body).encode())
+
+    def status_payload(self, dps: dict, cid: str = None) -> bytes:
+        """Return the JSON status of dps the way this version formats it."""
+        if self.device.version >= 3.4:
+            data = {"dps": dps, **({"cid": cid} if cid else {})}
+            body = {"protocol": 4, "t": int(time.time()), "data": data}
+        else:
+            body = {
+                "devId": self.device.id,
+                "dps": dps,
+                **({"cid": cid} if cid else {}),
+            }
+        return json.dumps(body).encode()
+
+    def push(self, dps: dict, cid: str = None):
+        """Push a STATUS message with dps."""
+        if dps:
+            self.reply(CMDType.STATUS, 0, self.status_payload(dps, cid), header=True)
+
+    def _schedule_push(self):
+        self._push = self._loop.call_later(self.device.push_interval, self._push_power)
+
+    def _push_power(self):
+        """Push a new power reading like a metering plug."""
+        if self.transport is None:
+            return
+        dps = self.device.dps
+        dps["19"] = random.randint(0, 3000)
+        self.push({"19": dps["19"]})
+        self._schedule_push()
+
+    def negotiate_start(self, msg: TuyaMessage):
+        """Reply to SESS_KEY_NEG_START with our nonce and the HMAC of theirs."""
+        payload = msg.payload
+        if self.device.version < 3.5:
+            payload = self.context.cipher.decrypt(payload, False, decode_text=False)
+        self.local_nonce = payload[:16]
+        answer = self.remote_nonce + self.context.hmac(self.local_nonce)
+        self.reply(CMDType.SESS_KEY_NEG_RESP, msg.seqno, answer)
+
+    def negotiate_finish(self, msg: TuyaMessage):
+        """Switch to the session key once the client proved it knows ours."""
+        payload = msg.payload
+        if self.device.version < 3.5:
+            payload = self.context.cipher.decrypt(payload, False, decode_text=False)
+        if payload[:32] != self.context.hmac(self.remote_nonce):
+            self.transport.close()
+            return
+        xored = bytes(a ^ b for a, b in zip(self.local_nonce, self.remote_nonce))
+        cipher = AESCipher(self.device.local_key)
+        if self.device.version >= 3.5:
+            iv = self.local_nonce[:12]
+            key = cipher.encrypt(xored, use_base64=False, pad=False, iv=iv)[12:28]
+        else:
+            key = cipher.encrypt(xored, False, pad=False)
+        self.context = CipherContext(key)
+
+    def encode(self, cmd, seqno, payload: bytes, header=False) -> bytes:
+        """Return a frame of this device version carrying payload."""
+        device = self.device
+        cipher = self.context.cipher
+        if device.version >= 3.5:
+            if header:
+                payload = device.version_header + payload
+            prefix = Affix.prefix_6699.value
+            msg = TuyaMessage(seqno, cmd, 0, payload, 0, True, prefix, True)
+            return parser.pack_message(msg, context=self.context)
+
+        if payload and device.version >= 3.4:
+            # 3.4 encrypts the version header together with the payload.
+            if header:
+                payload = device.version_header + payload
+            payload = cipher.encrypt(payload, False)
+        elif payload and device.version >= 3.2:
+            payload = cipher.encrypt(payload, False)
+            if header:
+                payload = device.version_header + payload
+
+        msg = TuyaMessage(seqno, cmd, 0, struct.pack(">I", 0) + payload, 0, True)
+        context = self.context if device.version >= 3.4 else None
+        return parser.pack_message(msg, context=context)
+
+    def reply(self, cmd, seqno, payload: bytes, header=False):
+        """Send a frame after the configured latency."""
+        frame = self.encode(cmd, seqno, payload, header)
+        if self.device.latency:
+            self._loop.call_later(self.device.latency, self._write, frame)
+        else:
+            self._write(frame)
+
+    def _write(self, frame: bytes):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.write(frame)
+
+
+class Simulator:
+    """A fleet of virtual devices served on localhost."""
+
+    def __init__(self, seed: int = 0):
+        """Initialize an empty fleet."""
+        self.devices: list[VirtualDevice] = []
+        self._servers: list[asyncio.Server] = []
+        self._random = random.Random(seed)
+
+    async def add(self, device: VirtualDevice) -> VirtualDevice:
+        """Start serving device, a port 0 is replaced by the one assigned."""
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(
+            lambda: DeviceSession(device), device.host, device.port
+        )
+        device.port = server.sockets[0].getsockname()[1]
+        self._servers.append(server)
+        self.devices.append(device)
+        return device
+
+    async def start_fleet(
+        self,
+        count: int,
+        version: float = 3.3,
+        sub_devices: int = 0,
+        loopback: bool = False,
+        **options,
+    ) -> list[VirtualDevice]:
+        """Start count devices with random ids and keys.
+
+        loopback gives every device its own 127.0.x.y address on port 6668,
+        otherwise they share 127.0.0.1 with ephemeral ports. Every device gets
+        sub_devices children, which makes it a gateway. options are passed to
+        VirtualDevice (latency, loss, push_interval).
+        """
+        devices = []
+        for index in range(count):
+            start = len(self.devices)
+            device = VirtualDevice(
+                id=f"sim{start:05d}" + self._token(12, string.hexdigits.lower()),
+                local_key=self._token(16, string.ascii_letters).encode(),
+                version=version,
+                sub_devices={
+                    self._token(16, string.hexdigits.lower()): {"1": False, "2": 0}
+                    for _ in range(sub_devices)
+                },
+                **options,
+            )
+            if loopback:
+                device.host = f"127.0.{start // 250}.{start % 250 + 2}"
+                device.port = PORT
+            devices.append(await self.add(device))
+        return devices
+
+    def _token(self, length: int, alphabet: str) -> str:
+        return "".join(self._random.choice(alphabet) for _ in range(length))
+
+    async def close(self):
+        """Stop serving every device."""
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+
+
+async def serve(args):
+    """Start the fleet described by args and serve it until cancelled."""
+    simulator = Simulator(args.seed)
+    devices = await simulator.start_fleet(
+        args.devices,
+        args.version,
+        sub_devices=args.sub_devices,
+        loopback=args.loopback,
+        latency=args.latency,
+        loss=args.loss,
+        push_interval=args.push,
+    )
+    print(json.dumps([device.as_config() for device in devices], indent=2))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.close()
+
+
+def main():
+    """Parse the arguments and serve the fleet."""
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("--devices", type=int, default=10)
+    args.add_argument("--version", type=float, default=3.3)
+    args.add_argument("--sub-devices", type=int, default=0)
+    args.add_argument("--latency", type=float, default=0.0)
+    args.add_argument("--loss", type=float, default=0.0)
+    args.add_argument("--push", type=float, default=0.0, help="push interval")
+    args.add_argument("--loopback", action="store_true", help="127.0.x.y:6668")
+    args.add_argument("--seed", type=int, default=0)
+    try:
+        asyncio.run(serve(args.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,9 @@ from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.event import async_track_time_interval
 
 from .coordinator import TuyaDevice, HassLocalTuyaData, TuyaCloudApi
+from .core.capabilities import CapabilityStore
+from .core.pytuya.scheduler import HeartbeatScheduler
+from .core.startup import StartupScheduler
 from .config_flow import ENTRIES_VERSION
 from .const import (
     ATTR_UPDATED_AT,
@@ -38,7 +41,11 @@ from .const import (
     CONF_NO_CLOUD,
     CONF_PRODUCT_KEY,
     CONF_USER_ID,
+    DATA_CAPABILITIES,
+    DATA_DEVICE_INDEX,
     DATA_DISCOVERY,
+    DATA_HEARTBEATS,
+    DATA_STARTUP,
     DOMAIN,
     PLATFORMS,
 )
@@ -63,9 +70,16 @@ SERVICE_SET_DP_SCHEMA = vol.Schema(
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the LocalTuya integration component."""
     hass.data.setdefault(DOMAIN, {})
+    # One timer wheel runs the heartbeats of every connection.
+    hass.data[DOMAIN][DATA_HEARTBEATS] = HeartbeatScheduler(hass.loop)
+    capabilities = CapabilityStore(hass)
+    await capabilities.async_load()
+    hass.data[DOMAIN][DATA_CAPABILITIES] = capabilities
+    # Connects of every entry go through one queue, gateways first.
+    hass.data[DOMAIN][DATA_STARTUP] = StartupScheduler(hass)
 
-    current_entries = hass.config_entries.async_entries(DOMAIN)
-    device_cache = {}
+    # Broadcasts are matched to the configured devices through this index.
+    device_index = hass.data[DOMAIN][DATA_DEVICE_INDEX] = DeviceIndex(hass)
 
     async def _handle_reload(service: ServiceCall):
         """Handle reload service call."""
@@ -103,51 +117,32 @@ async def async_setup(hass: HomeAssistant, config: dict):
         device_ip = device["ip"]
         device_id = device["gwId"]
         product_key = device["productKey"]
-        # If device is not in cache, check if a config entry exists
-        entry: ConfigEntry = async_config_entry_by_device_id(hass, device_id)
-
-        if entry is None:
-            return
+        for indexed in device_index.get(device_id):
+            entry = indexed.entry
+            if not entry.state == ConfigEntryState.LOADED:
+                continue
 
-        hass_data: HassLocalTuyaData = hass.data[DOMAIN][entry.entry_id]
-
-        if device_id not in device_cache or device_id not in device_cache.get(
-            device_id, {}
-        ):
-            if entry and device_id in entry.data[CONF_DEVICES]:
-                # Save address from config entry in cache to trigger
-                # potential update below
-                host_ip = entry.data[CONF_DEVICES][device_id][CONF_HOST]
-                device_cache[device_id] = {device_id: host_ip}
-
-        for subdev_id, dev_config in entry.data[CONF_DEVICES].items():
-            if dev_config.get(CONF_NODE_ID):
-                if gateway_id := dev_config.get(CONF_GATEWAY_ID):
-                    if entry and device_id == gateway_id:
-                        device_cache[device_id] = device_cache.get(device_id, {})
-                        device_cache[device_id].update(
-                            {subdev_id: dev_config.get(CONF_HOST)}
-                        )
+            hass_data: HassLocalTuyaData = hass.data[DOMAIN][entry.entry_id]
+            if device := hass_data.devices.get(device_ip):
+                device.announced()
 
-        if device_id not in device_cache:
-            return
-        if not entry.state == ConfigEntryState.LOADED:
-            return
-
-        if device := hass_data.devices.get(device_ip):
-            ...
+            # Devices re-broadcast every few seconds, mostly with nothing new.
+            if indexed.seen == (device_ip, product_key):
+                continue
+            indexed.seen = (device_ip, product_key)
+            _update_device_address(entry, indexed, device_ip, product_key)
 
+    def _update_device_address(entry, indexed, device_ip, product_key):
+        """Update the host and product key of the devices reached through gwId."""
         # hass.create_task(hass_data.cloud_data.async_get_devices_list())
         new_data = entry.data.copy()
         updated = False
-        for dev_id, host in device_cache[device_id].items():
-            if dev_id not in entry.data[CONF_DEVICES]:
-                continue
+        for dev_id, host in indexed.hosts.items():
             dev_entry = entry.data[CONF_DEVICES][dev_id]
             if host != device_ip:
                 updated = True
                 new_data[CONF_DEVICES][dev_id][CONF_HOST] = device_ip
-                device_cache[device_id][dev_id] = device_ip
+                indexed.hosts[dev_id] = device_ip
 
             if (p_key := dev_entry.get(CONF_PRODUCT_KEY)) and p_key != product_key:
                 updated = True
@@ -157,7 +152,10 @@ async def async_setup(hass: HomeAssistant, config: dict):
         # so no need to connect in that case.
         if updated:
             _LOGGER.debug(
-                "Updating keys for device %s: %s %s", device_id, device_ip, product_key
+                "Updating keys for device %s: %s %s",
+                indexed.gw_id,
+                device_ip,
+                product_key,
             )
             new_data[ATTR_UPDATED_AT] = str(int(time.time() * 1000))
             hass.config_entries.async_update_entry(entry, data=new_data)
@@ -318,6 +316,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
 
     hass_localtuya = HassLocalTuyaData(tuya_api, {})
     hass.data[DOMAIN][entry.entry_id] = hass_localtuya
+    if device_index := hass.data[DOMAIN].get(DATA_DEVICE_INDEX):
+        device_index.invalidate()
 
     def _setup_devices(entry_devices: dict):
         """Setup Localtuya devices object."""
@@ -362,8 +362,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
 
     # Note: entry.async_on_unload items are called in LIFO order!
 
+    startup: StartupScheduler | None = hass.data[DOMAIN].get(DATA_STARTUP)
     for dev in connect_to_devices:
-        entry.async_create_task(hass, dev.async_connect())
+        if startup:
+            startup.async_add(entry, dev)
+        else:
+            entry.async_create_task(hass, dev.async_connect())
         entry.async_on_unload(dev.close)
 
     entry.async_on_unload(entry.add_update_listener(update_listener))
@@ -387,6 +391,8 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # Unload the platforms.
     await hass.config_entries.async_unload_platforms(entry, PLATFORMS.values())
     hass.data[DOMAIN].pop(entry.entry_id)
+    if device_index := hass.data[DOMAIN].get(DATA_DEVICE_INDEX):
+        device_index.invalidate()
 
     _LOGGER.info("Unload completed")
     return True
@@ -500,6 +506,57 @@ def _device_id_by_identifiers(identifiers: set[tuple[str, str]]):
     return list(identifiers)[0][1].split("_")[-1]
 
 
+@dataclass
+class IndexedDevice:
+    """Devices of an entry reached through the broadcasts of one gwId."""
+
+    gw_id: str
+    entry: ConfigEntry
+    hosts: dict[str, str]  # Device id -> configured host, the gwId and its sub-devices.
+    seen: tuple[str, str] | None = None  # IP and product key of the last broadcast.
+
+
+class DeviceIndex:
+    """Configured devices by the gwId of their broadcasts.
+
+    Replaces scanning every entry for every broadcast, the index is rebuilt on
+    the next broadcast after an entry is set up or unloaded.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize an index to be built on first use."""
+        self.hass = hass
+        self._index: dict[str, list[IndexedDevice]] | None = None
+
+    @callback
+    def invalidate(self):
+        """Rebuild the index on next use, the entries changed."""
+        self._index = None
+
+    @callback
+    def get(self, gw_id: str) -> list[IndexedDevice]:
+        """Return the devices reached through gw_id, one item per entry."""
+        if self._index is None:
+            self._index = self._build()
+        return self._index.get(gw_id, [])
+
+    def _build(self) -> dict[str, list[IndexedDevice]]:
+        index: dict[str, list[IndexedDevice]] = {}
+        for entry in self.hass.config_entries.async_entries(DOMAIN):
+            by_gateway: dict[str, IndexedDevice] = {}
+            for dev_id, dev_conf in entry.data[CONF_DEVICES].items():
+                gw_id = dev_id
+                if dev_conf.get(CONF_NODE_ID):
+                    # Sub-devices move with the gateway that broadcasts.
+                    if not (gw_id := dev_conf.get(CONF_GATEWAY_ID)):
+                        continue
+                if (indexed := by_gateway.get(gw_id)) is None:
+                    indexed = by_gateway[gw_id] = IndexedDevice(gw_id, entry, {})
+                    index.setdefault(gw_id, []).append(indexed)
+                indexed.hosts[dev_id] = dev_conf.get(CONF_HOST)
+        return index
+
+
 @callback
 def async_config_entry_by_device_id(hass: HomeAssistant, device_id: str):
     """Look up config entry by device id."""
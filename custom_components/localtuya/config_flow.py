@@ -7,7 +7,9 @@ import time
 import copy
 from importlib import import_module
 from functools import partial
-from collections.abc import Coroutine
+from collections import Counter
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass, field
 from typing import Any
 
 
@@ -44,6 +46,7 @@ from homeassistant.const import (
 
 from .coordinator import HassLocalTuyaData
 from .core import pytuya
+from .core.capabilities import CapabilityStore, DeviceCapabilities
 from .core.cloud_api import TUYA_ENDPOINTS, TuyaCloudApi
 from .core.helpers import templates, get_gateway_by_deviceid, gen_localtuya_entities
 from .const import (
@@ -57,6 +60,7 @@ from .const import (
     CONF_GATEWAY_ID,
     CONF_LOCAL_KEY,
     CONF_MANUAL_DPS,
+    CONF_MIN_UPDATE_INTERVAL,
     CONF_MODEL,
     CONF_NODE_ID,
     CONF_NO_CLOUD,
@@ -68,6 +72,7 @@ from .const import (
     CONF_TUYA_IP,
     CONF_TUYA_VERSION,
     CONF_USER_ID,
+    DATA_CAPABILITIES,
     DATA_DISCOVERY,
     DEFAULT_CATEGORIES,
     DOMAIN,
@@ -75,6 +80,7 @@ from .const import (
     PLATFORMS,
     SUPPORTED_PROTOCOL_VERSIONS,
     CONF_DEVICE_SLEEP_TIME,
+    CONF_FULL_STATUS_EVENTS,
 )
 from .discovery import discover
 
@@ -92,6 +98,17 @@ EXPORT_CONFIG = "export_config"
 TUYA_CATEGORY = "category"
 DEVICE_CLOUD_DATA = "device_cloud_data"
 
+PROTOCOL_DETECT_TIMEOUT = 5  # Seconds to connect and detect DPs with one version.
+PROTOCOL_RACE_CONCURRENCY = 2  # Versions tried at the same time on one device.
+PROTOCOL_RACE_STAGGER = 0.5  # Seconds between the starts of two raced versions.
+
+MASS_CONFIGURE_CONCURRENCY = 8  # Devices probed at the same time by mass configure.
+MASS_CONFIGURE_TIMEOUT = 60  # Seconds to probe one device, every version included.
+MASS_CONFIGURE_RETRIES = 2  # Extra probes of a device that failed transiently.
+MASS_CONFIGURE_RETRY_DELAY = 2  # Seconds before the first retry, doubled every retry.
+# Failures worth another probe (with CannotConnect), a busy device recovers from them.
+MASS_CONFIGURE_TRANSIENT = (TimeoutError, OSError)
+
 # Using list method so we can translate options.
 CONFIGURE_MENU = [CONF_ADD_DEVICE, CONF_EDIT_DEVICE, CONF_CONFIGURE_CLOUD]
 
@@ -154,6 +171,7 @@ DEVICE_SCHEMA = vol.Schema(
         vol.Optional(CONF_MANUAL_DPS): cv.string,
         vol.Optional(CONF_RESET_DPIDS): str,
         vol.Optional(CONF_DEVICE_SLEEP_TIME): int,
+        vol.Optional(CONF_FULL_STATUS_EVENTS, default=False): bool,
         vol.Optional(CONF_NODE_ID, default=None): vol.Any(None, cv.string),
     }
 )
@@ -164,10 +182,56 @@ PICK_ENTITY_SCHEMA = vol.Schema(
 
 
 CONF_MASS_CONFIGURE = "mass_configure"
-MASS_CONFIGURE_SCHEMA = {vol.Optional(CONF_MASS_CONFIGURE, default=False): bool}
+CONF_MASS_CONFIGURE_CONCURRENCY = "mass_configure_concurrency"
+MASS_CONFIGURE_SCHEMA = {
+    vol.Optional(CONF_MASS_CONFIGURE, default=False): bool,
+    vol.Optional(
+        CONF_MASS_CONFIGURE_CONCURRENCY, default=MASS_CONFIGURE_CONCURRENCY
+    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=64)),
+}
 CUSTOM_DEVICE = {"Add Device Manually": "..."}
 
 
+@dataclass
+class MassConfigureProgress:
+    """Progress of setup_localtuya_devices, listener is called on every change."""
+
+    total: int = 0  # Devices to configure.
+    probing: int = 0  # Devices connected to right now.
+    done: int = 0  # Devices configured or failed.
+    failed: int = 0
+    retries: int = 0  # Probes repeated after a transient failure.
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    listener: Callable[["MassConfigureProgress"], None] | None = field(
+        default=None, repr=False
+    )
+
+    @property
+    def elapsed(self) -> float:
+        """Return the seconds spent configuring so far."""
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self) -> float:
+        """Return the devices done per second."""
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    def placeholders(self) -> dict[str, str]:
+        """Return the progress as description placeholders."""
+        return {
+            "done": str(self.done),
+            "total": str(self.total),
+            "failed": str(self.failed),
+            "probing": str(self.probing),
+        }
+
+    def changed(self):
+        """Notify the listener."""
+        if self.listener:
+            self.listener(self)
+
+
 class LocaltuyaConfigFlow(ConfigFlow, domain=DOMAIN):
     """Handle a config flow for LocalTuya integration."""
 
@@ -255,6 +319,9 @@ class LocalTuyaOptionsFlowHandler(OptionsFlow):
         self.use_template = False
         self.template_device = None
 
+        self._mass_configure_task: asyncio.Task | None = None
+        self._mass_configure_progress = MassConfigureProgress()
+
     @property
     def localtuya_data(self) -> HassLocalTuyaData:
         return self.hass.data[DOMAIN][self._entry_id]
@@ -326,34 +393,15 @@ class LocalTuyaOptionsFlowHandler(OptionsFlow):
             if user_input[SELECTED_DEVICE] != CUSTOM_DEVICE["Add Device Manually"]:
                 self.selected_device = user_input[SELECTED_DEVICE]
 
+            concurrency = user_input.pop(
+                CONF_MASS_CONFIGURE_CONCURRENCY, MASS_CONFIGURE_CONCURRENCY
+            )
             if user_input.pop(CONF_MASS_CONFIGURE, False):
                 # Handle auto configure all recognized devices.
-                await self.cloud_data.async_get_devices_dps_query()
-                devices, fails = await setup_localtuya_devices(
-                    self.hass,
-                    self.localtuya_data,
-                    self.discovered_devices,
-                    self.cloud_data.device_list,
-                    log_fails=True,
+                self._mass_configure_task = self.hass.async_create_task(
+                    self._async_mass_configure(concurrency)
                 )
-                if devices:
-                    devices_sucessed, devices_fails = "", ""
-                    for sucess_dev in devices.values():
-                        devices_sucessed += f"\n{sucess_dev[CONF_FRIENDLY_NAME]}"
-                    for fail_dev in fails.values():
-                        devices_fails += f"\n{fail_dev['name']}: {fail_dev['reason']}"
-
-                    msg = f"Succeeded devices: ``{len(devices)}``\n ```{devices_sucessed}\n```"
-                    if fails:
-                        msg += f" \n Failed devices: ``{len(fails)}``\n ```{devices_fails}\n```"
-                    msg += "\nClick on submit to add the devices"
-
-                    return await self.async_step_confirm(
-                        msg=msg,
-                        confirm_callback=lambda: self._update_entry(
-                            devices, CONF_DEVICES
-                        ),
-                    )
+                return await self.async_step_mass_configure()
 
             return await self.async_step_configure_device()
 
@@ -391,6 +439,68 @@ class LocalTuyaOptionsFlowHandler(OptionsFlow):
             errors=errors,
         )
 
+    async def async_step_mass_configure(self, user_input=None):
+        """Show the progress of the mass configure."""
+        if not self._mass_configure_task.done():
+            return self.async_show_progress(
+                step_id="mass_configure",
+                progress_action="mass_configure",
+                description_placeholders=self._mass_configure_progress.placeholders(),
+                progress_task=self._mass_configure_task,
+            )
+        return self.async_show_progress_done(next_step_id="mass_configure_done")
+
+    async def async_step_mass_configure_done(self, user_input=None):
+        """Ask to add the devices configured by the mass configure."""
+        devices, fails = self._mass_configure_task.result()
+        progress = self._mass_configure_progress
+        if not devices:
+            return await self.async_step_configure_device()
+
+        devices_sucessed, devices_fails = "", ""
+        for sucess_dev in devices.values():
+            devices_sucessed += f"\n{sucess_dev[CONF_FRIENDLY_NAME]}"
+        for fail_dev in fails.values():
+            devices_fails += f"\n{fail_dev['name']}: {fail_dev['reason']}"
+
+        msg = f"Succeeded devices: ``{len(devices)}``\n ```{devices_sucessed}\n```"
+        if fails:
+            msg += f" \n Failed devices: ``{len(fails)}``\n ```{devices_fails}\n```"
+        msg += f"\nDone in {progress.elapsed:.0f}s ({progress.rate:.2f} devices/s)"
+        msg += "\nClick on submit to add the devices"
+
+        return await self.async_step_confirm(
+            msg=msg,
+            confirm_callback=lambda: self._update_entry(devices, CONF_DEVICES),
+        )
+
+    async def _async_mass_configure(self, concurrency: int):
+        """Configure every recognized device, refreshing the progress step."""
+        self._mass_configure_progress = MassConfigureProgress(
+            listener=self._mass_configure_changed
+        )
+        await self.cloud_data.async_get_devices_dps_query()
+        return await setup_localtuya_devices(
+            self.hass,
+            self.localtuya_data,
+            self.discovered_devices,
+            self.cloud_data.device_list,
+            log_fails=True,
+            concurrency=concurrency,
+            progress=self._mass_configure_progress,
+        )
+
+    @callback
+    def _mass_configure_changed(self, progress: MassConfigureProgress):
+        """Report the fraction of the devices done to the progress step.
+
+        The flow manager moves on by itself once the task is done. Home Assistant
+        versions without FlowHandler.async_update_progress show the progress the
+        step was entered with.
+        """
+        if progress.total and (update := getattr(self, "async_update_progress", None)):
+            update(progress.done / progress.total)
+
     async def async_step_edit_device(self, user_input=None):
         """Handle editing a device."""
         self.editing_device = True
@@ -517,7 +627,13 @@ class LocalTuyaOptionsFlowHandler(OptionsFlow):
                         ]
                         return await self.async_step_configure_entity()
 
-                valid_data = await validate_input(self.localtuya_data, user_input)
+                discovered = self.discovered_devices.get(self.selected_device, {})
+                valid_data = await validate_input(
+                    self.localtuya_data,
+                    user_input,
+                    self.hass.data[DOMAIN].get(DATA_CAPABILITIES),
+                    discovered.get(CONF_TUYA_VERSION),
+                )
                 self.dps_strings = valid_data[CONF_DPS_STRINGS]
                 # We will also get protocol version from valid date in case auto used.
                 self.device_data[CONF_PROTOCOL_VERSION] = valid_data[
@@ -872,12 +988,22 @@ async def setup_localtuya_devices(
     discovered_devices: dict,
     devices_cloud_data: dict,
     log_fails=False,
+    concurrency=MASS_CONFIGURE_CONCURRENCY,
+    progress: MassConfigureProgress | None = None,
 ):
-    """Return a dict of configured devices ready to import into devices data."""
+    """Return a dict of configured devices ready to import into devices data.
+
+    At most concurrency devices are probed at once, a device that fails with a
+    transient error is probed again later, and the entities of every device are
+    generated as soon as its probe is done.
+    """
     # Store devices data
     devices_cfg = []
     devices = {}
     fails = {}
+    progress = progress or MassConfigureProgress()
+    semaphore = asyncio.Semaphore(concurrency)
+    capabilities = hass.data[DOMAIN].get(DATA_CAPABILITIES)
 
     def update_fails(dev_id: str, reason: str, msg: str = None):
         name = devices_cloud_data[dev_id].get(CONF_NAME, dev_id)
@@ -917,35 +1043,83 @@ async def setup_localtuya_devices(
             # Store device to device_data.
             devices_cfg.append(device_data)
 
-    # Connect to the devices to ensure the are usable.
-    validate_devices = [validate_input(localtuya_data, dev) for dev in devices_cfg]
-    results = await asyncio.gather(*validate_devices, return_exceptions=True)
+    async def probe(dev_cfg: dict):
+        """Connect to the device to ensure it is usable, retry transient failures."""
+        for attempt in range(MASS_CONFIGURE_RETRIES + 1):
+            if attempt:
+                progress.retries += 1
+                await asyncio.sleep(MASS_CONFIGURE_RETRY_DELAY * 2 ** (attempt - 1))
+            async with semaphore:
+                progress.probing += 1
+                progress.changed()
+                try:
+                    async with asyncio.timeout(MASS_CONFIGURE_TIMEOUT):
+                        return await validate_input(
+                            localtuya_data, dev_cfg, capabilities
+                        )
+                except (CannotConnect, *MASS_CONFIGURE_TRANSIENT) as ex:
+                    result = ex
+                except Exception as ex:  # pylint: disable=broad-except
+                    return ex
+                finally:
+                    progress.probing -= 1
+        return result
 
-    # Merge test results with devices config
-    for dev_cfg, result in zip(devices_cfg, results):
+    async def configure(dev_cfg: dict):
+        """Probe the device then configure its entities."""
         dev_id = dev_cfg.get(CONF_DEVICE_ID)
+        result = await probe(dev_cfg)
+        dev_entites = None
+        category = devices_cloud_data[dev_id].get("category")
         if not isinstance(result, dict):
             update_fails(dev_id, result)
-            continue
-        devices.update({dev_id: {**dev_cfg, **result}})
-
-    # Configure entities.
-    for dev_id, dev_data in copy.deepcopy(devices).items():
-        category = devices_cloud_data[dev_id].get("category")
-        dev_data[DEVICE_CLOUD_DATA] = devices_cloud_data[dev_id]
-        if category and (dps_strings := dev_data.get(CONF_DPS_STRINGS, False)):
-            dev_entites = gen_localtuya_entities(dev_data, category)
-
-        # Configure entities fails
-        if not dev_entites:
-            devices.pop(dev_id)
-            update_fails(dev_id, f"no configured entities: {dev_entites} - {category}")
-            continue
-
-        # Add configured entities
-        devices[dev_id].update({CONF_ENTITIES: dev_entites})
-
-    return devices, fails
+        else:
+            # Configure entities.
+            dev_data = copy.deepcopy({**dev_cfg, **result})
+            dev_data[DEVICE_CLOUD_DATA] = devices_cloud_data[dev_id]
+            if category and dev_data.get(CONF_DPS_STRINGS, False):
+                dev_entites = gen_localtuya_entities(dev_data, category)
+
+            # Configure entities fails
+            if not dev_entites:
+                update_fails(
+                    dev_id, f"no configured entities: {dev_entites} - {category}"
+                )
+            else:
+                # Add configured entities
+                devices[dev_id] = {**dev_cfg, **result, CONF_ENTITIES: dev_entites}
+
+        progress.done += 1
+        progress.failed += dev_id in fails
+        progress.changed()
+
+    progress.total = len(devices_cfg)
+    progress.changed()
+    await asyncio.gather(*(configure(dev_cfg) for dev_cfg in devices_cfg))
+    progress.finished = time.monotonic()
+    progress.changed()
+
+    failures = Counter(
+        (
+            type(fail["reason"]).__name__
+            if isinstance(fail["reason"], Exception)
+            # Devices that connected but got no entities have a str reason.
+            else "NoEntities"
+        )
+        for fail in fails.values()
+    )
+    _LOGGER.info(
+        "Configured %s of %s devices in %.1fs (%.2f devices/s, %s retries), failures: %s",
+        len(devices),
+        progress.total,
+        progress.elapsed,
+        progress.rate,
+        progress.retries,
+        dict(failures) or None,
+    )
+    # Keep the discovery order, devices are configured in any order.
+    order = [dev_cfg[CONF_DEVICE_ID] for dev_cfg in devices_cfg]
+    return {dev_id: devices[dev_id] for dev_id in order if dev_id in devices}, fails
 
 
 async def discover_devices() -> tuple[dict[str, dict], dict[str, str]]:
@@ -1055,6 +1229,7 @@ def options_schema(entities):
             vol.Optional(CONF_MANUAL_DPS): cv.string,
             vol.Optional(CONF_RESET_DPIDS): cv.string,
             vol.Optional(CONF_DEVICE_SLEEP_TIME): int,
+            vol.Optional(CONF_FULL_STATUS_EVENTS, default=False): bool,
             vol.Required(
                 CONF_ENTITIES, description={"suggested_value": entity_names}
             ): cv.multi_select(entity_names),
@@ -1145,6 +1320,9 @@ async def platform_schema(
     schema[
         vol.Required(CONF_ENTITY_CATEGORY, default=str(default_category(platform)))
     ] = col_to_select(ENTITY_CATEGORY)
+    schema[vol.Optional(CONF_MIN_UPDATE_INTERVAL)] = vol.All(
+        vol.Coerce(float), vol.Range(min=0, max=3600)
+    )
 
     plat_schema = await hass.async_add_import_executor_job(
         flow_schema, platform, dps_strings
@@ -1171,8 +1349,151 @@ def flow_schema(platform, dps_strings):
     return import_module("." + platform, integration_module).flow_schema(dps_strings)
 
 
-async def validate_input(entry_runtime: HassLocalTuyaData, data):
-    """Validate the user input allows us to connect."""
+async def detect_dps(interface, caps: DeviceCapabilities, version: str, cid=None):
+    """Return the DPs of the device, probing the DP ranges only if needed.
+
+    The DPs the device reported before with this version are requested at once,
+    the ranges are only probed if they are unknown or not all reported anymore.
+    """
+    if caps.dps and caps.protocol_version == version:
+        interface.dps_to_request = {}
+        interface.add_dps_to_request(caps.dps)
+        if set(caps.dps) <= set(dps := await interface.status(cid=cid)):
+            return dps
+    return await interface.detect_available_dps(cid=cid)
+
+
+async def attempt_protocol(data, version: str, caps: DeviceCapabilities, logger):
+    """Connect with version and return the interface and the DPs it reports.
+
+    Connection errors and timeouts are raised. A device that does not answer with
+    this version returns no interface and no DPs.
+    """
+    interface = await pytuya.connect(
+        data[CONF_HOST],
+        data[CONF_DEVICE_ID],
+        data[CONF_LOCAL_KEY],
+        float(version),
+        data[CONF_ENABLE_DEBUG],
+    )
+    dps = {}
+    try:
+        if caps.dev_type and caps.protocol_version == version:
+            interface.dev_type = caps.dev_type
+        async with asyncio.timeout(PROTOCOL_DETECT_TIMEOUT):
+            dps = await detect_dps(interface, caps, version, data.get(CONF_NODE_ID))
+    except TimeoutError:
+        raise
+    except Exception as ex:  # pylint: disable=broad-except
+        logger.debug(f"Protocol version {version} failed: {ex!r}")
+    finally:
+        if not dps:
+            await interface.close()
+    return (interface, dps) if dps else (None, {})
+
+
+async def race_protocols(data, versions: list[str], caps: DeviceCapabilities, logger):
+    """Try versions concurrently, return the first one that reports DPs.
+
+    Attempts start PROTOCOL_RACE_STAGGER apart, at most PROTOCOL_RACE_CONCURRENCY
+    at a time, and the losers are cancelled as soon as one version wins. Devices
+    accepting a single connection refuse the concurrent ones or leave them
+    unanswered, those versions are tried again one at a time if no version won:
+    the refused ones first, the timed out ones while the whole detection stays
+    shorter than trying every version one after the other.
+    """
+    semaphore = asyncio.Semaphore(PROTOCOL_RACE_CONCURRENCY)
+    budget = len(versions) * PROTOCOL_DETECT_TIMEOUT
+    start = time.monotonic()
+    refused, timed_out = [], []
+
+    async def attempt(index: int, version: str):
+        await asyncio.sleep(index * PROTOCOL_RACE_STAGGER)
+        async with semaphore:
+            logger.info(f"Connecting with protocol version: {version}")
+            try:
+                return version, *await attempt_protocol(data, version, caps, logger)
+            except (ConnectionRefusedError, ConnectionResetError):
+                refused.append(version)
+            except TimeoutError:
+                timed_out.append(version)
+            return version, None, {}
+
+    tasks = [asyncio.ensure_future(attempt(i, v)) for i, v in enumerate(versions)]
+    winner = None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            version, interface, dps = await next_done
+            if dps:
+                winner = interface
+                return interface, dps, version
+    finally:
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # A version may have won too while the others were being cancelled.
+        for result in results:
+            if isinstance(result, tuple) and result[1] not in (None, winner):
+                await result[1].close()
+
+    for version in refused + timed_out:
+        if (left := budget - (time.monotonic() - start)) <= 0:
+            logger.debug(f"Protocol detection gave up after {budget}s")
+            break
+        logger.info(f"Connecting with protocol version: {version}")
+        try:
+            async with asyncio.timeout(left):
+                interface, dps = await attempt_protocol(data, version, caps, logger)
+        except TimeoutError:
+            logger.debug(f"Protocol version {version} timed out")
+            continue
+        if dps:
+            return interface, dps, version
+    return None, {}, None
+
+
+async def detect_protocol(
+    data, caps: DeviceCapabilities, discovered_version: str | None, logger
+):
+    """Return the interface, DPs and version of the device and what decided it.
+
+    The version announced by the UDP discovery and the one the device, or its
+    product, worked with before are tried first, one at a time. Without them, or
+    if they fail, the other versions race. The deciding signal is "discovery",
+    "history" or "race".
+    """
+    tried = []
+    for signal, version in (
+        ("discovery", discovered_version),
+        ("history", caps.protocol_version),
+    ):
+        if version in SUPPORTED_PROTOCOL_VERSIONS and version not in tried:
+            tried.append(version)
+            logger.info(f"Connecting with protocol version: {version} ({signal})")
+            try:
+                interface, dps = await attempt_protocol(data, version, caps, logger)
+            except TimeoutError:
+                logger.debug(f"Protocol version {version} timed out")
+                continue
+            if dps:
+                return interface, dps, version, signal
+
+    remaining = [v for v in SUPPORTED_PROTOCOL_VERSIONS if v not in tried]
+    return *await race_protocols(data, remaining, caps, logger), "race"
+
+
+async def validate_input(
+    entry_runtime: HassLocalTuyaData,
+    data,
+    capabilities: CapabilityStore | None = None,
+    discovered_version: str | None = None,
+):
+    """Validate the user input allows us to connect.
+
+    Known capabilities of the device, or of its product, are tried first and the
+    ones found are recorded into capabilities. discovered_version is the version
+    the device announces in its UDP broadcasts, if it was discovered.
+    """
     logger = pytuya.ContextualLogger()
     logger.set_logger(_LOGGER, data[CONF_DEVICE_ID], True, data[CONF_FRIENDLY_NAME])
 
@@ -1186,6 +1507,9 @@ async def validate_input(entry_runtime: HassLocalTuyaData, data):
 
     cid = data.get(CONF_NODE_ID, None)
     localtuya_devices = entry_runtime.devices
+    caps = DeviceCapabilities()
+    if capabilities:
+        caps = capabilities.get(data[CONF_DEVICE_ID], data.get(CONF_PRODUCT_KEY))
     try:
         conf_protocol = data[CONF_PROTOCOL_VERSION]
         auto_protocol = conf_protocol == "auto"
@@ -1198,33 +1522,43 @@ async def validate_input(entry_runtime: HassLocalTuyaData, data):
         ):
             interface = existed_interface._interface
             close = False
+        elif auto_protocol:
+            try:
+                interface, detected_dps, version, signal = await detect_protocol(
+                    data, caps, discovered_version, logger
+                )
+            # If connection to host is failed raise wrong address.
+            except (OSError, ValueError) as ex:
+                logger.error(f"Connection failed! {ex}")
+                error = ex
+            else:
+                if interface:
+                    # Return the worked version to update self.device_data.
+                    logger.info(f"Protocol {version} decided by {signal}")
+                    logger.info(f"Detected DPS: {detected_dps}")
+                    conf_protocol = version
+                else:
+                    error = InvalidAuth
         else:
-            # If 'auto' will be loop through supported protocols.
-            for ver in SUPPORTED_PROTOCOL_VERSIONS:
+            # Retry as many times as auto would try versions.
+            for _ in SUPPORTED_PROTOCOL_VERSIONS:
                 try:
-                    version = ver if auto_protocol else conf_protocol
-                    logger.info(f"Connecting with protocol version: {version}")
-                    async with asyncio.timeout(5):
+                    logger.info(f"Connecting with protocol version: {conf_protocol}")
+                    async with asyncio.timeout(PROTOCOL_DETECT_TIMEOUT):
                         interface = await pytuya.connect(
                             data[CONF_HOST],
                             data[CONF_DEVICE_ID],
                             data[CONF_LOCAL_KEY],
-                            float(version),
+                            float(conf_protocol),
                             data[CONF_ENABLE_DEBUG],
                         )
+                        if caps.dev_type and caps.protocol_version == conf_protocol:
+                            interface.dev_type = caps.dev_type
                         logger.info(f"Connected attempt to detect the device DPS")
-                        detected_dps = await interface.detect_available_dps(cid=cid)
-
-                    # Break the loop if input isn't auto.
-                    if not auto_protocol:
-                        break
-
-                    # If Auto: using DPS detected we will assume this is the correct version if dps found.
-                    if len(detected_dps) > 0:
-                        # Set the conf_protocol to the worked version to return it and update self.device_data.
-                        logger.info(f"Detected DPS: {detected_dps}")
-                        conf_protocol = version
-                        break
+                        detected_dps = await detect_dps(
+                            interface, caps, conf_protocol, cid
+                        )
+                    break
 
                 # If connection to host is failed raise wrong address.
                 except (OSError, ValueError) as ex:
@@ -1234,7 +1568,7 @@ async def validate_input(entry_runtime: HassLocalTuyaData, data):
                 except:
                     continue
                 finally:
-                    if not auto_protocol and data.get(CONF_DEVICE_SLEEP_TIME, 0) > 0:
+                    if data.get(CONF_DEVICE_SLEEP_TIME, 0) > 0:
                         logger.info("Low-power device configured — handshake skipped")
                         bypass_connection = True
                     if not error and not interface:
@@ -1256,7 +1590,7 @@ async def validate_input(entry_runtime: HassLocalTuyaData, data):
 
             # Detect any other non-manual DPS strings
             if not detected_dps:
-                detected_dps = await interface.detect_available_dps(cid=cid)
+                detected_dps = await detect_dps(interface, caps, conf_protocol, cid)
 
         except (ValueError, pytuya.parser.DecodeError) as ex:
             error = ex
@@ -1283,6 +1617,17 @@ async def validate_input(entry_runtime: HassLocalTuyaData, data):
                 if str(new_dps) not in detected_dps:
                     detected_dps[new_dps] = -1
 
+        if capabilities and detected_dps_device:
+            capabilities.update(
+                data[CONF_DEVICE_ID],
+                data.get(CONF_PRODUCT_KEY),
+                protocol_version=conf_protocol,
+                # Sub-devices share the interface of their gateway.
+                dev_type=None if cid else interface.dev_type,
+                reset_dpids=reset_ids,
+                dps=sorted(detected_dps_device),
+            )
+
     except (ConnectionRefusedError, ConnectionResetError) as ex:
         raise CannotConnect from ex
     except (OSError, ValueError, pytuya.parser.DecodeError) as ex:
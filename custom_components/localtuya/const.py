@@ -15,6 +15,12 @@ from homeassistant.const import (
 
 DOMAIN = "localtuya"
 DATA_DISCOVERY = "discovery"
+DATA_HEARTBEATS = "heartbeats"
+DATA_CAPABILITIES = "capabilities"
+DATA_STARTUP = "startup"
+DATA_RECONNECT = "reconnect"
+DATA_DEVICE_INDEX = "device_index"
+DATA_EVENTS = "events"
 
 # Order on priority
 SUPPORTED_PROTOCOL_VERSIONS = ["3.3", "3.1", "3.2", "3.4", "3.5"]
@@ -77,7 +83,9 @@ CONF_MANUAL_DPS = "manual_dps_strings"
 CONF_DEFAULT_VALUE = "dps_default_value"
 CONF_RESET_DPIDS = "reset_dpids"
 CONF_PASSIVE_ENTITY = "is_passive_entity"
+CONF_MIN_UPDATE_INTERVAL = "min_update_interval"
 CONF_DEVICE_SLEEP_TIME = "device_sleep_time"
+CONF_FULL_STATUS_EVENTS = "full_status_events"
 
 # ALARM
 CONF_ALARM_SUPPORTED_STATES = "alarm_supported_states"
@@ -127,6 +135,8 @@ CONF_FAN_DPS_TYPE = "fan_dps_type"
 # sensor
 CONF_SCALING = "scaling"
 CONF_STATE_CLASS = "state_class"
+CONF_DEADBAND = "deadband"
+CONF_DEADBAND_PERCENT = "deadband_percent"
 
 # climate
 CONF_TARGET_TEMPERATURE_DP = "target_temperature_dp"
@@ -289,7 +299,11 @@ class DeviceConfig:
         self.model: str = self.device_config.get(CONF_MODEL, "Tuya generic")
         self.reset_dps: str = self.device_config.get(CONF_RESET_DPIDS, "")
         self.manual_dps: str = self.device_config.get(CONF_MANUAL_DPS, "")
+        self.full_status_events: bool = self.device_config.get(
+            CONF_FULL_STATUS_EVENTS, False
+        )
         self.dps_strings: list = self.device_config.get(CONF_DPS_STRINGS, [])
+        self.product_key: str | None = self.device_config.get(CONF_PRODUCT_KEY)
 
     def as_dict(self):
         return self.device_config
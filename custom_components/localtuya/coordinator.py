@@ -5,24 +5,31 @@ import asyncio
 import errno
 import logging
 import time
+from dataclasses import dataclass
 from datetime import timedelta
-from typing import Any, NamedTuple
+from typing import Any, Callable, NamedTuple
 
 
 from homeassistant.core import HomeAssistant, CALLBACK_TYPE, callback, State
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_ID, CONF_DEVICES, CONF_HOST, CONF_DEVICE_ID
-from homeassistant.helpers.event import async_track_time_interval, async_call_later
-from homeassistant.helpers.dispatcher import (
-    async_dispatcher_connect,
-    dispatcher_send,
+from homeassistant.const import (
+    CONF_ID,
+    CONF_DEVICES,
+    CONF_HOST,
+    CONF_DEVICE_ID,
+    EntityCategory,
 )
+from homeassistant.helpers.event import async_track_time_interval, async_call_later
 
+from .core.capabilities import CapabilityStore
 from .core.cloud_api import TuyaCloudApi
+from .core.events import EventListeners, async_get_event_listeners
+from .core.reconnect import ReconnectManager, async_get_reconnect_manager
 from .core.pytuya import (
     ContextualLogger,
     HEARTBEAT_INTERVAL,
     TIMEOUT_CONNECT,
+    StatusDelta,
     SubdeviceState,
     TuyaListener,
     TuyaProtocol,
@@ -37,16 +44,40 @@ from .const import (
     CONF_NODE_ID,
     CONF_NO_CLOUD,
     CONF_TUYA_IP,
+    DATA_CAPABILITIES,
     DATA_DISCOVERY,
+    DATA_HEARTBEATS,
+    DATA_STARTUP,
     DOMAIN,
     DeviceConfig,
     RESTORE_STATES,
 )
 
 _LOGGER = logging.getLogger(__name__)
-RECONNECT_INTERVAL = timedelta(seconds=5)
 # Subdevice: Offline events before disconnecting the device, around 5 minutes
 MIN_OFFLINE_EVENTS = 5 * 60 // HEARTBEAT_INTERVAL
+EVENT_STATUS_UPDATE = "localtuya_status_update"
+EVENT_DP_TRIGGERED = "localtuya_device_dp_triggered"
+
+
+@dataclass
+class WakeStats:
+    """Wakeups of a low-power device, announced by its UDP broadcasts."""
+
+    wakes: int = 0  # Broadcasts received while not connected.
+    missed: int = 0  # Wakes that ended without a status.
+    latency_last: float = 0.0  # Seconds from the broadcast to the status.
+    latency_mean: float = 0.0
+    latency_max: float = 0.0
+
+    @property
+    def missed_rate(self) -> float:
+        """Return the fraction of wakes missed."""
+        return self.missed / self.wakes if self.wakes else 0.0
+
+
+# Receives the DPs updated for an entity, the whole status or None when shut down.
+StatusHandler = Callable[[dict | None], None]
 
 
 class HassLocalTuyaData(NamedTuple):
@@ -90,15 +121,17 @@ class TuyaDevice(TuyaListener, ContextualLogger):
         # last_update_time: Sleep timer, a device that reports the status every x seconds then goes into sleep.
         self._last_update_time = time.monotonic() - 5
         self._pending_status: dict[str, dict[str, Any]] = {}
+        self.wake_stats = WakeStats()
+        self._woken_at: float | None = None  # Broadcast time of the current wake.
 
         self.is_closing = False
         self._task_connect: asyncio.Task | None = None
-        self._task_reconnect: asyncio.Task | None = None
         self._task_shutdown_entities: asyncio.Task | None = None
         self._unsub_refresh: CALLBACK_TYPE | None = None
-        self._unsub_new_entity: CALLBACK_TYPE | None = None
 
         self._entities = []
+        # DP -> handlers of the entities reading it, None for entities reading any.
+        self._routes: dict[str | None, dict[StatusHandler, None]] = {}
 
         self._default_reset_dpids: list | None = None
         dev = self._device_config
@@ -151,10 +184,60 @@ class TuyaDevice(TuyaListener, ContextualLogger):
         """
         return self.is_subdevice and "0" in self._device_config.manual_dps.split(",")
 
+    @property
+    def startup_priority(self) -> int:
+        """Return the order of the device connect at startup, lowest first."""
+        if self.sub_devices:
+            return 0  # Gateways, their sub-devices connect after them.
+        if self._device_config.sleep_time > 0:
+            return 3  # Low-power devices, mostly asleep anyway.
+        for entity in self._entities:
+            hidden = entity.registry_entry and entity.registry_entry.hidden_by
+            if entity.entity_category != EntityCategory.DIAGNOSTIC and not hidden:
+                return 1  # Devices users look at.
+        return 2
+
     def add_entities(self, entities):
         """Set the entities associated with this device."""
         self._entities.extend(entities)
 
+    @callback
+    def async_route(
+        self, handler: StatusHandler, dps: set[str] | None
+    ) -> CALLBACK_TYPE:
+        """Call handler with the updates of dps, of every DP if None.
+
+        The handler gets the whole status right away if the device is connected,
+        None when the entities are shut down. Return a function removing the route.
+        """
+        keys = (None,) if dps is None else dps
+        for dp in keys:
+            self._routes.setdefault(dp, {})[handler] = None
+
+        @callback
+        def remove_route():
+            for dp in keys:
+                if handlers := self._routes.get(dp):
+                    handlers.pop(handler, None)
+                    if not handlers:
+                        del self._routes[dp]
+
+        if self.connected:
+            self._deliver({handler: self._status})
+        return remove_route
+
+    @callback
+    def announced(self):
+        """Handle a UDP broadcast of the device: connect now if it is not."""
+        if self.connected or self.is_connecting or self.is_closing:
+            return
+        if self._device_config.sleep_time <= 0:
+            self._reconnect.wake(self)
+        elif self._woken_at is None and self._reconnect.wake(self, force=True):
+            # Low-power devices are only awake for a few seconds.
+            self._woken_at = time.monotonic()
+            self.wake_stats.wakes += 1
+
     async def async_connect(self, _now=None) -> None:
         """Connect to device if not already connected."""
         if self.is_closing or self.is_connecting:
@@ -212,10 +295,12 @@ class TuyaDevice(TuyaListener, ContextualLogger):
                         float(self._device_config.protocol_version),
                         self._device_config.enable_debug,
                         self,
+                        product_key=self._device_config.product_key,
                     )
                     self._interface.enable_debug(
                         self._device_config.enable_debug, self.friendly_name
                     )
+                    self._seed_capabilities()
                 self._interface.add_dps_to_request(self.dps_to_request)
                 break  # Succeed break while loop
             except asyncio.CancelledError:
@@ -241,6 +326,9 @@ class TuyaDevice(TuyaListener, ContextualLogger):
 
         # Get device status and configure DPS.
         if self.connected and not self.is_closing:
+            if self._pending_status and self._device_config.sleep_time > 0:
+                # Write first, the device can go back to sleep any moment.
+                await self.set_status()
             try:
                 # If reset dpids set - then assume reset is needed before status.
                 reset_dpids = self._default_reset_dpids
@@ -258,6 +346,7 @@ class TuyaDevice(TuyaListener, ContextualLogger):
                     raise Exception("Failed to retrieve status")
 
                 self.status_updated(status)
+                self._record_capabilities(status)
             except (UnicodeDecodeError, DecodeError) as e:
                 self.exception(f"Handshake with {host} failed: due to {type(e)}: {e}")
                 await self.abort_connect()
@@ -286,17 +375,9 @@ class TuyaDevice(TuyaListener, ContextualLogger):
             # the DPS value before the device will respond with status.
             for entity in self._entities:
                 await entity.restore_state_when_connected()
-
-            if self._unsub_new_entity is None:
-
-                def _new_entity_handler(entity_id):
-                    self.debug(f"New entity {entity_id} was added to {host}")
-                    self._dispatch_status()
-
-                signal = f"localtuya_entity_{self._device_config.id}"
-                self._unsub_new_entity = async_dispatcher_connect(
-                    self.hass, signal, _new_entity_handler
-                )
+            # Only updated DPs are sent afterwards, entities shut down while the
+            # device was away need the whole status again.
+            self._dispatch_status()
 
             if (scan_inv := int(self._device_config.scan_interval)) > 0:
                 self._unsub_refresh = async_track_time_interval(
@@ -304,6 +385,9 @@ class TuyaDevice(TuyaListener, ContextualLogger):
                 )
 
             self._task_connect = None
+            self._reconnect.discard(self)
+            if startup := self.hass.data[DOMAIN].get(DATA_STARTUP):
+                startup.async_connected(self)
             # Ensure the connected sub-device is in its gateway's sub_devices
             # and reset offline/absent counters
             if self.gateway:
@@ -320,18 +404,54 @@ class TuyaDevice(TuyaListener, ContextualLogger):
             if self.sub_devices:
                 asyncio.create_task(self._connect_subdevices())
 
-            self._interface.keep_alive(len(self.sub_devices) > 0)
+            self._interface.keep_alive(
+                len(self.sub_devices) > 0, self.hass.data[DOMAIN].get(DATA_HEARTBEATS)
+            )
 
         # If not connected try to handle the errors.
         if not self.connected and not self.is_closing:
             if update_localkey:
                 # Check if the cloud device info has changed!
                 await self._update_local_key()
-            if self._task_reconnect is None:
-                self._task_reconnect = asyncio.create_task(self._async_reconnect())
+            self._reconnect.schedule(self)
 
         self._task_connect = None
 
+    @property
+    def _capabilities(self) -> CapabilityStore | None:
+        return self.hass.data[DOMAIN].get(DATA_CAPABILITIES)
+
+    def _seed_capabilities(self):
+        """Apply what was learned about the device on previous connections."""
+        if not (store := self._capabilities):
+            return
+        dev = self._device_config
+        caps = store.get(dev.id, dev.product_key)
+        if caps.dev_type and caps.protocol_version == dev.protocol_version:
+            self.debug(f"Using known device type: {caps.dev_type}")
+            self._interface.dev_type = caps.dev_type
+        if caps.dps:
+            # Query every DP it reported, not only the ones of the entities.
+            self._interface.add_dps_to_request(caps.dps)
+        if self._default_reset_dpids is None and caps.reset_dpids:
+            self.debug(f"Using known reset DP IDs: {caps.reset_dpids}")
+            self._default_reset_dpids = caps.reset_dpids
+
+    def _record_capabilities(self, status: dict):
+        """Store what the device supports, so the next connections skip probing."""
+        if not (store := self._capabilities):
+            return
+        dev = self._device_config
+        store.update(
+            dev.id,
+            dev.product_key,
+            protocol_version=dev.protocol_version,
+            # Sub-devices share the interface of their gateway.
+            dev_type=None if self.is_subdevice else self._interface.dev_type,
+            reset_dpids=self._default_reset_dpids,
+            dps=sorted(status),
+        )
+
     async def abort_connect(self):
         """Abort the connect process to the interface[device]"""
         if self.is_subdevice:
@@ -358,7 +478,8 @@ class TuyaDevice(TuyaListener, ContextualLogger):
 
         self.is_closing = True
 
-        tasks = [self._task_shutdown_entities, self._task_reconnect, self._task_connect]
+        self._reconnect.discard(self)
+        tasks = [self._task_shutdown_entities, self._task_connect]
         pending_tasks = [task for task in tasks if task and task.cancel()]
         await asyncio.gather(*pending_tasks, return_exceptions=True)
 
@@ -367,10 +488,6 @@ class TuyaDevice(TuyaListener, ContextualLogger):
         for subdevice in self.sub_devices.values():
             await subdevice.close()
 
-        if self._unsub_new_entity:
-            self._unsub_new_entity()
-            self._unsub_new_entity = None
-
         if self._unsub_refresh:
             self._unsub_refresh()
             self._unsub_refresh = None
@@ -426,52 +543,33 @@ class TuyaDevice(TuyaListener, ContextualLogger):
             except TimeoutError:
                 pass
 
-    async def _async_reconnect(self):
-        """Task: continuously attempt to reconnect to the device."""
-        attempts = 0
-        while True:
-            try:
-                # for sub-devices, if it is reported as offline then no need for reconnect.
-                if (
-                    self.is_subdevice
-                    and self._subdevice_off_count >= MIN_OFFLINE_EVENTS
-                ):
-                    await asyncio.sleep(1)
-                    continue
-
-                # for sub-devices, if the gateway isn't connected then no need for reconnect.
-                if self.gateway and (
-                    not self.gateway.connected or self.gateway.is_connecting
-                ):
-                    await asyncio.sleep(3)
-                    continue
-
-                if not self._task_connect:
-                    await self.async_connect()
-                if self._task_connect:
-                    await self._task_connect
+    @property
+    def _reconnect(self) -> ReconnectManager:
+        return async_get_reconnect_manager(self.hass)
 
-                if self.connected:
-                    if not self.is_sleep and attempts > 0:
-                        self.info(f"Reconnect succeeded on attempt: {attempts}")
-                    break
+    @property
+    def _event_listeners(self) -> EventListeners:
+        return async_get_event_listeners(self.hass)
 
-                if self.is_closing:
-                    break
+    async def async_reconnect(self) -> bool | None:
+        """Attempt to reconnect once, None if the device waits to be woken up."""
+        # for sub-devices, if it is reported as offline then no need for reconnect.
+        if self.is_subdevice and self._subdevice_off_count >= MIN_OFFLINE_EVENTS:
+            return None
 
-                attempts += 1
-                scale = (
-                    2
-                    if (self.subdevice_state == SubdeviceState.ABSENT)
-                    or (attempts > MIN_OFFLINE_EVENTS)
-                    else 1
-                )
-                await asyncio.sleep(scale * RECONNECT_INTERVAL.total_seconds())
-            except asyncio.CancelledError as e:
-                self.debug(f"Reconnect task has been canceled: {e}", force=True)
-                break
+        # for sub-devices, if the gateway isn't connected then no need for reconnect.
+        if self.gateway and (not self.gateway.connected or self.gateway.is_connecting):
+            return None
 
-        self._task_reconnect = None
+        if not self._task_connect:
+            await self.async_connect()
+        if self._task_connect:
+            await self._task_connect
+        if self._woken_at is not None:
+            # The device slept again, or could not be reached, before its status.
+            self._woken_at = None
+            self.wake_stats.missed += 1
+        return self.connected
 
     async def _shutdown_entities(self, exc=""):
         """Shutdown device entities"""
@@ -487,8 +585,7 @@ class TuyaDevice(TuyaListener, ContextualLogger):
                 self._task_shutdown_entities = None
                 return
 
-        signal = f"localtuya_{self._device_config.id}"
-        dispatcher_send(self.hass, signal, None)
+        self._deliver(dict.fromkeys(self._handlers()))
 
         if self.is_closing:
             return
@@ -552,34 +649,59 @@ class TuyaDevice(TuyaListener, ContextualLogger):
             k: v for k, v in self.sub_devices.items() if not v.is_closing
         }
 
-    def _dispatch_status(self):
-        signal = f"localtuya_{self._device_config.id}"
-        dispatcher_send(self.hass, signal, self._status)
+    def _handlers(self) -> dict[StatusHandler, None]:
+        """Return the handlers of every entity."""
+        return {
+            handler: None for handlers in self._routes.values() for handler in handlers
+        }
 
-    def _handle_event(self, old_status: dict, new_status: dict):
-        """Handle events in HA when devices updated."""
+    def _dispatch_status(self, dps=None):
+        """Send the status to the entities, only the dps updated if given.
 
-        def fire_event(event, data: dict):
-            """Fire events."""
-            if f"localtuya_{event}" not in self.hass.bus.async_listeners():
-                return
-            event_data = {CONF_DEVICE_ID: self.id, **data}
-            if len(event_data) > 1:
-                self.hass.bus.async_fire(f"localtuya_{event}", event_data)
-
-        event_status_update = "status_update"
-        event_device_dp_triggered = "device_dp_triggered"
-
-        if self._interface and old_status and new_status:
-            # A massive number of events that can be triggered when some devices update too quickly such as temp sensors,
-            # - We want only to update if status changed except for 1 DP trigger, for scene controls.
-            if len(self._interface.dispatched_dps) == 1:
-                dp, value = next(iter(self._interface.dispatched_dps.items()))
-                data = {"dp": dp, "value": value}
-                fire_event(event_device_dp_triggered, data)
-            if old_status != new_status:
-                data = {"old_status": old_status, "new_status": new_status}
-                fire_event(event_status_update, data)
+        Every entity is called once with all of its DPs updated by the frame.
+        """
+        if dps is None:
+            return self._deliver(dict.fromkeys(self._handlers(), self._status))
+
+        routes, status, updates = self._routes, self._status, {}
+        for dp in dps:
+            for handler in routes.get(dp, ()):
+                updates.setdefault(handler, {})[dp] = status[dp]
+        for handler in routes.get(None, ()):
+            updates[handler] = {dp: status[dp] for dp in dps}
+        self._deliver(updates)
+
+    def _deliver(self, updates: dict[StatusHandler, dict | None]):
+        """Call the entity handlers, on the event loop already: no need to hop."""
+        for handler, status in updates.items():
+            try:
+                handler(status)
+            except Exception:  # pylint: disable=broad-except
+                self.exception(f"Failed to update an entity with: {status}")
+
+    def _handle_event(self, old_status: dict, delta: StatusDelta, pushed: bool):
+        """Fire the events of a status update, if anything listens to them."""
+        if not (self._interface and old_status and delta.dps):
+            return
+
+        listeners, event_data = self._event_listeners, {CONF_DEVICE_ID: self.id}
+        # A massive number of events that can be triggered when some devices update too quickly such as temp sensors,
+        # - We want only to update if status changed except for 1 DP trigger, for scene controls.
+        if (
+            pushed
+            and len(delta.dps) == 1
+            and listeners.has_listeners(EVENT_DP_TRIGGERED)
+        ):
+            dp, value = next(iter(delta.dps.items()))
+            data = {**event_data, "dp": dp, "value": value}
+            self.hass.bus.async_fire(EVENT_DP_TRIGGERED, data)
+        if delta.changed and listeners.has_listeners(EVENT_STATUS_UPDATE):
+            if self._device_config.full_status_events:
+                old, new = old_status.copy(), {**old_status, **delta.dps}
+            else:
+                old, new = delta.old, delta.changed
+            data = {**event_data, "old_status": old, "new_status": new}
+            self.hass.bus.async_fire(EVENT_STATUS_UPDATE, data)
 
     def _get_gateway(self):
         """Return the gateway device of this sub device."""
@@ -597,16 +719,42 @@ class TuyaDevice(TuyaListener, ContextualLogger):
             return gateway
 
     @callback
-    def status_updated(self, status: dict):
-        """Device updated status."""
+    def status_updated(self, status: dict, delta: StatusDelta | None = None):
+        """Device updated status, delta holds the DPs of a pushed frame."""
         if self._fake_gateway:
             # Fake gateways are only used to pass commands no need to update status.
             return
 
         self._last_update_time = time.monotonic()
-        self._handle_event(self._status, status)
-        self._status.update(status)
-        self._dispatch_status()
+        if self._woken_at is not None and status is not RESTORE_STATES:
+            self._record_wake(self._last_update_time - self._woken_at)
+        if status is RESTORE_STATES:
+            # The restore marker is meant for every entity, it is no DP of theirs.
+            self._status.update(status)
+            return self._dispatch_status()
+
+        if pushed := delta is not None:
+            # Pushed DPs are sent even if unchanged: a button or a motion sensor
+            # repeats its value every time it is triggered.
+            updated = delta.dps
+        else:
+            # A status query or a local update, only send what it changed.
+            delta = StatusDelta.compare(self._status, status)
+            updated = delta.changed
+        self._handle_event(self._status, delta, pushed)
+        self._status.update(delta.dps)
+        if updated:
+            self._dispatch_status(updated)
+
+    def _record_wake(self, latency: float):
+        """Record the time from a wake broadcast to the status."""
+        self._woken_at = None
+        stats = self.wake_stats
+        received = stats.wakes - stats.missed
+        stats.latency_last = latency
+        stats.latency_mean += (latency - stats.latency_mean) / max(received, 1)
+        stats.latency_max = max(stats.latency_max, latency)
+        self.debug(f"Woken up, status after {latency:.3f}s")
 
     @callback
     def disconnected(self, exc=""):
@@ -630,8 +778,7 @@ class TuyaDevice(TuyaListener, ContextualLogger):
         if self.is_closing:
             return
 
-        if self._task_reconnect is None:
-            self._task_reconnect = asyncio.create_task(self._async_reconnect())
+        self._reconnect.schedule(self)
 
         if self._task_shutdown_entities is not None:
             self._task_shutdown_entities.cancel()
@@ -667,6 +814,9 @@ class TuyaDevice(TuyaListener, ContextualLogger):
         self._last_update_time = time.monotonic()
 
         if is_online:
+            if not self.connected:
+                # Reported again by its gateway, do not wait for the backoff.
+                self._reconnect.wake(self)
             return self.info(f"Sub-device is online {node_id}") if off_count else None
         else:
             off_count += 1
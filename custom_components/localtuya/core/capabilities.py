@@ -0,0 +1,90 @@
+"""Persisted capabilities of the Tuya devices, learned while talking to them."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import asdict, dataclass, field, fields
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = "localtuya_capabilities"
+SAVE_DELAY = 30  # Seconds, saves of a reconnect storm are written once.
+
+
+@dataclass
+class DeviceCapabilities:
+    """What a device (or product) was found to support."""
+
+    protocol_version: str | None = None  # The version it connected with.
+    dev_type: str | None = None  # Payload templates it answers to, e.g. type_0d.
+    reset_dpids: list[int] = field(default_factory=list)
+    dps: list[str] = field(default_factory=list)  # DPs that reported a value.
+
+    @classmethod
+    def from_dict(cls, data: dict) -> DeviceCapabilities:
+        """Return the capabilities stored in data, ignoring unknown keys."""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+
+class CapabilityStore:
+    """Capabilities by device id, and by product key for devices not seen yet.
+
+    Devices of one product key share their protocol version and dev_type, so a
+    newly added device can skip the probing its siblings already went through.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the store, async_load must be called before use."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._devices: dict[str, DeviceCapabilities] = {}
+        self._products: dict[str, DeviceCapabilities] = {}
+
+    async def async_load(self):
+        """Load the stored capabilities."""
+        data = await self._store.async_load() or {}
+        for name, target in (("devices", self._devices), ("products", self._products)):
+            for key, caps in data.get(name, {}).items():
+                target[key] = DeviceCapabilities.from_dict(caps)
+
+    def get(self, device_id: str, product_key: str = None) -> DeviceCapabilities:
+        """Return the capabilities of a device, or of its product if unknown."""
+        if caps := self._devices.get(device_id):
+            return caps
+        if product_key and (caps := self._products.get(product_key)):
+            # Product capabilities do not include the DPs of a single device.
+            return DeviceCapabilities(caps.protocol_version, caps.dev_type)
+        return DeviceCapabilities()
+
+    def update(self, device_id: str, product_key: str = None, **changes):
+        """Record what a device was found to support, save if anything changed."""
+        caps = self._devices.setdefault(device_id, DeviceCapabilities())
+        changed = self._apply(caps, changes)
+        if product_key:
+            product = self._products.setdefault(product_key, DeviceCapabilities())
+            shared = ("protocol_version", "dev_type")
+            changed |= self._apply(
+                product, {k: changes[k] for k in shared if k in changes}
+            )
+        if changed:
+            _LOGGER.debug("Capabilities of %s updated: %s", device_id, caps)
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @staticmethod
+    def _apply(caps: DeviceCapabilities, changes: dict) -> bool:
+        changed = False
+        for name, value in changes.items():
+            if value is not None and getattr(caps, name) != value:
+                setattr(caps, name, value)
+                changed = True
+        return changed
+
+    def _data_to_save(self) -> dict:
+        return {
+            "devices": {k: asdict(v) for k, v in self._devices.items()},
+            "products": {k: asdict(v) for k, v in self._products.items()},
+        }
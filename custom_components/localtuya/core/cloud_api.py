@@ -8,6 +8,8 @@ import json
 import logging
 import time
 
+from .pytuya import codec
+
 
 DEVICES_UPDATE_INTERVAL = 300
 DEVICES_UPDATE_INTERVAL_FORCED = 10
@@ -160,7 +162,7 @@ class TuyaCloudApi:
                     async with session.get(
                         full_url, headers=dict(default_par, **headers)
                     ) as resp:
-                        return await resp.json()
+                        return await resp.json(loads=codec.loads)
 
                 if method == "POST":
                     async with session.post(
@@ -168,7 +170,7 @@ class TuyaCloudApi:
                         headers=dict(default_par, **headers),
                         data=json.dumps(body),
                     ) as resp:
-                        return await resp.json()
+                        return await resp.json(loads=codec.loads)
 
                 if method == "PUT":
                     async with session.put(
@@ -176,7 +178,7 @@ class TuyaCloudApi:
                         headers=dict(default_par, **headers),
                         data=json.dumps(body),
                     ) as resp:
-                        return await resp.json()
+                        return await resp.json(loads=codec.loads)
             except (aiohttp.ClientConnectionError, TimeoutError) as ex:
                 self._logger.debug(f"Failed to send request to tuya cloud: {ex}")
                 return False
@@ -314,7 +316,7 @@ class TuyaCloudApi:
                 elif dp_id := func.get("dp_id"):
                     device_data[str(dp_id)] = func
         if query_model[1] == "ok":
-            model_data = json.loads(query_model[0]["model"])
+            model_data = codec.loads(query_model[0]["model"])
             services = model_data.get("services", [{}])[0]
             properties = services.get("properties")
             for dp_data in properties if properties else {}:
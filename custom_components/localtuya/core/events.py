@@ -0,0 +1,59 @@
+"""Listeners of the events fired by the devices on the Home Assistant bus."""
+
+from __future__ import annotations
+
+import time
+
+from homeassistant.const import EVENT_COMPONENT_LOADED, EVENT_HOMEASSISTANT_STARTED
+from homeassistant.core import Event, HomeAssistant, callback
+
+from ..const import DATA_EVENTS, DOMAIN
+
+REFRESH_INTERVAL = 5  # Seconds the listened event types are trusted, at most.
+# Events after which the listeners of the bus most likely changed.
+REFRESH_EVENTS = (
+    EVENT_HOMEASSISTANT_STARTED,
+    EVENT_COMPONENT_LOADED,
+    "automation_reloaded",
+)
+
+
+@callback
+def async_get_event_listeners(hass: HomeAssistant) -> EventListeners:
+    """Return the event listeners of the integration."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if (listeners := data.get(DATA_EVENTS)) is None:
+        listeners = data[DATA_EVENTS] = EventListeners(hass)
+    return listeners
+
+
+class EventListeners:
+    """Tell whether an event type is listened to, without asking the bus each time.
+
+    EventBus.async_listeners builds a dict of every event type on each call, which
+    is too much for every status update. The listened event types are cached
+    and refreshed when automations are reloaded, an integration is loaded or
+    Home Assistant started. Other subscriptions, such as the websocket ones, are
+    picked up within REFRESH_INTERVAL.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the cache, it is filled by the first lookup."""
+        self.hass = hass
+        self._listened: set[str] = set()
+        self._expires = 0.0
+        for event_type in REFRESH_EVENTS:
+            hass.bus.async_listen(event_type, self._async_refresh)
+
+    @callback
+    def _async_refresh(self, _event: Event | None = None):
+        """Refresh the listened event types at the next lookup."""
+        self._expires = 0.0
+
+    @callback
+    def has_listeners(self, event_type: str) -> bool:
+        """Return if event_type has listeners, match-all ones are not counted."""
+        if (now := time.monotonic()) >= self._expires:
+            self._listened = set(self.hass.bus.async_listeners())
+            self._expires = now + REFRESH_INTERVAL
+        return event_type in self._listened
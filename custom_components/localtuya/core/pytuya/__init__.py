@@ -38,21 +38,24 @@ Credits
 import os
 import asyncio
 import errno
+import functools
 import base64
 import binascii
-import hmac
-import json
+import contextlib
 import logging
 import struct
 import time
 import weakref
+from collections import deque
 from abc import ABC, abstractmethod
 from typing import Self
-from hashlib import md5, sha256
-from .cipher import AESCipher
+from hashlib import md5
+from .cipher import CipherContext
+from .pacer import WritePacer
+from .scheduler import HeartbeatScheduler, ScheduledEntry, default_scheduler
 
 
-from . import parser
+from . import codec, parser
 from .const import (
     CMDType,
     SubdeviceState,
@@ -61,6 +64,8 @@ from .const import (
     TuyaMessage,
     MessagePayload,
     MessagesFormat,
+    ProtocolStats,
+    StatusDelta,
 )
 
 version_tuple = (2025, 7, 0)
@@ -129,9 +134,18 @@ NO_PROTOCOL_HEADER_CMDS = [
     CMDType.LAN_EXT_STREAM,
 ]
 
+HEADER_55AA_SIZE = struct.calcsize(MessagesFormat.HEADER_55AA)
+HEADER_6699_SIZE = struct.calcsize(MessagesFormat.HEADER_6699)
+
+SUFFIXES_BIN = {
+    Affix.prefix_55aa.value: Affix.suffix_55aa.bin,
+    Affix.prefix_6699.value: Affix.suffix_6699.bin,
+}
+
 HEARTBEAT_INTERVAL = 8.3
 TIMEOUT_CONNECT = 5
 TIMEOUT_REPLY = 5
+MAX_INFLIGHT = 4  # Requests awaiting a reply at the same time per connection.
 
 # DPS that are known to be safe to use with update_dps (0x12) command
 UPDATE_DPS_WHITELIST = [18, 19, 20]  # Socket (Wi-Fi)
@@ -193,6 +207,31 @@ payload_dict = {
 }
 
 
+@functools.cache
+def payload_template(dev_type: str, command: CMDType) -> tuple[CMDType, dict]:
+    """Return the command to send and the JSON template for dev_type.
+
+    Missing entries fall back to "type_0a". The template is shared, copy it
+    before filling in the fields.
+    """
+    json_data = command_override = None
+    default = payload_dict["type_0a"].get(command, {})
+    if command in payload_dict[dev_type]:
+        json_data = payload_dict[dev_type][command].get("command")
+        command_override = payload_dict[dev_type][command].get("command_override")
+
+    if json_data is None:
+        json_data = default.get("command")
+    if command_override is None:
+        command_override = default.get("command_override", command)
+    if json_data is None:
+        # I have yet to see a device complain about included but unneeded attribs, but they *will*
+        # complain about missing attribs, so just include them all unless otherwise specified
+        json_data = {"gwId": "", "devId": "", "uid": "", "t": "", "cid": ""}
+
+    return command_override, json_data
+
+
 class TuyaLoggingAdapter(logging.LoggerAdapter):
     """Adapter that adds device id to all log points."""
 
@@ -269,108 +308,186 @@ class MessageDispatcher(ContextualLogger):
     def __init__(self, dev_id, callback_status_update, protocol_version, local_key):
         """Initialize a new MessageBuffer."""
         super().__init__()
-        self.buffer = b""
-        self.listeners: dict[str, asyncio.Future] = {}
+        self.buffer = bytearray()
+        self._pending_header: TuyaHeader | None = None
+        self._pending_length = 0
+        # Waiters per seqno, special seqnos may have many waiters served FIFO.
+        self.listeners: dict[int, deque[asyncio.Future]] = {}
+        self._listener_cmds: dict[int, int] = {}
         self.callback_status_update = callback_status_update
         self.version = protocol_version
         self.local_key = local_key
+        self._crypto: CipherContext | None = None
+        self.last_received = 0.0  # Monotonic time of the last valid frame.
+
+    @property
+    def crypto(self) -> CipherContext:
+        """Return the crypto context of the current key, rebuilt on key change."""
+        if self._crypto is None or self._crypto.key != self.local_key:
+            self._crypto = CipherContext(self.local_key)
+        return self._crypto
 
     def abort(self):
         """Abort all waiting clients."""
-        for feat in self.listeners.copy():
-            feature = self.listeners.pop(feat)
-            feature.cancel("aborted")
+        listeners, self.listeners = self.listeners, {}
+        self._listener_cmds.clear()
+        for waiters in listeners.values():
+            for future in waiters:
+                future.cancel("aborted")
+
+    def register(self, seqno, cmd) -> asyncio.Future:
+        """Add a listener for seqno, call it before the request is written."""
+        future = asyncio.Future()
+        self.listeners.setdefault(seqno, deque()).append(future)
+        if seqno >= 0:
+            self._listener_cmds[seqno] = cmd
+        return future
+
+    def unregister(self, seqno, future: asyncio.Future):
+        """Remove a listener added with register."""
+        if (waiters := self.listeners.get(seqno)) is None:
+            return
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            del self.listeners[seqno]
+            self._listener_cmds.pop(seqno, None)
 
-    async def wait_for(self, seqno, cmd, timeout=TIMEOUT_REPLY):
-        """Wait for response to a sequence number to be received and return it."""
-        if seqno in self.listeners:
-            self.debug(f"listener exists for {seqno}")
-            if seqno == self.HEARTBEAT_SEQNO:
-                raise Exception(f"listener exists for {seqno}")
+    async def wait_for(self, seqno, cmd, timeout=TIMEOUT_REPLY, future=None):
+        """Wait for response to a sequence number to be received and return it.
 
+        A timeout only fails this listener, other requests keep waiting.
+        """
         self.debug("Command %d waiting for seq. number %d", cmd, seqno)
-        future = asyncio.Future()
-        self.listeners[seqno] = future
+        if future is None:
+            future = self.register(seqno, cmd)
         try:
-            response = await asyncio.wait_for(future, timeout=timeout)
-            return response
+            return await asyncio.wait_for(future, timeout=timeout)
         except asyncio.TimeoutError:
-            self.abort()
             raise TimeoutError(
                 f"Command {cmd} timed out waiting for sequence number {seqno}"
             )
         finally:
-            self.listeners.pop(seqno, True)
+            self.unregister(seqno, future)
 
     def _release_listener(self, seqno, msg):
-        if seqno not in self.listeners:
-            return
+        for future in self.listeners.get(seqno, ()):
+            if not future.done():
+                future.set_result(msg)
+                return
 
-        future = self.listeners[seqno]
-        if isinstance(future, asyncio.Future) and not future.done():
-            future.set_result(msg)
-        else:
+        if seqno in self.listeners:
             self.debug(f"{seqno} - Got additional message without request: skip {msg}")
 
+    def _match_listener(self, cmd) -> int | None:
+        """Return the oldest pending seqno that waits for cmd."""
+        for seqno, listener_cmd in self._listener_cmds.items():
+            if listener_cmd == cmd and any(
+                not future.done() for future in self.listeners[seqno]
+            ):
+                return seqno
+        return None
+
     def add_data(self, data: bytes):
-        """Add new data to the buffer and try to parse messages."""
-        self.buffer += data
-        prefixes_bin = {prefix.bin for prefix in Affix.prefixes}
-        suffixes_bin = {suffix.bin for suffix in Affix.suffixes}
-        header_len = struct.calcsize(MessagesFormat.END_55AA)
-        while self.buffer:
-
-            # Check if enough data for measage header
-            if len(self.buffer) < header_len:
-                break
-
-            if (prefix_index := self.buffer.find(Affix.prefix_55aa.bin)) == -1:
-                prefix_index = self.buffer.find(Affix.prefix_6699.bin)
-
-            if prefix_index == -1:
-                self.debug(f"Invalid prefix: {self.buffer!r}")
-                self.buffer = b""
-            elif self.buffer[:4] not in (prefixes_bin) and prefix_index > 0:
-                self.debug(f"prefix is not at the end: {self.buffer}")
-                self.buffer = self.buffer[prefix_index:]
-
-            if (suffix_index := self.buffer.find(Affix.suffix_55aa.bin)) == -1:
-                suffix_index = self.buffer.find(Affix.suffix_6699.bin)
-
-            # if not any (self.buffer.endswith(suffix) for suffix in suffixes)
-            if suffix_index == -1:
-                self.debug(f"Invalid suffix: {self.buffer!r}")
-                self.buffer = b""
-            if not any(self.buffer.endswith(suffix_bin) for suffix_bin in suffixes_bin):
-                self.debug(f"suffix is not at the end: {self.buffer!r}")
-                break
-                # self.buffer = self.buffer[: suffix_index + 4]
-
-            header = parser.parse_header(self.buffer, logger=self)
-            if len(self.buffer) < header.total_length:
-                self.debug(f"Not enough data to parse: {self.buffer}")
-                break  # not enough data.
-
-            hmac_key = self.local_key if self.version >= 3.4 else None
-            no_retcode = False
-            msg = parser.unpack_message(
-                self.buffer,
-                header=header,
-                hmac_key=hmac_key,
-                no_retcode=no_retcode,
-                logger=self,
-            )
-            self.buffer = self.buffer[header.total_length :]
+        """Add new data to the buffer and try to parse messages.
+
+        The buffer is a bytearray consumed through a read cursor: every header is
+        parsed once, complete frames are sliced out once, and the consumed bytes
+        are dropped in a single step after the whole chunk has been parsed.
+        """
+        buffer = self.buffer
+        buffer += data
+        if len(buffer) < self._pending_length:
+            return  # The pending frame is still incomplete.
+
+        messages: list[TuyaMessage] = []
+        header, self._pending_header = self._pending_header, None
+        self._pending_length = 0
+
+        with memoryview(buffer) as view:
+            cursor, end = 0, len(view)
+            while end - cursor >= HEADER_55AA_SIZE:
+                if header is None:
+                    if buffer.startswith(Affix.prefix_55aa.bin, cursor):
+                        header_size = HEADER_55AA_SIZE
+                    elif buffer.startswith(Affix.prefix_6699.bin, cursor):
+                        header_size = HEADER_6699_SIZE
+                    else:
+                        cursor = self._resync(cursor)
+                        continue
+
+                    if end - cursor < header_size:
+                        break  # Wait for the rest of the header.
+
+                    try:
+                        header = parser.parse_header(view[cursor:], logger=self)
+                    except parser.DecodeError:
+                        cursor = self._resync(cursor)
+                        continue
+
+                frame_end = cursor + header.total_length
+                if frame_end > end:
+                    # Wait for the rest of the frame, it will start at 0 after compact.
+                    self._pending_header = header
+                    self._pending_length = header.total_length
+                    break
+
+                suffix = SUFFIXES_BIN[header.prefix]
+                if not buffer.startswith(suffix, frame_end - 4):
+                    self.debug(f"Invalid suffix: {bytes(view[cursor:frame_end])!r}")
+                    cursor, header = self._resync(cursor), None
+                    continue
+
+                messages.append(
+                    parser.unpack_message(
+                        bytes(view[cursor:frame_end]),
+                        header=header,
+                        no_retcode=False,
+                        logger=self,
+                        context=self.crypto if self.version >= 3.4 else None,
+                    )
+                )
+                cursor, header = frame_end, None
+
+        # Drop the consumed bytes once per chunk instead of once per frame.
+        if cursor >= len(buffer):
+            buffer.clear()
+        elif cursor:
+            del buffer[:cursor]
+
+        for msg in messages:
             self._dispatch(msg)
 
+    def _resync(self, cursor: int) -> int:
+        """Return the position of the next frame prefix after a corrupted one."""
+        buffer = self.buffer
+        found = [
+            index
+            for prefix in Affix.prefixes
+            if (index := buffer.find(prefix.bin, cursor + 1)) != -1
+        ]
+        if found:
+            self.debug(f"Skipping {min(found) - cursor} bytes of invalid data")
+            return min(found)
+
+        # Keep the tail in-case it is the beginning of a split prefix.
+        self.debug(f"Invalid prefix: {bytes(buffer[cursor:])!r}")
+        return max(cursor + 1, len(buffer) - 3)
+
     def _dispatch(self, msg: TuyaMessage):
         """Dispatch a message to someone that is listening."""
 
         self.debug("Dispatching message CMD %r %s", msg.cmd, msg)
+        if msg.crc_good:
+            self.last_received = time.monotonic()
 
         if msg.seqno in self.listeners:
             self.debug("Dispatching sequence number %d", msg.seqno)
             self._release_listener(msg.seqno, msg)
+        elif msg.seqno == 0 and (seqno := self._match_listener(msg.cmd)) is not None:
+            # Some firmwares reply with seqno 0, match the oldest request of this cmd.
+            self.debug("Dispatching seqno 0 reply to sequence number %d", seqno)
+            self._release_listener(seqno, msg)
 
         if msg.cmd == CMDType.HEART_BEAT:
             self.debug("Got heartbeat response")
@@ -414,8 +531,8 @@ class TuyaListener(ABC):
     sub_devices: dict[str, Self]
 
     @abstractmethod
-    def status_updated(self, status):
-        """Device updated status."""
+    def status_updated(self, status, delta: StatusDelta | None = None):
+        """Device updated status, delta holds the DPs of a pushed frame."""
 
     @abstractmethod
     def disconnected(self, exc=""):
@@ -429,7 +546,7 @@ class TuyaListener(ABC):
 class EmptyListener(TuyaListener):
     """Listener doing nothing."""
 
-    def status_updated(self, status):
+    def status_updated(self, status, delta: StatusDelta | None = None):
         """Device updated status."""
 
     def disconnected(self, exc=""):
@@ -449,6 +566,8 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         protocol_version: float,
         enable_debug: bool,
         listener: TuyaListener,
+        max_inflight: int = MAX_INFLIGHT,
+        product_key: str = None,
     ):
         """
         Initialize a new TuyaInterface.
@@ -457,6 +576,8 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             dev_id (str): The device id.
             address (str): The network address.
             local_key (str, optional): The encryption key. Defaults to None.
+            max_inflight (int, optional): Requests allowed to await a reply at once.
+            product_key (str, optional): Product key, used to share learned write rates.
 
         Attributes:
             port (int): The port to connect to.
@@ -469,6 +590,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         self.id = dev_id
         self.local_key = local_key.encode("latin1")
         self.real_local_key = self.local_key
+        self._static_payloads: dict[CMDType, MessagePayload] = {}
         self.dev_type = "type_0a"
         self.dps_to_request = {}
 
@@ -479,20 +601,26 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             # them (such as BulbDevice) make connections when called
             TuyaProtocol.set_version(self, 3.1)
 
-        self.cipher = AESCipher(self.local_key)
+        self._crypto: CipherContext | None = None
+        self._heartbeat_cache: tuple | None = None
+        self.stats = ProtocolStats()
         self.seqno = 1
         self.transport = None
         self.listener = weakref.ref(listener)
         self.dispatcher = self._setup_dispatcher()
-        self.heartbeater: asyncio.Task | None = None
+        self.heartbeater: ScheduledEntry | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._session_task: asyncio.Task | None = None
+        self._heartbeat_failures = 0
+        self._keep_alive_query = False
         self._sub_devs_query_task: asyncio.Task | None = None
         self.dps_cache = {}
         self.local_nonce = b"0123456789abcdef"  # not-so-random random key
         self.remote_nonce = b""
         self.dps_whitelist = UPDATE_DPS_WHITELIST
-        self.dispatched_dps = {}  # Store payload so we can trigger an event in HA.
         self._last_command_sent = 1  # The time last command was sent
-        self._write_lock = asyncio.Lock()  # To serialize writes
+        self.pacer = WritePacer(self.version, product_key)
+        self._inflight = asyncio.Semaphore(max_inflight)  # Pipelined requests window
         self.enable_debug(enable_debug)
 
     def set_version(self, protocol_version):
@@ -508,18 +636,27 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         elif protocol_version == 3.5:
             self.dev_type = "v3.5"
 
-    def error_json(self, number=None, payload=None):
-        """Return error details in JSON."""
-        try:
-            spayload = json.dumps(payload)
-            # spayload = payload.replace('\"','').replace('\'','')
-        except Exception:  # pylint: disable=broad-except
-            spayload = '""'
+    @property
+    def dev_type(self) -> str:
+        """Return the device type that selects the payload templates."""
+        return self._dev_type
 
-        vals = (error_codes[number], str(number), spayload)
-        self.debug("ERROR %s - %s - payload: %s", *vals)
+    @dev_type.setter
+    def dev_type(self, dev_type: str):
+        """Set the device type and drop the payloads built for the old one."""
+        self._dev_type = dev_type
+        self._static_payloads.clear()
 
-        return json.loads('{ "Error":"%s", "Err":"%s", "Payload":%s }' % vals)
+    def error_json(self, number=None, payload=None):
+        """Return error details as a dict."""
+        if isinstance(payload, (bytes, bytearray)):
+            payload = payload.decode(errors="replace")
+        elif not isinstance(payload, (str, int, float, dict, list, type(None))):
+            payload = ""
+
+        error = {"Error": error_codes[number], "Err": str(number), "Payload": payload}
+        self.debug("ERROR %s - %s - payload: %s", *error.values())
+        return error
 
     def _msg_subdevs_query(self, decoded_message):
         """
@@ -566,7 +703,6 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
                     return
 
             decoded_message: dict = self._decode_payload(msg.payload)
-            cid = None
 
             # Sub-devices query message.
             if msg.cmd == CMDType.LAN_EXT_STREAM:
@@ -575,13 +711,12 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             if "dps" not in decoded_message:
                 return
 
-            if dps_payload := decoded_message.get("dps"):
-                if cid := decoded_message.get("cid"):
-                    self.dps_cache.setdefault(cid, {})
-                    self.dps_cache[cid].update(dps_payload)
-                else:
-                    self.dps_cache.setdefault("parent", {})
-                    self.dps_cache["parent"].update(dps_payload)
+            dps_payload = decoded_message.get("dps") or {}
+            cid = decoded_message.get("cid")
+            # Compare the frame with the cache once, for every layer above.
+            status = self.dps_cache.setdefault(cid or "parent", {})
+            delta = StatusDelta.compare(status, dps_payload)
+            status.update(dps_payload)
 
             listener = self.listener and self.listener()
             if listener is not None:
@@ -591,66 +726,83 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
                         return self.debug(
                             f'Payload for missing sub-device discarded: "{decoded_message}"'
                         )
-                    status = self.dps_cache.get(cid, {})
-                else:
-                    status = self.dps_cache.get("parent", {})
 
-                listener.status_updated(status)
+                listener.status_updated(status, delta)
 
         return MessageDispatcher(self.id, _status_update, self.version, self.local_key)
 
     def connection_made(self, transport):
-        """Did connect to the device."""
+        """Did connect to the device, start the session key negotiation right away."""
         self.transport = transport
+        if self.version >= 3.4:
+            self._start_session()
 
-    def keep_alive(self, is_gateway: bool = False):
+    def keep_alive(
+        self, is_gateway: bool = False, scheduler: HeartbeatScheduler | None = None
+    ):
         """
         Start the heartbeat transmissions with the device.
             is_gateway: will use subdevices_query as heartbeat.
+            scheduler: timer wheel shared with other connections, defaults to the
+                one of the event loop.
         """
+        if self.heartbeater is not None:
+            return  # Prevent duplicates heartbeat entries
+
+        # Ver. 3.3 gateways don't respond to subdevice query
+        self._keep_alive_query = is_gateway and self.version >= 3.4
+        self._heartbeat_failures = 0
+        scheduler = scheduler or default_scheduler(self.loop)
+        self.heartbeater = scheduler.schedule(self._keep_alive, HEARTBEAT_INTERVAL)
+        self.debug("Started keep alive.")
+
+    def _keep_alive(self) -> float | None:
+        """Start a heartbeat if it is due and return when to check again.
+
+        Any valid frame from the device proves the link is alive as well as a
+        heartbeat reply does, so heartbeats are only sent after HEARTBEAT_INTERVAL
+        without inbound traffic. Two heartbeats in a row without a reply or any
+        other frame still disconnect. Gateway sub-device queries also refresh the
+        sub-devices states and are never skipped.
+        """
+        now = time.monotonic()
+        last_received = self.dispatcher.last_received
+        if not self._keep_alive_query and now - last_received < HEARTBEAT_INTERVAL:
+            self._heartbeat_failures = 0
+            self.stats.heartbeats_skipped += 1
+            return last_received + HEARTBEAT_INTERVAL
+
+        if self._heartbeat_task is None:
+            self._heartbeat_task = self.loop.create_task(self._send_keep_alive())
+        return now + HEARTBEAT_INTERVAL
+
+    async def _send_keep_alive(self):
+        """Send one heartbeat, disconnect after two timeouts in a row or an error."""
+        try:
+            if self._keep_alive_query:
+                await self.subdevices_query()
+            else:
+                await self.heartbeat()
+            self._heartbeat_failures = 0
+            return
+        except asyncio.CancelledError:
+            return
+        except asyncio.TimeoutError:
+            self._heartbeat_failures += 1
+            if self._heartbeat_failures < 2:
+                return
+            self.debug("Heartbeat failed due to timeout, disconnecting")
+        except Exception as ex:  # pylint: disable=broad-except
+            self.exception("Heartbeat failed (%s), disconnecting", ex)
+        finally:
+            self._heartbeat_task = None
 
-        async def keep_alive_loop(action):
-            """Continuously send heart beat updates."""
-            self.debug("Started keep alive loop.")
-            fail_attempt = 0
-            delta = 0
-            while True:
-                start = time.monotonic()
-                try:
-                    await asyncio.sleep(HEARTBEAT_INTERVAL - delta)
-                    await action()
-                    fail_attempt = 0
-                except asyncio.CancelledError:
-                    self.debug("Stopped heartbeat loop")
-                    break
-                except asyncio.TimeoutError:
-                    fail_attempt += 1
-                    if fail_attempt >= 2:
-                        self.debug("Heartbeat failed due to timeout, disconnecting")
-                        break
-                except Exception as ex:  # pylint: disable=broad-except
-                    self.exception("Heartbeat failed (%s), disconnecting", ex)
-                    break
-                # Adjusts sleep time to maintain the heartbeat interval
-                delta = (time.monotonic() - start) - HEARTBEAT_INTERVAL
-                delta = max(0, min(delta, HEARTBEAT_INTERVAL))
-
+        if self.heartbeater:
+            self.heartbeater.cancel()
             self.heartbeater = None
-            if self.transport is not None:
-                self.clean_up_session()
-
-            self.debug("Stopped heartbeat loop")
-
-        if self.heartbeater is None:
-            # Prevent duplicates heartbeat task
-            self.heartbeater = self.loop.create_task(
-                keep_alive_loop(
-                    # Ver. 3.3 gateways don't respond to subdevice query
-                    self.subdevices_query
-                    if is_gateway and self.version >= 3.4
-                    else self.heartbeat
-                )
-            )
+        if self.transport is not None:
+            self.clean_up_session()
+        self.debug("Stopped heartbeat loop")
 
     def data_received(self, data):
         """Received data from device."""
@@ -671,21 +823,18 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             self.exception("Failed to call disconnected callback")
 
     async def transport_write(self, data):
-        """Write data on transport, ensure that no massive requests happen all at once."""
-        async with self._write_lock:
-            while self.last_command_sent < 0.050:
-                await asyncio.sleep(0.010)
-
-            self._last_command_sent = time.monotonic()
-            self.transport.write(data)
+        """Write data on transport, paced to the rate the device can handle."""
+        await self.pacer.acquire()
+        self._last_command_sent = time.monotonic()
+        self.transport.write(data)
 
     async def close(self):
         """Close connection and abort all outstanding listeners."""
         self.debug("Closing connection")
         self.clean_up_session()
 
-        if self.heartbeater:
-            await self.heartbeater
+        if self._heartbeat_task:
+            await asyncio.wait([self._heartbeat_task])
 
         if self._sub_devs_query_task:
             await self._sub_devs_query_task
@@ -697,15 +846,33 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
 
         if self.heartbeater:
             self.heartbeater.cancel()
+            self.heartbeater = None
+
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
 
         if self._sub_devs_query_task:
             self._sub_devs_query_task.cancel()
 
+        # A running negotiation fails on its own once the transport is closed.
+        self._session_task = None
+
         if self.is_connected:
             self.transport.close()
 
         if self.dispatcher:
             self.dispatcher.abort()
+            self.dispatcher._crypto = None
+        self.pacer.close()
+        self._crypto = None
+        self._heartbeat_cache = None
+
+    @property
+    def crypto(self) -> CipherContext:
+        """Return the crypto context of the current key, rebuilt on key change."""
+        if self._crypto is None or self._crypto.key != self.local_key:
+            self._crypto = CipherContext(self.local_key)
+        return self._crypto
 
     async def exchange_quick(self, payload, recv_retries):
         """Similar to exchange() but never retries sending and does not decode the response."""
@@ -753,15 +920,21 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         dps: dict = None,
         nodeID: str = None,
         payload: dict = None,
+        timeout: float = TIMEOUT_REPLY,
+        retries: int = 0,
     ):
-        """Send and receive a message, returning response from device."""
+        """Send and receive a message, returning response from device.
+
+        Requests are pipelined up to the in-flight window, each one waits for its own
+        reply and is re-sent up to retries times if that reply times out. Heartbeats
+        do not wait for the window: slow commands must not delay them past the
+        interval the device expects them in.
+        """
         if not self.is_connected:
             return None
 
-        if self.version >= 3.4 and self.real_local_key == self.local_key:
-            self.debug("3.4 or 3.5 device: negotiating a new session key")
-            if not await self._negotiate_session_key():
-                return self.clean_up_session()
+        if self.version >= 3.4 and not await self._ensure_session_key():
+            return self.clean_up_session()
 
         self.debug(
             "Sending command %s (device type: %s) DPS: %s", command, self.dev_type, dps
@@ -770,23 +943,43 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         real_cmd = payload.cmd
         dev_type = self.dev_type
 
-        # Wait for special sequence number
-        seqno = self.seqno
+        inflight = self._inflight
+        if real_cmd == CMDType.HEART_BEAT:
+            inflight = contextlib.nullcontext()
+        async with inflight:
+            for attempt in range(retries + 1):
+                # Wait for special sequence number
+                seqno = self.seqno
+
+                if payload.cmd == CMDType.HEART_BEAT:
+                    seqno = MessageDispatcher.HEARTBEAT_SEQNO
+                elif payload.cmd == CMDType.UPDATEDPS:
+                    seqno = MessageDispatcher.RESET_SEQNO
+                elif payload.cmd == CMDType.LAN_EXT_STREAM:
+                    seqno = MessageDispatcher.SUB_DEVICE_QUERY_SEQNO
+
+                enc_payload = self._encode_message(payload)
+                # Listen before writing, the reply may arrive before the write returns.
+                future = self.dispatcher.register(seqno, payload.cmd)
 
-        if payload.cmd == CMDType.HEART_BEAT:
-            seqno = MessageDispatcher.HEARTBEAT_SEQNO
-        elif payload.cmd == CMDType.UPDATEDPS:
-            seqno = MessageDispatcher.RESET_SEQNO
-        elif payload.cmd == CMDType.LAN_EXT_STREAM:
-            seqno = MessageDispatcher.SUB_DEVICE_QUERY_SEQNO
-
-        enc_payload = self._encode_message(payload)
+                try:
+                    await self.transport_write(enc_payload)
+                except Exception:  # pylint: disable=broad-except
+                    self.dispatcher.unregister(seqno, future)
+                    return self.clean_up_session()
+                sent = time.monotonic()
+                try:
+                    msg = await self.dispatcher.wait_for(
+                        seqno, payload.cmd, timeout, future=future
+                    )
+                    self.pacer.on_ack(time.monotonic() - sent)
+                    break
+                except TimeoutError:
+                    self.pacer.on_timeout()
+                    if attempt == retries or not self.is_connected:
+                        raise
+                    self.debug("Command %s timed out, retrying", command)
 
-        try:
-            await self.transport_write(enc_payload)
-        except Exception:  # pylint: disable=broad-except
-            return self.clean_up_session()
-        msg = await self.dispatcher.wait_for(seqno, payload.cmd)
         if msg is None:
             self.debug("Wait was aborted for seqno %d", seqno)
             return None
@@ -925,7 +1118,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             self.dps_to_request.update({str(index): None for index in dp_indicies})
 
     def _decode_payload(self, payload):
-        cipher = AESCipher(self.local_key)
+        cipher = self.crypto.cipher
 
         if self.version == 3.4:
             # 3.4 devices encrypt the version header in addition to the payload
@@ -946,7 +1139,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             payload = payload[len(PROTOCOL_VERSION_BYTES_31) :]
             # Decrypt payload
             # Remove 16-bytes of MD5 hexdigest of payload
-            payload = cipher.decrypt(payload[16:])
+            payload = cipher.decrypt(payload[16:], decode_text=False)
         elif self.version >= 3.2:  # 3.2 or 3.3 or 3.4
             # Trim header for non-default device type
             if payload.startswith(self.version_bytes):
@@ -959,7 +1152,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             if self.version < 3.4:
                 try:
                     # self.debug("decrypting=%r", payload)
-                    payload = cipher.decrypt(payload, False)
+                    payload = cipher.decrypt(payload, False, decode_text=False)
                 except Exception as ex:
                     self.debug(
                         "incomplete payload=%r with len:%d (%s)",
@@ -972,14 +1165,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
                 # self.debug("decrypted 3.x payload=%r", payload)
                 # Try to detect if type_0d found
 
-            if not isinstance(payload, str):
-                try:
-                    payload = payload.decode()
-                except Exception as ex:
-                    self.debug("payload was not string type and decoding failed")
-                    return self.error_json(ERR_JSON, payload)
-
-            if "data unvalid" in payload:  # codespell:ignore
+            if b"data unvalid" in payload:  # codespell:ignore
                 if self.version == 3.3:
                     self.dev_type = "type_0d"
                     self.debug(
@@ -991,15 +1177,13 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             self.debug("Unexpected payload=%r", payload)
             return self.error_json(ERR_PAYLOAD, payload)
 
-        if not isinstance(payload, str):
-            payload = payload.decode()
         self.debug("Deciphered data = %r", payload)
         try:
-            json_payload = json.loads(payload)
+            json_payload = codec.loads(payload)
         except Exception as ex:
             json_payload = self.error_json(ERR_JSON, payload)
 
-            if "devid not" in payload:  # DeviceID Not found.
+            if b"devid not" in payload:  # DeviceID Not found.
                 raise ValueError(f"DeviceID [{self.id}] Not found")
             # else:
             #     raise DecodeError(
@@ -1018,14 +1202,38 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             if "cid" in json_payload["data"]:
                 json_payload["cid"] = json_payload["data"]["cid"]
 
-        # We will store the payload to trigger an event in HA.
-        if "dps" in json_payload:
-            self.dispatched_dps = json_payload["dps"]
         return json_payload
 
+    def _start_session(self) -> asyncio.Task:
+        """Start negotiating the session key, every request of the session awaits it."""
+
+        async def negotiate():
+            self.debug("3.4 or 3.5 device: negotiating a new session key")
+            start = time.perf_counter()
+            if success := await self._negotiate_session_key():
+                self.stats.handshakes += 1
+                self.stats.handshake_ms = (time.perf_counter() - start) * 1000
+            return success
+
+        def retrieve_exception(task: asyncio.Task):
+            # The negotiation may fail before any request awaits it.
+            if not task.cancelled():
+                task.exception()
+
+        self._session_task = self.loop.create_task(negotiate())
+        self._session_task.add_done_callback(retrieve_exception)
+        return self._session_task
+
+    async def _ensure_session_key(self) -> bool:
+        """Wait for the session key, concurrent requests share one negotiation."""
+        task = self._session_task or self._start_session()
+        # Requests may be cancelled, the negotiation goes on for the others.
+        return await asyncio.shield(task)
+
     async def _negotiate_session_key(self):
         self.remote_nonce = b""
         self.local_key = self.real_local_key
+        real_crypto = self.crypto
 
         try:
             rkey = await self.exchange_quick(
@@ -1052,8 +1260,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         if self.version == 3.4:
             try:
                 # self.debug("decrypting %r using %r", payload, self.real_local_key)
-                cipher = AESCipher(self.real_local_key)
-                payload = cipher.decrypt(payload, False, decode_text=False)
+                payload = real_crypto.cipher.decrypt(payload, False, decode_text=False)
             except Exception as ex:
                 self.debug(
                     "session key step 2 decrypt failed, payload=%r with len:%d (%s)",
@@ -1070,7 +1277,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             return False
 
         self.remote_nonce = payload[:16]
-        hmac_check = hmac.new(self.local_key, self.local_nonce, sha256).digest()
+        hmac_check = real_crypto.hmac(self.local_nonce)
 
         if hmac_check != payload[16:48]:
             self.debug(
@@ -1080,7 +1287,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             )
 
         # self.debug("session local nonce: %r remote nonce: %r", self.local_nonce, self.remote_nonce)
-        rkey_hmac = hmac.new(self.local_key, self.remote_nonce, sha256).digest()
+        rkey_hmac = real_crypto.hmac(self.remote_nonce)
         await self.exchange_quick(
             MessagePayload(CMDType.SESS_KEY_NEG_FINISH, rkey_hmac), None
         )
@@ -1090,7 +1297,7 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         )
         # self.debug("Session nonce XOR'd: %r" % self.local_key)
 
-        cipher = AESCipher(self.real_local_key)
+        cipher = real_crypto.cipher
         if self.version == 3.4:
             self.local_key = self.dispatcher.local_key = cipher.encrypt(
                 self.local_key, False, pad=False
@@ -1106,14 +1313,18 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         return True
 
     # adds protocol header (if needed) and encrypts
-    def _encode_message(self, msg: MessagePayload):
-        hmac_key = None
+    def _encode_message(self, msg: MessagePayload, use_cache=True):
+        if use_cache and msg.cmd == CMDType.HEART_BEAT:
+            return self._encode_heartbeat(msg)
+
+        context = None
         iv = None
         payload = msg.payload
-        self.cipher = AESCipher(self.local_key)
+        crypto = self.crypto
+        cipher = crypto.cipher
 
         if self.version >= 3.4:
-            hmac_key = self.local_key
+            context = crypto
             if msg.cmd not in NO_PROTOCOL_HEADER_CMDS:
                 # add the 3.x header
                 payload = self.version_header + payload
@@ -1133,20 +1344,20 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
                     True,
                 )
                 self.seqno += 1  # increase message sequence number
-                data = parser.pack_message(msg, hmac_key=self.local_key)
+                data = parser.pack_message(msg, context=context)
                 self.debug("payload encrypted=%r", binascii.hexlify(data))
                 return data
 
-            payload = self.cipher.encrypt(payload, False)
+            payload = cipher.encrypt(payload, False)
         elif self.version >= 3.2:
             # expect to connect and then disconnect to set new
-            payload = self.cipher.encrypt(payload, False)
+            payload = cipher.encrypt(payload, False)
             if msg.cmd not in NO_PROTOCOL_HEADER_CMDS:
                 # add the 3.x header
                 payload = self.version_header + payload
         elif msg.cmd == CMDType.CONTROL:
             # need to encrypt
-            payload = self.cipher.encrypt(payload)
+            payload = cipher.encrypt(payload)
             preMd5String = (
                 b"data="
                 + payload
@@ -1165,15 +1376,60 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
                 + payload
             )
 
-        self.cipher = None
         msg = TuyaMessage(
             self.seqno, msg.cmd, 0, payload, 0, True, Affix.prefix_55aa.value, False
         )
         self.seqno += 1  # increase message sequence number
-        buffer = parser.pack_message(msg, hmac_key=hmac_key)
+        buffer = parser.pack_message(msg, context=context)
         # self.debug("payload encrypted with key %r => %r", self.local_key, binascii.hexlify(buffer))
         return buffer
 
+    def _encode_heartbeat(self, msg: MessagePayload):
+        """Encode a heartbeat by patching the frame cached for this session.
+
+        The heartbeat body never changes within a session, only the seqno and the
+        CRC/HMAC are rewritten. 3.5 frames re-encrypt the body with a new IV using
+        the cached header as AAD.
+        """
+        start = time.perf_counter_ns()
+        crypto = self.crypto
+        key = (self.version, crypto, msg)
+        if self._heartbeat_cache is None or self._heartbeat_cache[0] != key:
+            data = self._encode_message(msg, use_cache=False)
+            self._heartbeat_cache = (key, bytearray(data))
+            self.stats.heartbeat_frames_built += 1
+        else:
+            frame = self._heartbeat_cache[1]
+            if self.version >= 3.5:
+                # prefix, unknown, seqno, cmd, length
+                struct.pack_into(">I", frame, 6, self.seqno)
+                header = frame[:HEADER_6699_SIZE]
+                data = (
+                    header
+                    + crypto.cipher.encrypt(
+                        msg.payload,
+                        use_base64=False,
+                        pad=False,
+                        iv=True,
+                        header=header[4:],
+                    )
+                    + Affix.suffix_6699.bin
+                )
+            else:
+                struct.pack_into(">I", frame, 4, self.seqno)
+                if self.version >= 3.4:
+                    frame[-36:-4] = crypto.hmac(memoryview(frame)[:-36])
+                else:
+                    crc = binascii.crc32(memoryview(frame)[:-8]) & 0xFFFFFFFF
+                    struct.pack_into(">I", frame, len(frame) - 8, crc)
+                data = frame
+            data = bytes(data)
+            self.seqno += 1
+
+        self.stats.heartbeats += 1
+        self.stats.heartbeat_encode_ns += time.perf_counter_ns() - start
+        return data
+
     def _generate_payload(
         self,
         command: CMDType,
@@ -1198,43 +1454,18 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             rawData (str, optional): Overrides the 'data' field in the payload.
             reqType (str, optional): Request type, used for gateway-level commands.
         """
-        json_data = command_override = None
-
-        # Create a deep copy of payload_dict. otherwise, the original references will be overwritten
-        def deepcopy_dict(_dict: dict):
-            output = _dict.copy()
-            for key, value in output.items():
-                output[key] = deepcopy_dict(value) if isinstance(value, dict) else value
-            return output
-
-        payloads = deepcopy_dict(payload_dict)
-
-        if command in payloads[self.dev_type]:
-            if "command" in payloads[self.dev_type][command]:
-                json_data = payloads[self.dev_type][command]["command"].copy()
-            if "command_override" in payloads[self.dev_type][command]:
-                command_override = payloads[self.dev_type][command]["command_override"]
-
-        if self.dev_type != "type_0a":
-            if (
-                json_data is None
-                and command in payloads["type_0a"]
-                and "command" in payloads["type_0a"][command]
-            ):
-                json_data = payloads["type_0a"][command]["command"].copy()
-            if (
-                command_override is None
-                and command in payloads["type_0a"]
-                and "command_override" in payloads["type_0a"][command]
-            ):
-                command_override = payloads["type_0a"][command]["command_override"]
+        static = not any(
+            arg is not None
+            for arg in (data, gwId, devId, uid, nodeId, rawData, reqType)
+        )
+        if static and (cached := self._static_payloads.get(command)) is not None:
+            self.debug("Sending payload: %s", cached.payload)
+            return cached
 
-        if command_override is None:
-            command_override = command
-        if json_data is None:
-            # I have yet to see a device complain about included but unneeded attribs, but they *will*
-            # complain about missing attribs, so just include them all unless otherwise specified
-            json_data = {"gwId": "", "devId": "", "uid": "", "t": "", "cid": ""}
+        command_override, template = payload_template(self.dev_type, command)
+        json_data = template.copy()
+        if isinstance(json_data.get("data"), dict):
+            json_data["data"] = json_data["data"].copy()
 
         if "gwId" in json_data:
             json_data["gwId"] = gwId if gwId is not None else self.id
@@ -1274,10 +1505,14 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             t = time.time()
             json_data["uid"] = int(t) if json_data["t"] == "int" else str(int(t))
 
-        payload = json.dumps(json_data, separators=(",", ":")) if json_data else ""
+        payload = codec.dumps(json_data) if json_data else b""
 
         self.debug("Sending payload: %s", payload)
-        return MessagePayload(command_override, payload.encode())
+        payload = MessagePayload(command_override, payload)
+        # Payloads without a timestamp or per-call fields never change (e.g. heartbeats).
+        if static and "t" not in json_data and "dps" not in json_data:
+            self._static_payloads[command] = payload
+        return payload
 
     def enable_debug(self, enable=False, friendly_name=None):
         """Enable the debug logs for the device."""
@@ -1307,6 +1542,8 @@ async def connect(
     listener=None,
     port=6668,
     timeout=TIMEOUT_CONNECT,
+    max_inflight=MAX_INFLIGHT,
+    product_key=None,
 ):
     """Connect to a device."""
     loop = asyncio.get_running_loop()
@@ -1319,6 +1556,8 @@ async def connect(
                     protocol_version,
                     enable_debug,
                     listener or EmptyListener(),
+                    max_inflight,
+                    product_key,
                 ),
                 address,
                 port,
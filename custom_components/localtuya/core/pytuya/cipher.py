@@ -2,9 +2,12 @@
 
 import logging
 import base64
+import hmac
 import time
+from hashlib import sha256
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,6 +20,14 @@ class AESCipher:
         self.block_size = 16
         self.key = key
         self.cipher = Cipher(algorithms.AES(key), modes.ECB(), default_backend())
+        self._gcm: AESGCM | None = None
+
+    @property
+    def gcm(self) -> AESGCM:
+        """Return the GCM primitive for this key, created on first use."""
+        if self._gcm is None:
+            self._gcm = AESGCM(self.key)
+        return self._gcm
 
     def encrypt(self, raw, use_base64=True, pad=True, iv=False, header=None):
         """Encrypt data to be sent to device."""
@@ -26,11 +37,8 @@ class AESCipher:
                     iv = b"0123456789ab"
                 else:
                     iv = str(time.time() * 10)[:12].encode("utf8")
-            encryptor = Cipher(algorithms.AES(self.key), modes.GCM(iv)).encryptor()
-            if header:
-                encryptor.authenticate_additional_data(header)
-            crypted_text = encryptor.update(raw) + encryptor.finalize()
-            crypted_text = iv + crypted_text + encryptor.tag
+            # AESGCM returns the ciphertext followed by the 16 bytes tag.
+            crypted_text = iv + self.gcm.encrypt(iv, raw, header or None)
         else:
             encryptor = self.cipher.encryptor()
             if pad:
@@ -54,13 +62,9 @@ class AESCipher:
                 decryptor = Cipher(
                     algorithms.AES(self.key), modes.CTR(iv + b"\x00\x00\x00\x02")
                 ).decryptor()
+                raw = decryptor.update(enc) + decryptor.finalize()
             else:
-                decryptor = Cipher(
-                    algorithms.AES(self.key), modes.GCM(iv, tag)
-                ).decryptor()
-            if header and (tag is not None):
-                decryptor.authenticate_additional_data(header)
-            raw = decryptor.update(enc) + decryptor.finalize()
+                raw = self.gcm.decrypt(iv, enc + tag, header or None)
         else:
             decryptor = self.cipher.decryptor()
             raw = decryptor.update(enc) + decryptor.finalize()
@@ -75,3 +79,23 @@ class AESCipher:
     @staticmethod
     def _unpad(data):
         return data[: -ord(data[len(data) - 1 :])]
+
+
+class CipherContext:
+    """Crypto primitives bound to a single key.
+
+    Created once per (session) key and reused for every frame, instead of
+    creating new cipher and HMAC objects for each message.
+    """
+
+    def __init__(self, key: bytes):
+        """Initialize the ECB/GCM cipher and the pre-keyed HMAC template."""
+        self.key = key
+        self.cipher = AESCipher(key)
+        self._hmac = hmac.new(key, digestmod=sha256)
+
+    def hmac(self, data: bytes) -> bytes:
+        """Return the HMAC-SHA256 digest of data using this context key."""
+        digest = self._hmac.copy()
+        digest.update(data)
+        return digest.digest()
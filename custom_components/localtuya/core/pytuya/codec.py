@@ -0,0 +1,46 @@
+"""JSON codec used by pytuya, discovery and the cloud API.
+
+orjson is used when it is installed (it ships with Home Assistant), the
+standard library json module otherwise. Both accept bytes directly, so payloads
+do not have to be decoded to str first. Non-ASCII characters are escaped by
+both, devices have only ever been sent ASCII.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError is a subclass of json.JSONDecodeError.
+JSONDecodeError = json.JSONDecodeError
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def loads(data: bytes | str):
+        """Deserialize bytes or str to a Python object."""
+        return orjson.loads(data)
+
+    def dumps(obj) -> bytes:
+        """Serialize obj to compact JSON bytes."""
+        data = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        # orjson has no ASCII option, leave the rare non-ASCII payloads to json.
+        return data if data.isascii() else _json_dumps(obj)
+
+else:
+    BACKEND = "json"
+
+    def loads(data: bytes | str):
+        """Deserialize bytes or str to a Python object."""
+        return json.loads(data)
+
+    def dumps(obj) -> bytes:
+        """Serialize obj to compact JSON bytes."""
+        return _json_dumps(obj)
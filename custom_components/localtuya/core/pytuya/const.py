@@ -68,6 +68,39 @@ class TuyaMessage:
     iv: bool = None
 
 
+@dataclass
+class ProtocolStats:
+    """Counters of a TuyaProtocol, used to measure the protocol cost."""
+
+    heartbeats: int = 0  # Heartbeat frames encoded.
+    heartbeat_frames_built: int = 0  # Heartbeats encoded without the cached frame.
+    heartbeat_encode_ns: int = 0  # Total time spent encoding heartbeats.
+    heartbeats_skipped: int = 0  # Heartbeats not sent, the device sent frames.
+    handshakes: int = 0  # Session keys negotiated.
+    handshake_ms: float = 0.0  # Duration of the last session key negotiation.
+
+
+@dataclass(slots=True)
+class StatusDelta:
+    """DPs of one status frame, compared with the status known before it."""
+
+    dps: dict  # Every DP of the frame, as sent.
+    changed: dict  # DPs of the frame with a new value.
+    old: dict  # Previous values of the changed DPs, unknown DPs are missing.
+
+    @classmethod
+    def compare(cls, status: dict, dps: dict) -> "StatusDelta":
+        """Return the delta of dps to status, status is not updated."""
+        changed, old = {}, {}
+        for dp, value in dps.items():
+            if dp in status:
+                if (previous := status[dp]) == value:
+                    continue
+                old[dp] = previous
+            changed[dp] = value
+        return cls(dps, changed, old)
+
+
 class SubdeviceState(IntEnum):
     ONLINE = 1
     OFFLINE = 2
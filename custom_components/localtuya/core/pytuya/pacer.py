@@ -0,0 +1,104 @@
+"""Adaptive write pacing for Tuya connections."""
+
+import asyncio
+import time
+from collections import deque
+
+DEFAULT_RATE = 20.0  # Frames per second, same as the former fixed 50ms spacing.
+MIN_RATE = 2.0
+MAX_RATE = 100.0
+BURST = 4  # Frames that can be written back-to-back after an idle period.
+FAST_ACK = 0.25  # Replies faster than this (seconds) raise the rate.
+RATE_INCREASE = 2.0  # Frames per second added on every fast reply.
+RATE_DECREASE = 0.5  # Rate multiplier when a reply is lost.
+
+# Rates learned per (protocol version, product key), shared by all connections.
+_learned_rates: dict[tuple[float, str | None], float] = {}
+
+
+def learned_rate(version: float, product_key: str | None = None) -> float:
+    """Return the learned write rate for devices of this version and product."""
+    return _learned_rates.get((version, product_key), DEFAULT_RATE)
+
+
+class WritePacer:
+    """Token bucket limiting the writes of one connection.
+
+    Writers that have to wait are queued and released in order by a single
+    timer. The rate follows the device: it is raised additively when replies
+    come back quickly and halved when a reply times out.
+    """
+
+    def __init__(self, version: float, product_key: str | None = None, burst=BURST):
+        """Initialize the pacer with the rate learned for this kind of device."""
+        self.key = (version, product_key)
+        self.rate = learned_rate(version, product_key)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._timer: asyncio.TimerHandle | None = None
+
+    async def acquire(self):
+        """Wait until the next frame may be written."""
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+
+        future = asyncio.Future()
+        self._waiters.append(future)
+        self._schedule(future.get_loop())
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            elif not future.cancelled():
+                self._tokens += 1  # Released but not used, give the slot back.
+            raise
+
+    def close(self):
+        """Stop the release timer and fail the writers still waiting."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            if not (future := self._waiters.popleft()).done():
+                future.set_exception(ConnectionError("Connection closed"))
+
+    def on_ack(self, rtt: float):
+        """Update the rate with the round-trip time of a reply."""
+        if rtt <= FAST_ACK:
+            self._set_rate(self.rate + RATE_INCREASE)
+
+    def on_timeout(self):
+        """Back off, the device dropped a frame or its reply."""
+        self._set_rate(self.rate * RATE_DECREASE)
+
+    def _set_rate(self, rate: float):
+        self._refill()
+        self.rate = min(MAX_RATE, max(MIN_RATE, rate))
+        _learned_rates[self.key] = self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        tokens = self._tokens + (now - self._updated) * self.rate
+        self._tokens = min(float(self.burst), tokens)
+        self._updated = now
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is None and self._waiters:
+            delay = max(0.0, (1 - self._tokens) / self.rate)
+            self._timer = loop.call_later(delay, self._release, loop)
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        """Wake up the waiters the bucket has tokens for."""
+        self._timer = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            future = self._waiters.popleft()
+            if not future.done():
+                self._tokens -= 1
+                future.set_result(None)
+        self._schedule(loop)
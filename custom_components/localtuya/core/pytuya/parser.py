@@ -2,17 +2,25 @@
 
 import logging
 import struct
-import hmac
 import binascii
-from hashlib import md5, sha256
 from .const import Affix, MessagesFormat, TuyaHeader, TuyaMessage
-from .cipher import AESCipher
+from .cipher import CipherContext
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def pack_message(msg: TuyaMessage, hmac_key: bytes = None):
-    """Pack a TuyaMessage into bytes."""
+def pack_message(
+    msg: TuyaMessage, hmac_key: bytes = None, context: CipherContext = None
+):
+    """Pack a TuyaMessage into bytes.
+
+    If a context is given, its key is used and its primitives are reused.
+    """
+    if context is not None:
+        hmac_key = context.key
+    elif hmac_key:
+        context = CipherContext(hmac_key)
+
     if msg.prefix == Affix.prefix_55aa.value:
         header_fmt = MessagesFormat.HEADER_55AA
         end_fmt = MessagesFormat.END_HMAC if hmac_key else MessagesFormat.END_55AA
@@ -36,12 +44,11 @@ def pack_message(msg: TuyaMessage, hmac_key: bytes = None):
     data = struct.pack(header_fmt, *header_data)
 
     if msg.prefix == Affix.prefix_6699.value:
-        cipher = AESCipher(hmac_key)
         if type(msg.retcode) == int:
             raw = struct.pack(MessagesFormat.RETCODE, msg.retcode) + msg.payload
         else:
             raw = msg.payload
-        data2 = cipher.encrypt(
+        data2 = context.cipher.encrypt(
             raw,
             use_base64=False,
             pad=False,
@@ -52,7 +59,7 @@ def pack_message(msg: TuyaMessage, hmac_key: bytes = None):
     else:
         data += msg.payload
         if hmac_key:
-            crc = hmac.new(hmac_key, data, sha256).digest()
+            crc = context.hmac(data)
         else:
             crc = binascii.crc32(data) & 0xFFFFFFFF
         # Calculate CRC, add it together with suffix
@@ -62,9 +69,22 @@ def pack_message(msg: TuyaMessage, hmac_key: bytes = None):
 
 
 def unpack_message(
-    data: bytes, hmac_key=None, header=None, no_retcode=False, logger=_LOGGER
+    data: bytes,
+    hmac_key=None,
+    header=None,
+    no_retcode=False,
+    logger=_LOGGER,
+    context: CipherContext = None,
 ):
-    """Unpack bytes into a TuyaMessage."""
+    """Unpack bytes into a TuyaMessage.
+
+    If a context is given, its key is used and its primitives are reused.
+    """
+    if context is not None:
+        hmac_key = context.key
+    elif hmac_key:
+        context = CipherContext(hmac_key)
+
     if header is None:
         header = parse_header(data)
 
@@ -109,9 +129,7 @@ def unpack_message(
 
     if header.prefix == Affix.prefix_55aa.value:
         if hmac_key:
-            have_crc = hmac.new(
-                hmac_key, data[: (header_len + header.length) - end_len], sha256
-            ).digest()
+            have_crc = context.hmac(data[: (header_len + header.length) - end_len])
         else:
             have_crc = (
                 binascii.crc32(data[: (header_len + header.length) - end_len])
@@ -138,8 +156,7 @@ def unpack_message(
         iv = payload[:12]
         payload = payload[12:]
         try:
-            cipher = AESCipher(hmac_key)
-            payload = cipher.decrypt(
+            payload = context.cipher.decrypt(
                 payload,
                 use_base64=False,
                 decode_text=False,
@@ -178,7 +195,7 @@ def parse_header(data: bytes, logger=_LOGGER):
     elif data[:4] == Affix.prefix_55aa.bin:
         fmt = MessagesFormat.HEADER_55AA
     else:
-        err = f"Prefix Does not match! {prefix} known {set(p for p in Affix.prefixes)}"
+        err = f"Prefix Does not match! {bytes(data[:4])!r} known {[p.bin for p in Affix.prefixes]}"
         logger.error(err)
         raise DecodeError(err)
 
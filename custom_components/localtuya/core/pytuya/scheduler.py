@@ -0,0 +1,161 @@
+"""Timer wheel shared by the keep-alive of every Tuya connection."""
+
+import asyncio
+import logging
+import random
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+TICK = 0.5  # Seconds covered by one slot, the wheel wakes up at most once per tick.
+SLOTS = 64  # Due times further than SLOTS * TICK wait in their slot for more rounds.
+JITTER = 2.0  # Maximum random delay of the first run, spreads connect storms.
+
+# Callback returning the monotonic time of its next run, or None to stop.
+KeepAliveCallback = Callable[[], float | None]
+
+# Schedulers of the connections that were not given one, per event loop.
+_schedulers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def default_scheduler(loop: asyncio.AbstractEventLoop) -> "HeartbeatScheduler":
+    """Return the scheduler shared by the connections of loop."""
+    if (scheduler := _schedulers.get(loop)) is None:
+        scheduler = _schedulers[loop] = HeartbeatScheduler(loop)
+    return scheduler
+
+
+@dataclass
+class SchedulerStats:
+    """Counters of a HeartbeatScheduler."""
+
+    scheduled: int = 0  # Entries currently in the wheel.
+    wakeups: int = 0  # Ticks the wheel woke up for.
+    due: int = 0  # Callbacks run.
+    last_due: int = 0  # Callbacks run by the last wakeup.
+    lateness_total: float = 0.0  # Seconds between due times and runs, summed.
+    lateness_max: float = 0.0
+
+    @property
+    def lateness_mean(self) -> float:
+        """Return how late callbacks ran on average, in seconds."""
+        return self.lateness_total / self.due if self.due else 0.0
+
+
+class ScheduledEntry:
+    """Handle of a callback registered with a HeartbeatScheduler."""
+
+    __slots__ = ("callback", "due", "tick", "cancelled", "_scheduler")
+
+    def __init__(self, scheduler: "HeartbeatScheduler", callback: KeepAliveCallback):
+        """Initialize the handle, it is inserted by the scheduler."""
+        self.callback = callback
+        self.due = 0.0
+        self.tick = 0
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def cancel(self):
+        """Remove the callback from the wheel."""
+        if not self.cancelled:
+            self.cancelled = True
+            self._scheduler._remove(self)
+
+
+class HeartbeatScheduler:
+    """Timer wheel running keep-alive callbacks in batches.
+
+    Every entry sits in the slot of the tick it is due in. A single timer wakes the
+    wheel at the end of the next occupied tick and runs all the callbacks due by
+    then in one go, instead of one sleeping task and one wakeup per connection.
+    The first run of every entry is delayed by a random jitter, so connections
+    opened together do not all land in the same tick.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, tick=TICK, jitter=JITTER):
+        """Initialize an empty wheel."""
+        self.loop = loop
+        self.tick = tick
+        self.jitter = jitter
+        self.stats = SchedulerStats()
+        self._slots: list[set[ScheduledEntry]] = [set() for _ in range(SLOTS)]
+        self._cursor = int(time.monotonic() / tick)  # Next tick to run.
+        self._timer: asyncio.TimerHandle | None = None
+        self._timer_tick = 0
+        self._running = False  # The timer is armed once the run is over.
+
+    def schedule(self, callback: KeepAliveCallback, delay: float) -> ScheduledEntry:
+        """Run callback after delay plus jitter, then whenever it asks to."""
+        entry = ScheduledEntry(self, callback)
+        self.stats.scheduled += 1
+        self._insert(entry, time.monotonic() + delay + random.uniform(0, self.jitter))
+        return entry
+
+    def _insert(self, entry: ScheduledEntry, due: float):
+        entry.due = due
+        entry.tick = max(int(due / self.tick), self._cursor)
+        self._slots[entry.tick % SLOTS].add(entry)
+        if self._running:
+            return
+        if self._timer is None or entry.tick < self._timer_tick:
+            self._arm(entry.tick)
+
+    def _remove(self, entry: ScheduledEntry):
+        self._slots[entry.tick % SLOTS].discard(entry)
+        self.stats.scheduled -= 1
+
+    def _arm(self, tick: int):
+        """Wake up at the end of tick, entries due during it are then late."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_tick = tick
+        delay = (tick + 1) * self.tick - time.monotonic()
+        self._timer = self.loop.call_later(max(0.0, delay), self._run)
+
+    def _arm_next(self):
+        """Arm the timer for the next occupied slot, if any."""
+        for tick in range(self._cursor, self._cursor + SLOTS):
+            if self._slots[tick % SLOTS]:
+                return self._arm(tick)
+
+    def _run(self):
+        """Run every callback due until now."""
+        self._timer = None
+        now = time.monotonic()
+        current = int(now / self.tick)
+        due: list[ScheduledEntry] = []
+        # A blocked loop may have skipped ticks, but one round covers every slot.
+        for tick in range(max(self._cursor, current - SLOTS + 1), current + 1):
+            slot = self._slots[tick % SLOTS]
+            if ready := [entry for entry in slot if entry.tick <= current]:
+                slot.difference_update(ready)
+                due.extend(ready)
+        self._cursor = current + 1
+
+        stats = self.stats
+        stats.wakeups += 1
+        stats.last_due = len(due)
+        self._running = True
+        for entry in due:
+            lateness = max(0.0, now - entry.due)
+            stats.due += 1
+            stats.lateness_total += lateness
+            stats.lateness_max = max(stats.lateness_max, lateness)
+            try:
+                next_due = entry.callback()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Keep-alive callback failed")
+                next_due = None
+            if entry.cancelled:
+                continue
+            if next_due is None:
+                entry.cancel()
+            else:
+                self._insert(entry, next_due)
+        self._running = False
+
+        # Entries re-inserted far ahead may hide others due sooner: look at all.
+        self._arm_next()
@@ -0,0 +1,147 @@
+"""Reconnect of the devices that lost their connection."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from homeassistant.core import HomeAssistant, callback
+
+from ..const import DATA_RECONNECT, DOMAIN
+
+if TYPE_CHECKING:
+    from ..coordinator import TuyaDevice
+
+_LOGGER = logging.getLogger(__name__)
+
+BACKOFF_MIN = 5  # Seconds before the first attempt.
+BACKOFF_MAX = 300  # Seconds between attempts, at most.
+BACKOFF_FACTOR = 2
+JITTER = 0.2  # Delays are spread by this fraction, so devices drift apart.
+WAKE_INTERVAL = BACKOFF_MIN  # Seconds since the last attempt before a wakeup.
+
+
+@callback
+def async_get_reconnect_manager(hass: HomeAssistant) -> ReconnectManager:
+    """Return the reconnect manager of the integration."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if (manager := data.get(DATA_RECONNECT)) is None:
+        manager = data[DATA_RECONNECT] = ReconnectManager(hass)
+    return manager
+
+
+@dataclass
+class ReconnectStats:
+    """Counters of a ReconnectManager."""
+
+    pending: int = 0  # Devices waiting for a reconnect.
+    attempts: int = 0
+    reconnected: int = 0
+    wakeups: int = 0  # Attempts brought forward, the device was seen again.
+
+
+class _Retry:
+    """Reconnect state of one device."""
+
+    __slots__ = ("attempts", "last_attempt", "handle", "task")
+
+    def __init__(self):
+        self.attempts = 0
+        self.last_attempt = 0.0
+        self.handle: asyncio.TimerHandle | None = None
+        self.task: asyncio.Task | None = None
+
+
+class ReconnectManager:
+    """Reconnect devices with exponential backoff, early when they show up again.
+
+    A device waiting for its next attempt only costs a timer. The delay doubles
+    after every failed attempt, up to BACKOFF_MAX, and a device that broadcasts
+    again or whose gateway reports it online is tried right away.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the manager."""
+        self.hass = hass
+        self.stats = ReconnectStats()
+        self._retries: dict[TuyaDevice, _Retry] = {}
+
+    @callback
+    def schedule(self, device: TuyaDevice):
+        """Reconnect device, unless it is already waiting for it."""
+        if device.is_closing or device in self._retries:
+            return
+        self._retries[device] = retry = _Retry()
+        self.stats.pending = len(self._retries)
+        self._arm(device, retry, self._backoff(retry.attempts))
+
+    @callback
+    def discard(self, device: TuyaDevice):
+        """Stop reconnecting device, it is connected or closing."""
+        if (retry := self._retries.pop(device, None)) is None:
+            return
+        if retry.handle:
+            retry.handle.cancel()
+        self.stats.pending = len(self._retries)
+        if device.connected:
+            self.stats.reconnected += 1
+            if retry.attempts and not device.is_sleep:
+                device.info(f"Reconnect succeeded on attempt: {retry.attempts}")
+
+    @callback
+    def wake(self, device: TuyaDevice, force=False) -> bool:
+        """Attempt to reconnect device now, if it is waiting for it.
+
+        Wakeups closer than WAKE_INTERVAL to the last attempt are ignored, unless
+        forced: low-power devices are only awake for a few seconds.
+        """
+        if (retry := self._retries.get(device)) is None or retry.task:
+            return False
+        if not force and time.monotonic() - retry.last_attempt < WAKE_INTERVAL:
+            return False
+        self.stats.wakeups += 1
+        if retry.handle:
+            retry.handle.cancel()
+        self._attempt(device, retry)
+        return True
+
+    @staticmethod
+    def _backoff(attempts: int) -> float:
+        delay = min(BACKOFF_MAX, BACKOFF_MIN * BACKOFF_FACTOR ** min(attempts, 16))
+        return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def _arm(self, device: TuyaDevice, retry: _Retry, delay: float):
+        retry.handle = self.hass.loop.call_later(delay, self._attempt, device, retry)
+
+    def _attempt(self, device: TuyaDevice, retry: _Retry):
+        retry.handle = None
+        retry.last_attempt = time.monotonic()
+        retry.task = self.hass.async_create_background_task(
+            self._async_attempt(device, retry), f"localtuya-reconnect-{device.id}"
+        )
+
+    async def _async_attempt(self, device: TuyaDevice, retry: _Retry):
+        """Attempt once, then wait for the next attempt or stop."""
+        self.stats.attempts += 1
+        try:
+            connected = await device.async_reconnect()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Reconnect attempt of %s failed", device.id)
+            connected = False
+        finally:
+            retry.task = None
+
+        if self._retries.get(device) is not retry:
+            return  # Connected or closed meanwhile.
+        if device.is_closing or connected:
+            return self.discard(device)
+
+        if connected is None:
+            # Waiting for its gateway, which wakes it up: only check rarely.
+            return self._arm(device, retry, BACKOFF_MAX)
+        retry.attempts += 1
+        self._arm(device, retry, self._backoff(retry.attempts))
@@ -0,0 +1,155 @@
+"""Scheduler of the device connections made while setting up the entries."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+
+if TYPE_CHECKING:
+    from ..coordinator import TuyaDevice
+
+_LOGGER = logging.getLogger(__name__)
+
+CONCURRENCY_MAX = 16  # Devices connecting at the same time, at most.
+CONCURRENCY_MIN = 1
+CONCURRENCY_START = 4  # Raised while connects stay fast, lowered when they slow down.
+TARGET_LATENCY = 1.0  # Seconds, a LAN connect with handshake and status takes less.
+LATENCY_SMOOTHING = 0.3  # Weight of the last connect in the latency average.
+
+
+@dataclass
+class StartupStats:
+    """Metrics of the last batch, the devices queued until the scheduler is idle."""
+
+    queued: int = 0  # Devices queued in this batch.
+    connected: int = 0  # Devices of the batch connected by their first attempt.
+    failed: int = 0
+    in_flight: int = 0
+    limit: int = CONCURRENCY_START  # Current concurrency limit.
+    peak_in_flight: int = 0
+    latency_mean: float = 0.0  # Smoothed seconds of one connect.
+    latency_max: float = 0.0
+    first_online_s: float | None = None  # Seconds from the batch start.
+    all_online_s: float | None = None  # Set once every queued device is connected,
+    # on a retry or by the reconnect manager too.
+    settled_s: float | None = None  # Seconds until every connect attempt ended.
+
+
+class StartupScheduler:
+    """Connect the devices of the entries in priority order, a few at a time.
+
+    Devices are queued with TuyaDevice.startup_priority, gateways first. The number
+    of connects in flight follows their latency: it grows by one while connects are
+    faster than TARGET_LATENCY and shrinks by one when they get twice as slow, so a
+    congested network or access point is not flooded after a restart.
+    """
+
+    def __init__(self, hass: HomeAssistant, concurrency_max=CONCURRENCY_MAX):
+        """Initialize an idle scheduler."""
+        self.hass = hass
+        self.concurrency_max = concurrency_max
+        self.stats = StartupStats()
+        self._queue: list[tuple[int, int, ConfigEntry, TuyaDevice]] = []
+        self._order = itertools.count()
+        self._offline: set[TuyaDevice] = set()  # Devices of the batch not connected.
+        self._started = 0.0
+        self._pump_scheduled = False
+
+    @callback
+    def async_add(self, entry: ConfigEntry, device: TuyaDevice):
+        """Queue a device, it is connected by a task of entry."""
+        if not self._queue and not self.stats.in_flight:
+            # Idle, this device starts a new batch.
+            self.stats = StartupStats()
+            self._offline.clear()
+            self._started = time.monotonic()
+        self.stats.queued += 1
+        self._offline.add(device)
+        item = (device.startup_priority, next(self._order), entry, device)
+        heapq.heappush(self._queue, item)
+        if not self._pump_scheduled:
+            # Let the rest of the entry queue its devices before sorting them out.
+            self._pump_scheduled = True
+            self.hass.loop.call_soon(self._pump)
+
+    def _pump(self):
+        """Start connects until the limit is reached."""
+        self._pump_scheduled = False
+        stats = self.stats
+        while self._queue and stats.in_flight < stats.limit:
+            _, _, entry, device = heapq.heappop(self._queue)
+            if device.is_closing:
+                stats.queued -= 1
+                self._offline.discard(device)
+                continue
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            entry.async_create_task(self.hass, self._connect(device))
+        self._check_settled()
+
+    async def _connect(self, device: TuyaDevice):
+        """Connect device and adapt the limit to how long it took."""
+        start = time.monotonic()
+        stats = self.stats
+        try:
+            await device.async_connect()
+            if task := device._task_connect:
+                # Low-power devices connect in the background, wait for them too.
+                await asyncio.wait([task])
+        finally:
+            latency = time.monotonic() - start
+            stats.in_flight -= 1
+            if device.connected:
+                stats.connected += 1
+                self.async_connected(device)
+            else:
+                stats.failed += 1
+            self._adapt(stats, latency)
+            self._pump()
+
+    @callback
+    def async_connected(self, device: TuyaDevice):
+        """Record that device is connected, however it got there."""
+        if device not in self._offline:
+            return
+        self._offline.discard(device)
+        stats = self.stats
+        online_s = time.monotonic() - self._started
+        if stats.first_online_s is None:
+            stats.first_online_s = online_s
+        if not self._offline:
+            stats.all_online_s = online_s
+
+    def _adapt(self, stats: StartupStats, latency: float):
+        """Update the latency average and the concurrency limit."""
+        if stats.connected + stats.failed == 1:
+            stats.latency_mean = latency
+        else:
+            stats.latency_mean += LATENCY_SMOOTHING * (latency - stats.latency_mean)
+        stats.latency_max = max(stats.latency_max, latency)
+        if stats.latency_mean < TARGET_LATENCY:
+            stats.limit = min(self.concurrency_max, stats.limit + 1)
+        elif stats.latency_mean > 2 * TARGET_LATENCY:
+            stats.limit = max(CONCURRENCY_MIN, stats.limit - 1)
+
+    def _check_settled(self):
+        stats = self.stats
+        if self._queue or stats.in_flight or stats.settled_s is not None:
+            return
+        stats.settled_s = time.monotonic() - self._started
+        _LOGGER.info(
+            "Startup: %s of %s devices connected in %.1fs (limit %s, latency %.2fs)",
+            stats.connected,
+            stats.queued,
+            stats.settled_s,
+            stats.limit,
+            stats.latency_mean,
+        )
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import copy
 import logging
+from dataclasses import asdict
 from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
@@ -12,7 +13,16 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.device_registry import DeviceEntry
 
 from . import HassLocalTuyaData
-from .const import CONF_LOCAL_KEY, CONF_USER_ID, DOMAIN, CONF_NO_CLOUD, DATA_DISCOVERY
+from .const import (
+    CONF_LOCAL_KEY,
+    CONF_USER_ID,
+    DOMAIN,
+    CONF_NO_CLOUD,
+    DATA_DISCOVERY,
+    DATA_HEARTBEATS,
+    DATA_RECONNECT,
+    DATA_STARTUP,
+)
 
 CLOUD_DEVICES = "cloud_devices"
 DEVICE_CONFIG = "device_config"
@@ -48,6 +58,15 @@ async def async_get_config_entry_diagnostics(
                 data[CLOUD_DEVICES][dev_id][obf] = obfuscate(ob, obf_len, obf_len)
     if discovery := hass.data[DOMAIN].get(DATA_DISCOVERY):
         data["Discovered_Devices"] = discovery.devices
+    if heartbeats := hass.data[DOMAIN].get(DATA_HEARTBEATS):
+        data["Heartbeat_Scheduler"] = {
+            **asdict(heartbeats.stats),
+            "lateness_mean": heartbeats.stats.lateness_mean,
+        }
+    if startup := hass.data[DOMAIN].get(DATA_STARTUP):
+        data["Startup_Scheduler"] = asdict(startup.stats)
+    if reconnect := hass.data[DOMAIN].get(DATA_RECONNECT):
+        data["Reconnect_Manager"] = asdict(reconnect.stats)
     return data
 
 
@@ -78,6 +97,12 @@ async def async_get_device_diagnostics(
     # data["log"] = hass.data[DOMAIN][CONF_DEVICES][dev_id].logger.retrieve_log()
     if discovery := hass.data[DOMAIN].get(DATA_DISCOVERY):
         data["Discovered_Devices"] = discovery.devices.get(dev_id)
+    for tuya_device in hass_localtuya.devices.values():
+        if tuya_device.id == dev_id and tuya_device.wake_stats.wakes:
+            data["Wake_Stats"] = {
+                **asdict(tuya_device.wake_stats),
+                "missed_rate": tuya_device.wake_stats.missed_rate,
+            }
     return data
 
 
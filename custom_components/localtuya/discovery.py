@@ -8,15 +8,17 @@ Maintained by @xZetsubou
 
 import os
 import asyncio
-import json
 import logging
+from bisect import bisect_left, insort
+from functools import lru_cache
 from hashlib import md5
 from socket import inet_aton
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-from .core.pytuya import parser
+from .core.pytuya import codec, parser
+from .core.pytuya.cipher import CipherContext
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -27,15 +29,23 @@ PREFIX_6699_BIN = b"\x00\x00\x66\x99"
 UDP_COMMAND = b"\x00\x00\x00\x00"
 
 DEFAULT_TIMEOUT = 6.0
+# Devices broadcast the same datagram every few seconds, each is decoded once.
+SEEN_CACHE_SIZE = 2048  # Distinct datagrams remembered.
+
+_UDP_CONTEXT = CipherContext(UDP_KEY)
+
+
+@lru_cache(maxsize=8)
+def _ecb_cipher(key: bytes) -> Cipher:
+    return Cipher(algorithms.AES(key), modes.ECB(), default_backend())
 
 
 def decrypt(msg, key):
     def _unpad(data):
         return data[: -ord(data[len(data) - 1 :])]
 
-    cipher = Cipher(algorithms.AES(key), modes.ECB(), default_backend())
-    decryptor = cipher.decryptor()
-    return _unpad(decryptor.update(msg) + decryptor.finalize()).decode()
+    decryptor = _ecb_cipher(key).decryptor()
+    return _unpad(decryptor.update(msg) + decryptor.finalize())
 
 
 def decrypt_udp(message):
@@ -46,12 +56,9 @@ def decrypt_udp(message):
             return payload
         return decrypt(payload, UDP_KEY)
     if message[:4] == PREFIX_6699_BIN:
-        unpacked = parser.unpack_message(message, hmac_key=UDP_KEY, no_retcode=None)
-        payload = unpacked.payload.decode()
+        unpacked = parser.unpack_message(message, no_retcode=None, context=_UDP_CONTEXT)
         # app sometimes has extra bytes at the end
-        while payload[-1] == chr(0):
-            payload = payload[:-1]
-        return payload
+        return unpacked.payload.rstrip(b"\x00")
     return decrypt(message, UDP_KEY)
 
 
@@ -60,10 +67,20 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
 
     def __init__(self, callback=None):
         """Initialize a new BaseDiscovery."""
-        self.devices = {}
+        self._devices: dict[str, dict] = {}
+        self._ip_order: list[tuple[bytes, str]] = []  # (packed IP, gwId), sorted.
+        self._ordered: dict[str, dict] | None = None
+        self._seen: dict[bytes, dict | None] = {}  # Datagram -> decoded device.
         self._listeners = []
         self._callback = callback
 
+    @property
+    def devices(self) -> dict[str, dict]:
+        """Return the discovered devices by gwId, ordered by IP."""
+        if self._ordered is None:
+            self._ordered = {gwid: self._devices[gwid] for _, gwid in self._ip_order}
+        return self._ordered
+
     async def start(self):
         """Start discovery by listening to broadcasts."""
         loop = asyncio.get_running_loop()
@@ -88,14 +105,21 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
 
     def datagram_received(self, data, addr):
         """Handle received broadcast message."""
+        datagram = data
+        if (decoded := self._seen.get(datagram, False)) is None:
+            return  # A repeat of a broadcast that could not be decoded.
         try:
-            try:
-                data = decrypt_udp(data)
-            except Exception as ex:  # pylint: disable=broad-except
-                data = data.decode()
-            decoded = json.loads(data)
+            if decoded is False:
+                if len(self._seen) >= SEEN_CACHE_SIZE:
+                    self._seen.clear()
+                self._seen[datagram] = None
+                try:
+                    data = decrypt_udp(data)
+                except Exception:  # pylint: disable=broad-except
+                    pass  # Not encrypted, decode it as is.
+                decoded = self._seen[datagram] = codec.loads(data)
             self.device_found(decoded)
-        except (json.JSONDecodeError, Exception) as ex:
+        except (codec.JSONDecodeError, Exception) as ex:
             # _LOGGER.debug("Bordcast from app from ip: %s", addr[0])
             _LOGGER.debug(
                 "Failed to decode broadcast from %r: %r [%s]", addr[0], data, ex
@@ -104,17 +128,16 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
     def device_found(self, device):
         """Discover a new device."""
         gwid, ip = device.get("gwId"), device.get("ip")
-        # If device found but the ip changed.
-        if gwid in self.devices and (self.devices[gwid].get("ip") != ip):
-            self.devices.pop(gwid)
-
-        if gwid not in self.devices:
-            self.devices[gwid] = device
-            # Sort devices by ip.
-            sort_devices = sorted(
-                self.devices.items(), key=lambda i: inet_aton(i[1].get("ip", "0"))
-            )
-            self.devices = dict(sort_devices)
+        known = self._devices.get(gwid)
+        # New device, or the ip changed.
+        if known is None or known.get("ip") != ip:
+            order = (inet_aton(ip or "0"), gwid)
+            if known is not None:
+                old_order = (inet_aton(known.get("ip") or "0"), gwid)
+                del self._ip_order[bisect_left(self._ip_order, old_order)]
+            insort(self._ip_order, order)
+            self._devices[gwid] = device
+            self._ordered = None
 
             _LOGGER.debug("Discovered device: %s", device)
         if self._callback:
@@ -1,9 +1,10 @@
 """Code shared between all platforms."""
 
 import logging
+import time
 from typing import Any, Coroutine, Callable
 
-from homeassistant.core import HomeAssistant, State
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, State, callback
 from homeassistant.config_entries import ConfigEntry
 
 from homeassistant.const import (
@@ -22,13 +23,11 @@ from homeassistant.const import (
     ATTR_VIA_DEVICE,
 )
 from homeassistant.helpers.device_registry import DeviceInfo
-from homeassistant.helpers.dispatcher import (
-    async_dispatcher_connect,
-    async_dispatcher_send,
-)
+from homeassistant.helpers.event import async_call_later
 
 from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.selector import SelectSelector
 
 from .core import pytuya
 from .coordinator import HassLocalTuyaData, TuyaDevice
@@ -36,6 +35,7 @@ from .const import (
     ATTR_STATE,
     CONF_DEFAULT_VALUE,
     CONF_ID,
+    CONF_MIN_UPDATE_INTERVAL,
     CONF_NODE_ID,
     CONF_PASSIVE_ENTITY,
     CONF_RESTORE_ON_RECONNECT,
@@ -47,6 +47,9 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
+# Seconds before a change too small to be written on its own is written anyway.
+INSIGNIFICANT_WRITE_DELAY = 60
+
 
 async def async_setup_entry(
     domain: str,
@@ -87,9 +90,12 @@ async def async_setup_entry(
 
             for entity_config in entities_to_setup:
                 # Add DPS used by this platform to the request list
+                dps = set()
                 for dp_conf in dps_config_fields:
                     if dp_conf in entity_config:
                         device.dps_to_request[entity_config[dp_conf]] = None
+                        if entity_config[dp_conf] is not None:
+                            dps.add(str(entity_config[dp_conf]))
 
                 entities.append(
                     entity_class(
@@ -98,6 +104,7 @@ async def async_setup_entry(
                         entity_config[CONF_ID],
                         # we need add_entites_callback in-case we want to add sub-entites, such as electric sensor "phase_a"
                         add_entites_callback=async_add_entities,
+                        dps=dps,
                     )
                 )
     # Once the entities have been created, add to the TuyaDevice instance
@@ -111,8 +118,13 @@ async def async_setup_entry(
 
 def get_dps_for_platform(flow_schema):
     """Return config keys for all platform keys that depends on a datapoint."""
-    for key, value in flow_schema(None).items():
-        if hasattr(value, "container") and value.container is None:
+    # DP fields are the selectors listing the DPs given to flow_schema.
+    marker = f"{DOMAIN}_dp"
+    for key, value in flow_schema([marker]).items():
+        if isinstance(value, SelectSelector) and any(
+            option == marker or isinstance(option, dict) and option["value"] == marker
+            for option in value.config["options"]
+        ):
             yield key.schema
 
 
@@ -148,8 +160,19 @@ class LocalTuyaEntity(RestoreEntity, pytuya.ContextualLogger):
         self.componet_add_entities: AddEntitiesCallback = kwargs.get(
             "add_entites_callback"
         )
+        # DPs the entity reads, it is only sent their updates. None for any DP.
+        self._dps: set[str] | None = None
+        if (dps := kwargs.get("dps")) is not None:
+            self._dps = {*dps, str(dp_id)}
         self._loaded = False
 
+        # State writes of chatty DPs are coalesced, see async_write_status.
+        self._min_update_interval = self._config.get(CONF_MIN_UPDATE_INTERVAL) or 0
+        self._last_write = 0.0
+        self._written_state = None  # State of the last write, None if unavailable.
+        self._unsub_flush: CALLBACK_TYPE | None = None
+        self._flush_at = 0.0  # Monotonic time of the pending write.
+
         # Default value is available to be provided by Platform entities if required
         self._default_value = self._config.get(CONF_DEFAULT_VALUE)
 
@@ -170,30 +193,81 @@ class LocalTuyaEntity(RestoreEntity, pytuya.ContextualLogger):
             self._stored_states = stored_data
             self.status_restored(stored_data)
 
+        @callback
         def _update_handler(status: dict | None):
-            """Update entity state when status was updated."""
-            last_status = self._status.copy()
-
-            self._status = {} if status is None else {**self._status, **status}
+            """Update entity state when status, or a part of it, was updated."""
+            last_status = self._status
+            if status is None:
+                changed, self._status = bool(last_status), {}
+            else:
+                changed = any(
+                    dp not in last_status or last_status[dp] != value
+                    for dp, value in status.items()
+                )
+                last_status.update(status)
 
             if not self._loaded:
                 self._loaded = True
                 self.connection_made()
 
-            if status != last_status:
+            if changed:
                 if status:
                     self.status_updated()
+                    self.async_write_status()
+                else:
+                    # Unavailable right away, whatever the update interval.
+                    self._cancel_flush()
+                    self._written_state = None
+                    self.async_write_ha_state()
+
+        self.async_on_remove(self._device.async_route(_update_handler, self._dps))
+        self.async_on_remove(self._cancel_flush)
+
+    @callback
+    def async_write_status(self) -> None:
+        """Write the state updated by the device, coalescing chatty DPs.
+
+        Within min_update_interval of the last write, the state is written once
+        at the end of the interval instead, with the last value received. Changes
+        that are not significant are written INSIGNIFICANT_WRITE_DELAY later, or
+        with the next significant one, so the last value is never lost.
+        """
+        now = time.monotonic()
+        if self.significant_update():
+            flush_at = self._last_write + self._min_update_interval
+        else:
+            delay = max(self._min_update_interval, INSIGNIFICANT_WRITE_DELAY)
+            flush_at = now + delay
+        if self._unsub_flush is not None:
+            if flush_at >= self._flush_at:
+                return  # The pending write takes the last value too.
+            self._cancel_flush()
+        if flush_at <= now:
+            return self._async_flush()
+        self._flush_at = flush_at
+        self._unsub_flush = async_call_later(
+            self.hass, flush_at - now, self._async_flush
+        )
 
-                self.schedule_update_ha_state()
+    @callback
+    def _async_flush(self, _now=None) -> None:
+        self._unsub_flush = None
+        self._last_write = time.monotonic()
+        self._written_state = self._state
+        self.async_write_ha_state()
 
-        signal = f"localtuya_{self._device_config.id}"
+    def _cancel_flush(self):
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
 
-        self.async_on_remove(
-            async_dispatcher_connect(self.hass, signal, _update_handler)
-        )
+    def significant_update(self) -> bool:
+        """Return if the state changed enough since the last write to write it.
 
-        signal = f"localtuya_entity_{self._device_config.id}"
-        async_dispatcher_send(self.hass, signal, self.entity_id)
+        Override in subclasses to delay small changes, self._written_state holds
+        the state of the last write.
+        """
+        return True
 
     @property
     def extra_state_attributes(self):
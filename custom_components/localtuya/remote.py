@@ -137,6 +137,8 @@ class LocalTuyaRemote(LocalTuyaEntity, RemoteEntity):
         self._dp_send = str(self._config.get(self._dp_id, RemoteDP.DP_SEND))
         self._dp_recieve = str(self._config.get(CONF_RECEIVE_DP, RemoteDP.DP_RECIEVE))
         self._dp_key_study = self._config.get(CONF_KEY_STUDY_DP)
+        if self._dps is not None:
+            self._dps.add(self._dp_recieve)
 
         self._device_id = self._device_config.id
         self._lock = asyncio.Lock()
@@ -26,7 +26,12 @@ from homeassistant.const import (
 from homeassistant.helpers import entity_registry as er
 
 from .entity import LocalTuyaEntity, async_setup_entry
-from .const import CONF_SCALING, CONF_STATE_CLASS
+from .const import (
+    CONF_DEADBAND,
+    CONF_DEADBAND_PERCENT,
+    CONF_SCALING,
+    CONF_STATE_CLASS,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -53,6 +58,10 @@ def flow_schema(dps):
         vol.Optional(CONF_SCALING): vol.All(
             vol.Coerce(float), vol.Range(min=-1000000.0, max=1000000.0)
         ),
+        vol.Optional(CONF_DEADBAND): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_DEADBAND_PERCENT): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=100)
+        ),
     }
 
 
@@ -72,6 +81,8 @@ class LocalTuyaSensor(LocalTuyaEntity, SensorEntity):
 
         self._has_sub_entities = False
         self._attr_device_class = self._config.get(CONF_DEVICE_CLASS)
+        self._deadband = self._config.get(CONF_DEADBAND) or 0
+        self._deadband_percent = self._config.get(CONF_DEADBAND_PERCENT) or 0
 
     @property
     def native_value(self):
@@ -111,6 +122,18 @@ class LocalTuyaSensor(LocalTuyaEntity, SensorEntity):
         else:
             self._state = self.scale(state)
 
+    def significant_update(self) -> bool:
+        """Return if the value moved out of the deadband of the last write."""
+        old, new = self._written_state, self._state
+        if not (self._deadband or self._deadband_percent) or not all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in (old, new)
+        ):
+            return True
+        delta = abs(new - old)
+        return delta > self._deadband and delta > self._deadband_percent / 100 * abs(
+            old
+        )
+
     def status_restored(self, stored_state) -> None:
         super().status_restored(stored_state)
 
@@ -145,7 +168,7 @@ class LocalTuyaSensor(LocalTuyaEntity, SensorEntity):
 
         for sensor in (ATTR_CURRENT, ATTR_POWER, ATTR_VOLTAGE):
             sub_entity = LocalTuyaSensor(
-                self._device, self._device_config.as_dict(), self._dp_id
+                self._device, self._device_config.as_dict(), self._dp_id, dps=self._dps
             )
             setattr(sub_entity, "_attr_sub_sensor", sensor)
             setattr(sub_entity, "_attr_unique_id", f"{self.unique_id}_{sensor}")
@@ -28,7 +28,9 @@ DEVICE_CONFIG = {
 }
 
 
-async def init(config: dict[str, dict[str, Any]], entity_domain, entity_class):
+async def init(
+    config: dict[str, dict[str, Any]], entity_domain, entity_class, flow_schema=None
+):
     add_entities = AsyncMock()
 
     asyncio.create_task = lambda _: None
@@ -53,7 +55,7 @@ async def init(config: dict[str, dict[str, Any]], entity_domain, entity_class):
     await entity.async_setup_entry(
         entity_domain,
         entity_class,
-        lambda _: {},
+        flow_schema or (lambda _: {}),
         hass=hass,
         config_entry=entry,
         async_add_entities=add_entities,
@@ -0,0 +1,94 @@
+"""Test for localtuya."""
+
+from . import *
+from custom_components.localtuya import config_flow
+from custom_components.localtuya.const import DATA_CAPABILITIES
+from custom_components.localtuya.core.capabilities import CapabilityStore
+from custom_components.localtuya.switch import LocalTuyaSwitch, DOMAIN as SWITCH_DOMAIN
+from .test_pytuya import create_protocol
+from .test_switch import CONFIG as SWITCH_CONFIG
+
+
+async def test_capability_store_device_and_product():
+    store = CapabilityStore(HomeAssistant(""))
+    store._store = Mock(async_load=AsyncMock(return_value=None))
+    await store.async_load()
+
+    device_id = DEVICE_CONFIG["device_id"]
+    assert store.get(device_id).dev_type is None
+
+    store.update(
+        device_id, "pkey", protocol_version="3.3", dev_type="type_0d", dps=["1", "2"]
+    )
+    store._store.async_delay_save.assert_called_once()
+    assert store.get(device_id).dps == ["1", "2"]
+
+    # A new device of the same product only inherits the shared capabilities.
+    sibling = store.get("another_device", "pkey")
+    assert (sibling.protocol_version, sibling.dev_type, sibling.dps) == (
+        "3.3",
+        "type_0d",
+        [],
+    )
+
+    store.update(device_id, "pkey", dev_type="type_0d", reset_dpids=None)
+    store._store.async_delay_save.assert_called_once()
+
+    saved = store._data_to_save()
+    store._store.async_load.return_value = saved
+    reloaded = CapabilityStore(HomeAssistant(""))
+    reloaded._store = store._store
+    await reloaded.async_load()
+    assert reloaded.get(device_id) == store.get(device_id)
+
+
+async def test_seeded_capabilities_skip_dp_probes(monkeypatch):
+    store = CapabilityStore(HomeAssistant(""))
+    store._store = Mock()
+    dps = {"1": True, "2": False, "18": 0}
+    store.update(
+        DEVICE_CONFIG["device_id"],
+        protocol_version="3.3",
+        dev_type="type_0d",
+        reset_dpids=[18],
+        dps=sorted(dps),
+    )
+
+    queries = []
+
+    def create_interface():
+        interface = create_protocol(3.3)
+
+        async def exchange(command, dps=None, nodeID=None):
+            queries.append(set(interface.dps_to_request))
+            return {"dps": {**dps_reported}}
+
+        interface.exchange, interface.close = exchange, AsyncMock()
+        return interface
+
+    # Validating the device asks for the known DPs once, no range is probed.
+    dps_reported = dps
+    connect = AsyncMock(side_effect=lambda *args, **kwargs: create_interface())
+    monkeypatch.setattr(config_flow.pytuya, "connect", connect)
+    runtime = Mock(devices={}, cloud_data=Mock(device_list={}))
+    data = {**DEVICE_CONFIG, "enable_debug": False}
+    result = await config_flow.validate_input(runtime, data, store)
+    assert result["protocol_version"] == "3.3"
+    assert queries == [set(dps)]
+
+    # A restart queries every known DP and resets the known reset DPs.
+    device = await init(SWITCH_CONFIG, SWITCH_DOMAIN, LocalTuyaSwitch)
+    device.hass.data[DOMAIN][DATA_CAPABILITIES] = store
+    device._interface = interface = create_interface()
+    device._seed_capabilities()
+    assert interface.dev_type == "type_0d"
+    assert device._default_reset_dpids == [18]
+    queries.clear()
+    assert await interface.status() == dps
+    assert queries == [set(dps)]
+
+    # A device that does not report them all anymore is probed again.
+    queries.clear()
+    dps_reported = {"1": True}
+    await config_flow.validate_input(runtime, data, store)
+    assert len(queries) == 5
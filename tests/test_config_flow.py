@@ -0,0 +1,155 @@
+"""Test for localtuya."""
+
+import time
+
+from . import *
+from custom_components.localtuya import config_flow
+from custom_components.localtuya.core.capabilities import DeviceCapabilities
+
+
+async def test_detect_protocol_signals(monkeypatch):
+    monkeypatch.setattr(config_flow, "PROTOCOL_RACE_STAGGER", 0.01)
+    attempts, cancelled = [], []
+
+    async def attempt_protocol(data, version, caps, logger):
+        attempts.append(version)
+        try:
+            await asyncio.sleep(0.02 if version == "3.4" else 0.2)
+        except asyncio.CancelledError:
+            cancelled.append(version)
+            raise
+        return (Mock(), {"1": True}) if version == "3.4" else (None, {})
+
+    monkeypatch.setattr(config_flow, "attempt_protocol", attempt_protocol)
+    logger = Mock()
+
+    result = await config_flow.detect_protocol({}, DeviceCapabilities(), "3.4", logger)
+    assert result[2:] == ("3.4", "discovery")
+    assert attempts == ["3.4"]
+
+    attempts.clear()
+    caps = DeviceCapabilities(protocol_version="3.4")
+    result = await config_flow.detect_protocol({}, caps, None, logger)
+    assert result[2:] == ("3.4", "history")
+
+    attempts.clear()
+    start = time.monotonic()
+    result = await config_flow.detect_protocol({}, DeviceCapabilities(), None, logger)
+    assert result[1:] == ({"1": True}, "3.4", "race")
+    # Two versions at a time: 3.3 and 3.1 lose, then 3.4 wins while 3.2 runs.
+    assert attempts[:4] == ["3.3", "3.1", "3.2", "3.4"]
+    assert "3.2" in cancelled and "3.3" not in cancelled
+    assert time.monotonic() - start < 0.4
+
+
+
+async def test_mass_configure_pipeline(monkeypatch):
+    monkeypatch.setattr(config_flow, "MASS_CONFIGURE_RETRY_DELAY", 0)
+    events, running, probes = [], [], {}
+
+    async def validate_input(localtuya_data, data, capabilities=None):
+        dev_id = data["device_id"]
+        probes[dev_id] = probes.get(dev_id, 0) + 1
+        running.append(dev_id)
+        events.append(("probe", dev_id, len(running)))
+        try:
+            await asyncio.sleep(0.01)
+            if dev_id == "busy" and probes[dev_id] == 1:
+                raise TimeoutError
+            if dev_id == "wrong_key":
+                raise config_flow.InvalidAuth
+            return {"dps_strings": ["1 ( value: True )"], "protocol_version": "3.3"}
+        finally:
+            running.remove(dev_id)
+
+    def gen_localtuya_entities(dev_data, category):
+        events.append(("entities", dev_data["device_id"]))
+        return [{"id": "1", "platform": "switch"}]
+
+    monkeypatch.setattr(config_flow, "validate_input", validate_input)
+    monkeypatch.setattr(config_flow, "gen_localtuya_entities", gen_localtuya_entities)
+
+    hass = Mock(data={DOMAIN: {}})
+    hass.config_entries.async_entries.return_value = []
+    dev_ids = ["busy", "wrong_key", "dev_1", "dev_2", "dev_3"]
+    discovered = {dev_id: {"ip": HOST, "version": "3.3"} for dev_id in dev_ids}
+    cloud = {dev_id: {"name": dev_id, "category": "kg"} for dev_id in dev_ids}
+    updates = []
+    progress = config_flow.MassConfigureProgress(
+        listener=lambda p: updates.append((p.done, p.probing))
+    )
+
+    devices, fails = await config_flow.setup_localtuya_devices(
+        hass, Mock(), discovered, cloud, concurrency=2, progress=progress
+    )
+
+    assert list(devices) == ["busy", "dev_1", "dev_2", "dev_3"]
+    assert list(fails) == ["wrong_key"]
+    assert probes == {"busy": 2, "wrong_key": 1, "dev_1": 1, "dev_2": 1, "dev_3": 1}
+    assert max(event[2] for event in events if event[0] == "probe") == 2
+    # Entities of the first devices are generated before the last ones are probed.
+    probe_dev_3 = next(i for i, e in enumerate(events) if e[:2] == ("probe", "dev_3"))
+    assert events.index(("entities", "dev_1")) < probe_dev_3
+    assert (progress.total, progress.done, progress.failed) == (5, 5, 1)
+    assert progress.retries == 1 and progress.finished and updates[-1] == (5, 0)
+
+
+async def test_race_retries_timed_out_versions(monkeypatch):
+    monkeypatch.setattr(config_flow, "PROTOCOL_RACE_STAGGER", 0)
+    attempts, sessions = [], []
+
+    async def attempt_protocol(data, version, caps, logger):
+        # The device answers a single session, the others time out.
+        attempts.append(version)
+        sessions.append(version)
+        try:
+            await asyncio.sleep(0.01)
+            if len(sessions) > 1 or version != "3.3":
+                raise TimeoutError
+            return Mock(), {"1": True}
+        finally:
+            sessions.remove(version)
+
+    monkeypatch.setattr(config_flow, "attempt_protocol", attempt_protocol)
+    caps = DeviceCapabilities()
+
+    result = await config_flow.race_protocols({}, ["3.3", "3.1"], caps, Mock())
+    assert result[1:] == ({"1": True}, "3.3")
+    assert attempts == ["3.3", "3.1", "3.3"]
+
+
+async def test_race_gives_up_within_sequential_time(monkeypatch):
+    monkeypatch.setattr(config_flow, "PROTOCOL_RACE_STAGGER", 0)
+    monkeypatch.setattr(config_flow, "PROTOCOL_DETECT_TIMEOUT", 0.05)
+    attempts = []
+
+    async def attempt_protocol(data, version, caps, logger):
+        # Wrong key or offline device: no version ever answers.
+        attempts.append(version)
+        await asyncio.sleep(0.05)
+        raise TimeoutError
+
+    monkeypatch.setattr(config_flow, "attempt_protocol", attempt_protocol)
+    versions = ["3.3", "3.1", "3.2", "3.4", "3.5"]
+
+    start = time.monotonic()
+    result = await config_flow.race_protocols({}, versions, DeviceCapabilities(), Mock())
+    assert result == (None, {}, None)
+    # No slower than trying every version once, one after the other.
+    assert time.monotonic() - start < len(versions) * 0.05 + 0.05
+    assert len(versions) < len(attempts) < 2 * len(versions)
+
+
+async def test_mass_configure_progress_updates():
+    changed = config_flow.LocalTuyaOptionsFlowHandler._mass_configure_changed
+    flow = Mock(spec=["async_update_progress"])
+    progress = config_flow.MassConfigureProgress(listener=lambda p: changed(flow, p))
+    progress.changed()  # Nothing to report before the devices are counted.
+    progress.total = 4
+    for progress.done in range(1, 5):
+        progress.changed()
+    fractions = [call.args[0] for call in flow.async_update_progress.call_args_list]
+    assert fractions == [0.25, 0.5, 0.75, 1.0]
+
+    # Home Assistant versions without progress updates are left alone.
+    changed(Mock(spec=[]), progress)
@@ -1,6 +1,8 @@
 """Test for localtuya."""
 
 from . import *
+from socket import inet_aton
+
 from custom_components.localtuya.discovery import TuyaDiscovery
 
 
@@ -19,3 +21,54 @@ async def test_dsicovery():
 
     mock_callback.assert_called()
     assert len(discovery.devices) == 3
+
+
+async def test_device_index():
+    from custom_components.localtuya import DeviceIndex
+
+    devices = {
+        "gateway": {"host": "10.0.0.2"},
+        "sub_1": {"host": "10.0.0.2", "node_id": "a1", "gateway_id": "gateway"},
+        "sub_2": {"host": "10.0.0.2", "node_id": "a2", "gateway_id": "gateway"},
+        "plug": {"host": "10.0.0.3"},
+    }
+    other = {"sub_3": {"host": "10.0.0.2", "node_id": "a3", "gateway_id": "gateway"}}
+    entries = [Mock(data={"devices": devices}), Mock(data={"devices": other})]
+    hass = Mock()
+    hass.config_entries.async_entries.return_value = entries
+    index = DeviceIndex(hass)
+
+    gateway = index.get("gateway")
+    assert [indexed.entry for indexed in gateway] == entries
+    assert list(gateway[0].hosts) == ["gateway", "sub_1", "sub_2"]
+    assert gateway[1].hosts == {"sub_3": "10.0.0.2"}
+    assert index.get("plug")[0].hosts == {"plug": "10.0.0.3"}
+    assert index.get("sub_1") == [] and index.get("unknown") == []
+    # Built once, until the entries change.
+    assert hass.config_entries.async_entries.call_count == 1
+    index.invalidate()
+    index.get("plug")
+    assert hass.config_entries.async_entries.call_count == 2
+
+
+async def test_discovery_repeats_and_order(monkeypatch):
+    from custom_components.localtuya import discovery as discovery_module
+
+    callback = Mock()
+    discovery = TuyaDiscovery(callback)
+    decrypt_udp = Mock(wraps=discovery_module.decrypt_udp)
+    monkeypatch.setattr(discovery_module, "decrypt_udp", decrypt_udp)
+
+    for _ in range(3):
+        discovery.datagram_received(DEVICE3_3, ("10.0.0.9", 6667))
+        discovery.datagram_received(b"garbage", ("10.0.0.9", 6667))
+    # Repeats are served from the cache, undecodable ones are dropped.
+    assert decrypt_udp.call_count == 2 and callback.call_count == 3
+
+    ips = ["192.168.1.20", "192.168.1.3", "10.0.0.7", "192.168.1.100"]
+    for i, ip in enumerate(ips):
+        discovery.device_found({"gwId": f"dev_{i}", "ip": ip})
+    discovery.device_found({"gwId": "dev_2", "ip": "192.168.2.1"})  # Moved.
+    ordered = [device["ip"] for device in discovery.devices.values()]
+    assert ordered == sorted(ordered, key=inet_aton) and "10.0.0.7" not in ordered
+    assert len(discovery.devices) == 5
@@ -0,0 +1,173 @@
+"""Test for localtuya."""
+
+from . import *
+from homeassistant.core import callback
+from custom_components.localtuya.const import RESTORE_STATES
+from custom_components.localtuya.core.pytuya import StatusDelta
+from custom_components.localtuya import light
+from custom_components.localtuya.sensor import LocalTuyaSensor, DOMAIN as SENSOR_DOMAIN
+from custom_components.localtuya.switch import LocalTuyaSwitch, DOMAIN as SWITCH_DOMAIN
+from .test_light import CONFIG as LIGHT_CONFIG, DPS_STATUS as LIGHT_STATUS
+from .test_switch import CONFIG
+
+
+async def test_status_routing():
+    device = await init(CONFIG, SWITCH_DOMAIN, LocalTuyaSwitch)
+    entity_sw1, entity_sw2, *_ = get_entites(device)
+    assert (entity_sw1._dps, entity_sw2._dps) == ({"1"}, {"2"})
+
+    sent = []
+    handler = lambda name: lambda status: sent.append((name, status and {**status}))
+    status_updated = lambda status, delta=None: coordinator.TuyaDevice.status_updated(
+        device, status, delta
+    )
+    device.async_route(handler("sw1"), {"1"})
+    device.async_route(handler("sw2"), {"2"})
+    unsub_any = device.async_route(handler("any"), None)
+
+    status_updated({"1": True, "2": False, "3": 5})
+    assert sorted(sent) == [
+        ("any", {"1": True, "2": False, "3": 5}),
+        ("sw1", {"1": True}),
+        ("sw2", {"2": False}),
+    ]
+
+    # Only the entities reading the updated DPs get them.
+    sent.clear()
+    status_updated({"1": True, "2": True, "3": 5})
+    assert sorted(sent) == [("any", {"2": True}), ("sw2", {"2": True})]
+    sent.clear()
+    status_updated({"1": True, "2": True, "3": 5})
+    assert sent == []
+
+    # Unless the device pushed them again, e.g. a button pressed twice.
+    unsub_any()
+    status = {"1": True, "2": True, "3": 5}
+    status_updated(status, StatusDelta.compare(status, {"1": True}))
+    assert sent == [("sw1", {"1": True})]
+
+    # Entities are called right away, a failing one does not stop the others.
+    sent.clear()
+    device.async_route(lambda status: 1 / 0, None)
+    status_updated(RESTORE_STATES)
+    assert sent == [("sw1", device._status), ("sw2", device._status)]
+
+    sent.clear()
+    device.is_closing = True  # Shut down without waiting for a reconnect.
+    await coordinator.TuyaDevice._shutdown_entities(device)
+    assert sent == [("sw1", None), ("sw2", None)]
+
+
+
+async def test_status_routing_secondary_dps():
+    device = await init(LIGHT_CONFIG, light.DOMAIN, light.LocalTuyaLight, light.flow_schema)
+    (entity_light,) = get_entites(device)
+    # Every DP the light is configured with, read from its config flow schema.
+    assert entity_light._dps == {"20", "21", "22", "23", "24", "25"}
+    assert {"21", "22", "23", "24", "25"} <= set(device.dps_to_request)
+
+    @callback
+    def update(status):
+        entity_light._status.update(status)
+        entity_light.status_updated()
+
+    device.async_route(update, entity_light._dps)
+    push = lambda dps: coordinator.TuyaDevice.status_updated(
+        device, {**device._status, **dps}, StatusDelta.compare(device._status, dps)
+    )
+    push(LIGHT_STATUS)
+    brightness = entity_light.brightness
+
+    # A push of the brightness DP alone reaches the light.
+    push({"22": 1000})
+    assert entity_light.brightness > brightness
+
+
+async def test_status_events():
+    device = await init(CONFIG, SWITCH_DOMAIN, LocalTuyaSwitch)
+    hass, events = device.hass, []
+    device._interface = Mock()
+    push = lambda dps: coordinator.TuyaDevice.status_updated(
+        device, {**device._status, **dps}, StatusDelta.compare(device._status, dps)
+    )
+    push({"1": True, "2": False})
+
+    # Nothing listens yet: no event is built.
+    push({"1": False})
+    for event_type in (coordinator.EVENT_STATUS_UPDATE, coordinator.EVENT_DP_TRIGGERED):
+        hass.bus.async_listen(event_type, callback(lambda event: events.append(event)))
+    push({"1": True})
+    assert events == []
+
+    # Listeners added by an automation reload are seen right away.
+    hass.bus.async_fire("automation_reloaded")
+    push({"1": False, "2": False})
+    assert [event.data for event in events] == [
+        {
+            "device_id": device.id,
+            "old_status": {"1": True},
+            "new_status": {"1": False},
+        }
+    ]
+
+    events.clear()
+    device._device_config.full_status_events = True
+    push({"2": True})
+    assert [event.data for event in events] == [
+        {"device_id": device.id, "dp": "2", "value": True},
+        {
+            "device_id": device.id,
+            "old_status": {"1": False, "2": False},
+            "new_status": {"1": False, "2": True},
+        },
+    ]
+
+
+async def test_state_writes(monkeypatch):
+    config = {
+        DEVICE_NAME: {
+            **DEVICE_CONFIG,
+            "entities": [
+                {
+                    "friendly_name": "power",
+                    "id": "19",
+                    "platform": SENSOR_DOMAIN,
+                    "min_update_interval": 10,
+                    "deadband_percent": 5,
+                }
+            ],
+        }
+    }
+    device = await init(config, SENSOR_DOMAIN, LocalTuyaSensor)
+    (sensor,) = get_entites(device)
+    writes, timers = [], []
+    sensor.async_write_ha_state = lambda: writes.append(sensor._state)
+    monkeypatch.setattr(
+        entity,
+        "async_call_later",
+        lambda hass, delay, action: timers.append((delay, action)) or timers.clear,
+    )
+    update = lambda value: [setattr(sensor, "_state", value), sensor.async_write_status()]
+
+    # The first value is written right away, the next ones once the interval ends.
+    for value in (100, 103, 120, 130, 125):
+        update(value)
+    assert (writes, len(timers)) == ([100], 1)
+    timers.pop()[1]()
+    assert writes == [100, 125]
+
+    # Changes within the deadband of the last write are written much later,
+    sensor._last_write = 0.0
+    update(130)
+    assert writes == [100, 125] and timers[0][0] == entity.INSIGNIFICANT_WRITE_DELAY
+    # unless a significant change comes first.
+    update(140)
+    assert writes == [100, 125, 140] and timers == []
+
+    # A drift within the deadband is not lost.
+    sensor._last_write = 0.0
+    for value in (141, 142, 143):
+        update(value)
+    assert writes == [100, 125, 140] and len(timers) == 1
+    timers.pop()[1]()
+    assert writes == [100, 125, 140, 143]
@@ -0,0 +1,390 @@
+"""Test for localtuya."""
+
+import importlib
+import json
+import struct
+import sys
+import time
+from unittest.mock import AsyncMock, Mock
+
+from . import *
+from custom_components.localtuya.core import pytuya
+from custom_components.localtuya.core.pytuya import (
+    MessageDispatcher,
+    codec,
+    TuyaProtocol,
+    parser,
+)
+from custom_components.localtuya.core.pytuya.pacer import (
+    DEFAULT_RATE,
+    WritePacer,
+    learned_rate,
+)
+from custom_components.localtuya.core.pytuya.scheduler import HeartbeatScheduler
+from custom_components.localtuya.core.pytuya.const import Affix, CMDType, TuyaMessage
+
+LOCAL_KEY = DEVICE_CONFIG["local_key"].encode("latin1")
+PAYLOAD = b'{"dps":{"1":true,"2":false}}'
+
+
+def device_frame(
+    version: float, seqno=1, cmd=CMDType.STATUS, payload=PAYLOAD, key=LOCAL_KEY
+):
+    """Return a frame as the device sends it."""
+    if version >= 3.5:
+        msg = TuyaMessage(seqno, cmd, 0, payload, 0, True, Affix.prefix_6699.value)
+        return parser.pack_message(msg, hmac_key=key)
+    msg = TuyaMessage(seqno, cmd, 0, struct.pack(">I", 0) + payload, 0, True)
+    return parser.pack_message(msg, hmac_key=key if version >= 3.4 else None)
+
+
+def create_protocol(version: float, listener=None):
+    """Return a protocol that is not connected to a device."""
+    return TuyaProtocol(
+        DEVICE_CONFIG["device_id"],
+        DEVICE_CONFIG["local_key"],
+        version,
+        False,
+        listener or Mock(),
+    )
+
+
+def collect_dispatcher(version: float):
+    """Return a dispatcher and the list that collects dispatched status messages."""
+    received = []
+    dispatcher = MessageDispatcher(
+        DEVICE_CONFIG["device_id"],
+        lambda msg, ack=False: received.append(msg),
+        version,
+        LOCAL_KEY,
+    )
+    return dispatcher, received
+
+
+def test_add_data_split_and_coalesced():
+    for version in (3.3, 3.4, 3.5):
+        stream = b"".join(device_frame(version, seqno) for seqno in range(1, 6))
+
+        dispatcher, received = collect_dispatcher(version)
+        dispatcher.add_data(stream)
+        assert [msg.seqno for msg in received] == [1, 2, 3, 4, 5]
+        assert all(msg.payload == PAYLOAD and msg.crc_good for msg in received)
+
+        dispatcher, received = collect_dispatcher(version)
+        for index in range(0, len(stream), 3):
+            dispatcher.add_data(stream[index : index + 3])
+        assert [msg.seqno for msg in received] == [1, 2, 3, 4, 5]
+        assert len(dispatcher.buffer) == 0
+
+
+def test_add_data_resync_after_garbage():
+    dispatcher, received = collect_dispatcher(3.3)
+    garbage = b"\x01\x02\x03garbage\x00\x00"
+    dispatcher.add_data(garbage + device_frame(3.3, 1) + garbage + device_frame(3.3, 2))
+
+    assert [msg.seqno for msg in received] == [1, 2]
+    assert len(dispatcher.buffer) == 0
+
+
+def test_cipher_context_reused_per_session_key():
+    dispatcher, received = collect_dispatcher(3.5)
+    context = dispatcher.crypto
+    dispatcher.add_data(device_frame(3.5, 1) + device_frame(3.5, 2))
+    assert dispatcher.crypto is context
+    assert [msg.crc_good for msg in received] == [True, True]
+
+    msg = TuyaMessage(1, CMDType.STATUS, 0, PAYLOAD, 0, True)
+    assert parser.pack_message(msg, context=context) == parser.pack_message(
+        msg, hmac_key=LOCAL_KEY
+    )
+
+    dispatcher.local_key = b"0123456789abcdef"
+    assert dispatcher.crypto is not context
+    assert dispatcher.crypto.key == b"0123456789abcdef"
+
+
+async def test_generate_payload_templates():
+    protocol = create_protocol(3.3)
+    dev_id = DEVICE_CONFIG["device_id"]
+
+    heartbeat = protocol._generate_payload(CMDType.HEART_BEAT)
+    assert heartbeat.payload == b'{"gwId":"%s","devId":"%s"}' % ((dev_id.encode(),) * 2)
+    assert protocol._generate_payload(CMDType.HEART_BEAT) is heartbeat
+
+    query = protocol._generate_payload(CMDType.DP_QUERY, nodeId="cid1")
+    assert query.cmd == CMDType.DP_QUERY
+    assert json.loads(query.payload)["cid"] == "cid1"
+    assert "gwId" not in json.loads(query.payload)
+
+    protocol.dev_type = "type_0d"
+    assert protocol._generate_payload(CMDType.HEART_BEAT) is not heartbeat
+    protocol.dps_to_request = {"1": None}
+    query = protocol._generate_payload(CMDType.DP_QUERY)
+    assert query.cmd == CMDType.CONTROL_NEW
+    assert json.loads(query.payload)["dps"] == {"1": None}
+
+    protocol = create_protocol(3.4)
+    control = protocol._generate_payload(CMDType.CONTROL, {"1": True}, nodeId="cid1")
+    assert control.cmd == CMDType.CONTROL_NEW
+    assert json.loads(control.payload)["data"] == {"cid": "cid1", "dps": {"1": True}}
+    control = protocol._generate_payload(CMDType.CONTROL, {"1": False})
+    assert json.loads(control.payload)["data"] == {"dps": {"1": False}}
+
+
+async def test_heartbeat_frame_cache():
+    for version in (3.3, 3.4, 3.5):
+        protocol = create_protocol(version)
+        heartbeat = protocol._generate_payload(CMDType.HEART_BEAT)
+        frames = [protocol._encode_message(heartbeat) for _ in range(3)]
+        protocol.seqno = 1
+        assert (
+            protocol._encode_message(heartbeat, use_cache=False)[:16] == frames[0][:16]
+        )
+
+        for seqno, frame in enumerate(frames, start=1):
+            msg = parser.unpack_message(
+                frame,
+                hmac_key=LOCAL_KEY if version >= 3.4 else None,
+                no_retcode=True,
+            )
+            assert (msg.seqno, msg.cmd, msg.crc_good) == (
+                seqno,
+                CMDType.HEART_BEAT,
+                True,
+            )
+        assert protocol.stats.heartbeats == 3
+        assert protocol.stats.heartbeat_frames_built == 1
+
+
+async def test_wait_for_timeout_keeps_other_listeners():
+    dispatcher, received = collect_dispatcher(3.3)
+    other = dispatcher.register(2, CMDType.DP_QUERY)
+
+    with pytest.raises(TimeoutError):
+        await dispatcher.wait_for(1, CMDType.DP_QUERY, timeout=0.01)
+    assert 1 not in dispatcher.listeners
+    assert not other.cancelled()
+
+    dispatcher.add_data(device_frame(3.3, 2, CMDType.DP_QUERY))
+    assert (await dispatcher.wait_for(2, CMDType.DP_QUERY, future=other)).seqno == 2
+    assert dispatcher.listeners == {}
+
+
+async def test_dispatch_seqno_zero_and_special_waiters():
+    dispatcher, received = collect_dispatcher(3.3)
+    control = dispatcher.register(5, CMDType.CONTROL)
+    query = dispatcher.register(6, CMDType.DP_QUERY)
+    dispatcher.add_data(device_frame(3.3, 0, CMDType.DP_QUERY))
+    assert query.done() and not control.done()
+
+    beats = [dispatcher.register(dispatcher.HEARTBEAT_SEQNO, 9) for _ in range(2)]
+    dispatcher.add_data(device_frame(3.3, 0, CMDType.HEART_BEAT, b""))
+    assert [beat.done() for beat in beats] == [True, False]
+
+    dispatcher.abort()
+    assert control.cancelled() and beats[1].cancelled()
+    assert dispatcher.listeners == {}
+
+
+async def test_write_pacer_token_bucket():
+    pacer = WritePacer(3.3, "pacer_test", burst=2)
+    pacer.rate = 100.0
+    order = []
+
+    async def write(index):
+        await pacer.acquire()
+        order.append(index)
+
+    await asyncio.gather(*(write(index) for index in range(5)))
+    assert order == [0, 1, 2, 3, 4]
+    assert pacer._timer is None
+
+    pacer.on_timeout()
+    assert pacer.rate == 50.0
+    pacer.on_ack(0.01)
+    assert learned_rate(3.3, "pacer_test") == pacer.rate == 52.0
+    assert WritePacer(3.3, "pacer_test").rate == 52.0
+    assert learned_rate(3.3, "other") == DEFAULT_RATE
+
+    # Writers still waiting when the connection is closed fail right away.
+    pacer.rate = 0.1
+    waiting = asyncio.ensure_future(write(5))
+    await asyncio.sleep(0)
+    assert pacer._timer is not None
+    pacer.close()
+    with pytest.raises(ConnectionError):
+        await waiting
+    assert pacer._timer is None and order[-1] == 4
+
+
+async def test_decode_payload_and_error_json():
+    protocol = create_protocol(3.3)
+    encrypted = protocol.crypto.cipher.encrypt(PAYLOAD, False)
+    assert protocol._decode_payload(encrypted) == {"dps": {"1": True, "2": False}}
+
+    error = protocol._decode_payload(protocol.crypto.cipher.encrypt(b"{bad", False))
+    assert error == {
+        "Error": "Invalid JSON Response from Device",
+        "Err": "900",
+        "Payload": "{bad",
+    }
+    assert protocol.error_json(904, object())["Payload"] == ""
+
+
+def test_codec_backends_match(monkeypatch):
+    obj = {"dps": {"1": "Küche ☀"}, 2: [1.5, None]}
+    encoded = codec.dumps(obj)
+    # The bytes sent before the codec: compact and ASCII only.
+    assert encoded == b'{"dps":{"1":"K\\u00fcche \\u2600"},"2":[1.5,null]}'
+
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    fallback = importlib.reload(codec)
+    try:
+        assert fallback.BACKEND == "json"
+        assert fallback.dumps(obj) == encoded
+        assert fallback.loads(encoded) == {"dps": {"1": "Küche ☀"}, "2": [1.5, None]}
+    finally:
+        monkeypatch.undo()
+        importlib.reload(codec)
+
+
+async def test_status_delta():
+    listener = Mock()
+    protocol = create_protocol(3.3, listener)
+    push = lambda payload: protocol.dispatcher.add_data(
+        device_frame(3.3, 0, payload=protocol.crypto.cipher.encrypt(payload, False))
+    )
+    push(PAYLOAD)
+    status, delta = listener.status_updated.call_args.args
+    assert status == {"1": True, "2": False} and delta.changed == status
+    assert delta.old == {}
+
+    # Values equal to the cached ones are no change, but are still in the frame.
+    push(b'{"dps":{"1":true,"2":true}}')
+    status, delta = listener.status_updated.call_args.args
+    assert status == {"1": True, "2": True} == delta.dps
+    assert (delta.changed, delta.old) == ({"2": True}, {"2": False})
+
+    sub_device = Mock()
+    listener.sub_devices = {"cid1": sub_device}
+    push(b'{"dps":{"1":5},"cid":"cid1"}')
+    assert sub_device.status_updated.call_args.args[1].changed == {"1": 5}
+    assert protocol.dps_cache["parent"] == {"1": True, "2": True}
+
+
+async def test_keep_alive_skips_heartbeats_on_traffic(monkeypatch):
+    monkeypatch.setattr(pytuya, "HEARTBEAT_INTERVAL", 0.05)
+    protocol = create_protocol(3.3)
+    protocol.loop = asyncio.current_task().get_loop()
+    protocol.heartbeat = AsyncMock()
+    protocol.keep_alive(scheduler=HeartbeatScheduler(protocol.loop, 0.01, 0))
+
+    for _ in range(8):
+        protocol.dispatcher.add_data(device_frame(3.3, 0))
+        await asyncio.sleep(0.02)
+    assert protocol.heartbeat.await_count == 0
+    assert protocol.stats.heartbeats_skipped > 0
+
+    await asyncio.sleep(0.08)
+    assert protocol.heartbeat.await_count >= 1
+
+    # Two heartbeats in a row without any reply still disconnect.
+    protocol.heartbeat.side_effect = TimeoutError
+    await asyncio.sleep(0.2)
+    assert protocol.heartbeater is None
+
+
+async def test_heartbeat_scheduler_batches_due_entries():
+    scheduler = HeartbeatScheduler(asyncio.current_task().get_loop(), 0.02, 0.01)
+    runs = []
+
+    def callback(index):
+        runs.append(index)
+        return None if len(runs) > 10 else time.monotonic() + 0.03
+
+    entries = [scheduler.schedule(lambda i=i: callback(i), 0.03) for i in range(4)]
+    entries[3].cancel()
+    await asyncio.sleep(0.2)
+
+    assert 3 not in runs and len(runs) >= 10
+    assert scheduler.stats.due == len(runs)
+    assert scheduler.stats.wakeups < len(runs)
+    assert 0 <= scheduler.stats.lateness_max < 0.1
+    assert scheduler.stats.scheduled < 3
+
+
+    # An entry re-inserted far ahead does not delay the ones due before it.
+    scheduler = HeartbeatScheduler(asyncio.current_task().get_loop(), 0.02, 0)
+    order = []
+
+    def slow():
+        order.append("slow")
+        return time.monotonic() + 0.16 if len(order) < 2 else None
+
+    scheduler.schedule(slow, 0.01)
+    scheduler.schedule(lambda: order.append("fast"), 0.06)
+    await asyncio.sleep(0.12)
+    assert order == ["slow", "fast"]
+    assert scheduler.stats.lateness_max < 0.05
+
+
+class SessionDevice:
+    """Transport acknowledging every request of a 3.4 session."""
+
+    def __init__(self, protocol):
+        """Connect to protocol, which starts the negotiation."""
+        self.protocol = protocol
+        self.writes = []
+        protocol.connection_made(self)
+
+    def write(self, data):
+        """Answer the negotiation and acknowledge everything else."""
+        header = parser.parse_header(data)
+        self.writes.append(header.cmd)
+        if header.cmd == CMDType.SESS_KEY_NEG_START:
+            payload = b"fedcba9876543210" + self.protocol.crypto.hmac(b"0" * 16)
+            payload = self.protocol.crypto.cipher.encrypt(payload, False)
+            reply = device_frame(3.4, header.seqno, CMDType.SESS_KEY_NEG_RESP, payload)
+        elif header.cmd == CMDType.SESS_KEY_NEG_FINISH:
+            return
+        else:
+            key = self.protocol.local_key
+            reply = device_frame(3.4, header.seqno, header.cmd, b"", key)
+        self.protocol.loop.call_soon(self.protocol.data_received, reply)
+
+    def is_closing(self):
+        """Return False, the device never disconnects."""
+        return False
+
+    def close(self):
+        """Nothing to close."""
+
+
+async def test_session_key_negotiated_once_at_connect():
+    protocol = create_protocol(3.4)
+    protocol.loop = asyncio.current_task().get_loop()
+    protocol.local_nonce = b"0" * 16
+    device = SessionDevice(protocol)
+    assert device.writes == []  # The negotiation runs in a task.
+
+    await asyncio.gather(*(protocol.set_dp(True, dp) for dp in range(1, 4)))
+
+    assert device.writes.count(CMDType.SESS_KEY_NEG_START) == 1
+    assert device.writes.count(CMDType.CONTROL_NEW) == 3
+    assert protocol.local_key != protocol.real_local_key
+    assert protocol.stats.handshakes == 1 and protocol.stats.handshake_ms > 0
+
+
+async def test_heartbeat_bypasses_inflight_window():
+    protocol = create_protocol(3.4)
+    protocol.loop = asyncio.current_task().get_loop()
+    protocol.local_nonce = b"0" * 16
+    device = SessionDevice(protocol)
+    await protocol.set_dp(True, 1)
+
+    # Slow commands hold every in-flight slot, heartbeats still go out.
+    protocol._inflight = asyncio.Semaphore(0)
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(protocol.status(), 0.05)
+    await asyncio.wait_for(protocol.heartbeat(), 1)
+    assert device.writes[-1] == CMDType.HEART_BEAT
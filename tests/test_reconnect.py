@@ -0,0 +1,93 @@
+"""Test for localtuya."""
+
+from . import *
+from custom_components.localtuya.core import reconnect
+from custom_components.localtuya.const import RESTORE_STATES
+from custom_components.localtuya.core.reconnect import ReconnectManager
+
+
+class Device:
+    def __init__(self, host, online_after=None, errors=0):
+        self.id, self.errors = host, errors
+        self._device_config = Mock(host=host)
+        self.is_subdevice, self.is_closing, self.is_sleep = False, False, False
+        self.connected, self.online_after, self.attempts = False, online_after, []
+        self.manager: ReconnectManager = None
+
+    async def async_reconnect(self):
+        self.attempts.append(time.monotonic())
+        if len(self.attempts) <= self.errors:
+            raise RuntimeError("Unexpected error")
+        if self.online_after is not None and len(self.attempts) > self.online_after:
+            self.connected = True
+            self.manager.discard(self)  # As _make_connection does.
+        return self.connected
+
+    def info(self, msg):
+        pass
+
+
+async def test_reconnect_backoff_and_wakeup(monkeypatch):
+    monkeypatch.setattr(reconnect, "BACKOFF_MIN", 0.01)
+    monkeypatch.setattr(reconnect, "BACKOFF_MAX", 0.04)
+    monkeypatch.setattr(reconnect, "WAKE_INTERVAL", 0)
+    hass = Mock(loop=asyncio.current_task().get_loop())
+    hass.async_create_background_task = lambda coro, name: asyncio.ensure_future(coro)
+    manager = ReconnectManager(hass)
+
+    unplugged, returning = Device("10.0.0.1"), Device("10.0.0.2", online_after=1)
+    failing = Device("10.0.0.3", online_after=1, errors=1)
+    for device in (unplugged, returning, failing):
+        device.manager = manager
+        manager.schedule(device)
+        manager.schedule(device)  # Already waiting.
+    assert manager.stats.pending == 3
+
+    await asyncio.sleep(0.3)
+    assert returning.connected and len(returning.attempts) == 2
+    # An attempt that raised is retried like a failed one.
+    assert failing.connected and len(failing.attempts) == 2
+    assert manager.stats.pending == 1 and manager.stats.reconnected == 2
+    # Delays double up to the cap: far fewer attempts than a fixed interval.
+    gaps = [b - a for a, b in zip(unplugged.attempts, unplugged.attempts[1:])]
+    assert gaps[0] < 0.04 and 0.03 < gaps[-1] < 0.06
+    assert len(unplugged.attempts) < 12
+
+    # A broadcast of the device wakes it up right away, once per interval.
+    monkeypatch.setattr(reconnect, "BACKOFF_MAX", 60)
+    await asyncio.sleep(0.1)  # Let it reach the long delay.
+    unplugged.online_after = len(unplugged.attempts)
+    start = time.monotonic()
+    monkeypatch.setattr(reconnect, "WAKE_INTERVAL", 1)
+    assert not manager.wake(unplugged)  # Its last attempt was too recent.
+    assert manager.wake(unplugged, force=True) and not manager.wake(returning)
+    await asyncio.sleep(0)
+    assert unplugged.connected and unplugged.attempts[-1] - start < 0.01
+    assert manager.stats.wakeups == 1 and manager.stats.pending == 0
+
+
+async def test_low_power_device_wake(monkeypatch):
+    manager = Mock()
+    monkeypatch.setattr(coordinator, "async_get_reconnect_manager", lambda _: manager)
+    hass = HomeAssistant("")
+    config = {**DEVICE_CONFIG, "entities": [], "device_sleep_time": 30}
+    entry = ConfigEntry(**create_entry({DEVICE_NAME: config}))
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = Mock()
+    device = coordinator.TuyaDevice(hass, entry, config)
+    device._dispatch_status = lambda dps=None: None
+
+    # A broadcast of a sleeping device connects it right away, once per wake.
+    device.announced()
+    device.announced()
+    manager.wake.assert_called_once_with(device, force=True)
+    device.status_updated(RESTORE_STATES)
+    assert device.wake_stats.latency_last == 0
+    device.status_updated({"1": True})
+    assert device.wake_stats.latency_last > 0 and device._woken_at is None
+
+    # The device went back to sleep before its status.
+    device.announced()
+    device.async_connect = AsyncMock()
+    assert not await device.async_reconnect()
+    stats = device.wake_stats
+    assert (stats.wakes, stats.missed, stats.missed_rate) == (2, 1, 0.5)
@@ -0,0 +1,65 @@
+"""Test for localtuya."""
+
+from . import *
+from custom_components.localtuya.core import startup
+from custom_components.localtuya.core.startup import StartupScheduler
+
+
+class Device:
+    def __init__(self, name, priority, latency, log, online=True):
+        self.name, self.startup_priority = name, priority
+        self.latency, self.log, self.online = latency, log, online
+        self.is_closing, self.connected, self._task_connect = False, False, None
+
+    async def async_connect(self):
+        self.log.append(self.name)
+        await asyncio.sleep(self.latency)
+        self.connected = self.online
+
+
+async def test_startup_scheduler_priority_and_pacing(monkeypatch):
+    monkeypatch.setattr(startup, "TARGET_LATENCY", 0.02)
+    loop = asyncio.current_task().get_loop()
+    entry = Mock(async_create_task=lambda hass, coro: asyncio.ensure_future(coro))
+    scheduler = StartupScheduler(Mock(loop=loop), concurrency_max=6)
+    log = []
+
+    devices = [Device(f"plug_{i}", 1, 0.005, log) for i in range(10)]
+    devices += [Device("sensor", 3, 0.005, log), Device("diag", 2, 0.005, log)]
+    devices += [Device("gateway", 0, 0.005, log)]
+    devices[0].is_closing = True
+    for device in devices:
+        scheduler.async_add(entry, device)
+
+    while scheduler.stats.settled_s is None:
+        await asyncio.sleep(0.005)
+
+    stats = scheduler.stats
+    assert log[0] == "gateway" and log[-2:] == ["diag", "sensor"]
+    assert "plug_0" not in log
+    assert (stats.queued, stats.connected, stats.failed) == (12, 12, 0)
+    # Fast connects raise the limit from its start up to the maximum.
+    assert stats.peak_in_flight > startup.CONCURRENCY_START
+    assert stats.limit == 6 and 0 < stats.all_online_s <= stats.settled_s
+
+    # Slow connects lower it, a device that stays offline is reported.
+    log.clear()
+    slow = [Device(f"slow_{i}", 1, 0.06, log) for i in range(6)]
+    slow.append(Device("offline", 1, 0.06, log, online=False))
+    for device in slow:
+        scheduler.async_add(entry, device)
+    while scheduler.stats.settled_s is None:
+        await asyncio.sleep(0.01)
+
+    stats = scheduler.stats
+    assert (stats.queued, stats.connected, stats.failed) == (7, 6, 1)
+    assert stats.limit < startup.CONCURRENCY_START and stats.all_online_s is None
+    assert stats.peak_in_flight == startup.CONCURRENCY_START
+
+    # It is online once the last device connects, here by a reconnect.
+    offline = slow[-1]
+    offline.connected = True
+    scheduler.async_connected(offline)
+    assert (all_online_s := stats.all_online_s) > stats.settled_s
+    scheduler.async_connected(offline)  # Connected again: not measured again.
+    assert stats.all_online_s == all_online_s